@@ -0,0 +1,42 @@
+"""
+Synthetic PDF corpora for the benchmarks.
+
+Pages are generated from a fixed vocabulary: each page is about one topic
+(topic words mixed with filler), so queries built from topic words have a
+small set of truly relevant pages. The same seed always gives the same
+corpus.
+"""
+import os
+import random
+from typing import List
+
+FILLER = (
+    "the model data value result method system process example function point set case "
+    "number time form part order level rate type step term rule class group field"
+).split()
+
+def topic_words(n_topics: int, words_per_topic: int = 6, seed: int = 0) -> List[List[str]]:
+    rng = random.Random(seed)
+    return [[f"t{t}w{rng.randrange(10_000)}" for _ in range(words_per_topic)] for t in range(n_topics)]
+
+def page_text(topic: List[str], rng: random.Random, words: int = 350) -> str:
+    tokens = [rng.choice(topic) if rng.random() < 0.2 else rng.choice(FILLER) for _ in range(words)]
+    # Short lines so PyMuPDF's insert_text keeps everything on the page
+    return "\n".join(" ".join(tokens[i:i + 12]) for i in range(0, len(tokens), 12))
+
+def write_corpus(directory: str, pages: int, pages_per_pdf: int = 20, n_topics: int = 50, seed: int = 0) -> List[str]:
+    """Writes `pages` pages spread over PDFs of `pages_per_pdf` pages; returns one query per topic."""
+    import pymupdf
+
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    topics = topic_words(n_topics, seed=seed)
+    written = 0
+    while written < pages:
+        doc = pymupdf.open()
+        for _ in range(min(pages_per_pdf, pages - written)):
+            doc.new_page().insert_text((36, 36), page_text(rng.choice(topics), rng), fontsize=7)
+            written += 1
+        doc.save(os.path.join(directory, f"doc_{written:06d}.pdf"))
+        doc.close()
+    return [f"What is {topic[0]} and how does it relate to {topic[1]}?" for topic in topics]
@@ -0,0 +1,240 @@
+"""
+End-to-end benchmark of the hot paths, fully offline.
+
+The provider is replaced by deterministic fakes (benchmarks.fakes) plugged
+in through the resource registry and TutorAgent(llm=...), and the corpus is
+synthetic (benchmarks.corpus). For each corpus size it reports:
+  - ingest throughput of ingest_data() (pages/s, chunks/s)
+  - index save and load time, and index size on disk
+  - retrieval p50/p99 per retrieval mode
+  - /chat throughput and latency under concurrent load, via an ASGI client
+  - peak RSS of this process and of the PDF parser processes
+
+Usage:
+    python -m benchmarks.end_to_end --pages 100,1000 --json results.json
+    python -m benchmarks.end_to_end --pages 100,1000 --baseline results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from benchmarks.corpus import write_corpus
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+from src.config.settings import config
+from src.rag import resources
+from src.rag.embedding_cache import CachedEmbeddings
+from src.utils.tokens import approximate_tokens
+
+def percentiles(latencies_ms) -> dict:
+    values = np.asarray(latencies_ms)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss is in KiB on Linux
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+def dir_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+@contextlib.contextmanager
+def quiet(enabled: bool):
+    """Hides the pipeline's progress prints while timing."""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def configure(workdir: Path, args):
+    """Points the config at `workdir` and installs the fake embedding provider."""
+    from src.rag.vector_store import embedding_scheduler
+
+    config.RAW_PDFS_DIR = str(workdir / "pdfs")
+    config.EMBEDDINGS_DIR = workdir / "embeddings"
+    config.EMBEDDING_CACHE_DIR = config.EMBEDDINGS_DIR / "embedding_cache"
+    config.LOCAL_INDEX_ENABLED = args.local_index
+    config.ANSWER_CACHE_SIZE = 0  # Every /chat request takes the full path
+    config.EMBEDDING_REQUESTS_PER_MINUTE = 0  # Measure the pipeline, not a provider quota
+    config.EMBEDDING_TOKENS_PER_MINUTE = 0
+    asyncio.run(resources.aclose_resources())
+    provider = FakeEmbeddings(dim=args.dim, latency_ms=args.embedding_latency_ms)
+    resources.register("embeddings", CachedEmbeddings(
+        provider, model_name="fake", cache_dir=config.EMBEDDING_CACHE_DIR, batch_size=config.EMBEDDING_BATCH_SIZE,
+        scheduler=embedding_scheduler(count_tokens=approximate_tokens),  # No tiktoken download offline
+    ))
+    return provider
+
+def bench_ingest(pages: int, args) -> dict:
+    from src.ingest import ingest_data
+
+    start = time.perf_counter()
+    with quiet(not args.verbose):
+        ingest_data(resume=False)
+    seconds = time.perf_counter() - start
+    chunks = resources.get_rag_pipeline().handle.snapshot().ntotal
+    return {
+        "seconds": round(seconds, 3),
+        "chunks": chunks,
+        "pages_per_s": round(pages / seconds, 1),
+        "chunks_per_s": round(chunks / seconds, 1),
+    }
+
+def bench_index_io(workdir: Path, args) -> dict:
+    rag = resources.get_rag_pipeline()
+    store = rag.handle.snapshot().base
+
+    start = time.perf_counter()
+    store.save_local(str(workdir / "index_copy"))
+    save_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with quiet(not args.verbose):
+        rag.load_index(from_disk=True)
+    load_s = time.perf_counter() - start
+    return {
+        "save_s": round(save_s, 3),
+        "load_s": round(load_s, 3),
+        "bytes": dir_bytes(Path(rag.vector_store_path)),
+    }
+
+def bench_retrieval(queries, args) -> dict:
+    rag = resources.get_rag_pipeline()
+    results = {}
+    for mode in ("vector", "hybrid", "keyword"):
+        retriever = rag.get_retriever(k=12, mode=mode)
+        retriever.invoke(queries[0])  # Builds the keyword index on first use
+        latencies = []
+        for i in range(args.queries):
+            # Distinct texts, so the query embedding cache does not hide the provider call
+            query = f"{queries[i % len(queries)]} {i}"
+            start = time.perf_counter()
+            retriever.invoke(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[mode] = percentiles(latencies)
+    return results
+
+async def chat_load(app, queries, requests: int, concurrency: int):
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(client, i):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/chat", json={"message": f"{queries[i % len(queries)]} {i}", "session_id": f"bench-{i}"})
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+def bench_chat(queries, args) -> dict:
+    from src.agent.tutor import TutorAgent
+    from src.api import server
+
+    with quiet(not args.verbose):
+        agent = TutorAgent(llm=FakeChatModel(latency_ms=args.llm_latency_ms))
+        server.set_tutor_agent(agent)
+        elapsed, latencies = asyncio.run(chat_load(server.app, queries, args.requests, args.concurrency))
+    server.set_tutor_agent(None)
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "requests_per_s": round(args.requests / elapsed, 1),
+        **percentiles(latencies),
+    }
+
+def run_size(pages: int, args) -> dict:
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        workdir = Path(tmp)
+        queries = write_corpus(str(workdir / "pdfs"), pages, seed=args.seed)
+        provider = configure(workdir, args)
+
+        result = {"pages": pages}
+        result["ingest"] = bench_ingest(pages, args)
+        result["index"] = bench_index_io(workdir, args)
+        result["retrieval"] = bench_retrieval(queries, args)
+        result["chat"] = bench_chat(queries, args)
+        result["provider_requests"] = provider.requests
+        result["peak_rss_mb"] = peak_rss_mb()
+        asyncio.run(resources.aclose_resources())
+    print(json.dumps(result), flush=True)
+    return result
+
+def numeric_leaves(value, prefix=""):
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from numeric_leaves(child, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+def compare(results, baseline) -> str:
+    """Per-metric change against a baseline file written by --json (same corpus sizes only)."""
+    old_by_size = {r["pages"]: dict(numeric_leaves(r)) for r in baseline["results"]}
+    lines = []
+    for result in results:
+        old = old_by_size.get(result["pages"])
+        if old is None:
+            continue
+        for name, value in numeric_leaves(result):
+            if name != "pages" and old.get(name):
+                lines.append(f"pages={result['pages']:<7} {name:<32} {old[name]:>12} -> {value:>12} ({(value - old[name]) / old[name]:+.1%})")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of ingest, index IO, retrieval and /chat.")
+    parser.add_argument("--pages", default="100,1000", help="Comma-separated corpus sizes (pages)")
+    parser.add_argument("--dim", type=int, default=1536, help="Fake embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Retrieval queries per mode")
+    parser.add_argument("--requests", type=int, default=200, help="/chat requests per corpus size")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent /chat requests")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0, help="Simulated provider latency per embedding request")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated LLM latency per answer")
+    parser.add_argument("--no-local-index", dest="local_index", action="store_false", help="Skip the offline index during ingest")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Print changes against an earlier --json file")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    args = parser.parse_args()
+
+    sizes = sorted(int(p) for p in args.pages.split(","))  # Ascending: peak RSS only grows
+    results = [run_size(pages, args) for pages in sizes]
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "params": {k: v for k, v in vars(args).items() if k not in ("json", "baseline", "verbose")},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(compare(results, json.load(f)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Deterministic stand-ins for the provider, so benchmarks run offline and
+give the same results on every run.
+"""
+import asyncio
+import time
+import zlib
+from typing import Any, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from src.rag.lexical_index import tokenize
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words vectors: each token adds +-1 to one of `dim`
+    dimensions (chosen by CRC32), then rows are L2-normalised. Texts that
+    share words get similar vectors, so retrieval results are meaningful.
+    `latency_ms` simulates the provider round trip per request.
+    """
+    def __init__(self, dim: int = 1536, latency_ms: float = 0.0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self.texts = 0
+
+    def _vectors(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                h = zlib.crc32(token.encode("utf-8"))
+                matrix[row, h % self.dim] += 1.0 if h & 1 << 31 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def _count(self, texts: List[str]):
+        self.requests += 1
+        self.texts += len(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._count(texts)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return self._vectors(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._count(texts)
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self._vectors(texts).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+class FakeChatModel(BaseChatModel):
+    """Answers with a fixed number of words derived from the question, after `latency_ms`."""
+    latency_ms: float = 0.0
+    answer_words: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark-chat"
+
+    def _answer(self, messages: List[BaseMessage]) -> ChatResult:
+        question = str(messages[-1].content)
+        words = (tokenize(question) or ["answer"]) * self.answer_words
+        message = AIMessage(content=" ".join(words[:self.answer_words]))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs) -> ChatResult:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return self._answer(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs) -> ChatResult:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self._answer(messages)
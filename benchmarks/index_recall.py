@@ -0,0 +1,103 @@
+"""
+Recall-vs-latency report for the FAISS index types in src.rag.index_factory.
+
+Each index type is compared against the exact flat index on the same
+synthetic, clustered corpus (embedding-like: many near neighbours per
+topic). Recall@k is the fraction of the exact top-k that the ANN index
+returns.
+
+Usage:
+    python -m benchmarks.index_recall --n 100000 --dim 384 --json results.json
+"""
+import argparse
+import json
+import time
+import numpy as np
+from src.rag.index_factory import build_index, tune_index
+
+def synthetic_corpus(n: int, dim: int, n_queries: int, n_topics: int = 1000, seed: int = 0):
+    """Unit-norm vectors scattered around random topic centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    def sample(count):
+        topics = rng.integers(0, n_topics, size=count)
+        x = centres[topics] + 1.5 * rng.standard_normal((count, dim)).astype(np.float32)
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+    return sample(n), sample(n_queries)
+
+def timed_search(index, queries: np.ndarray, k: int):
+    """Searches one query at a time (as the API does) and returns ids and per-query ms."""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = []
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        _, row = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids[i] = row[0]
+    return ids, np.array(latencies)
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def run(n: int, dim: int, n_queries: int, k: int):
+    vectors, queries = synthetic_corpus(n, dim, n_queries)
+    configs = [
+        ("flat", {}, [{}]),
+        ("ivf_flat", {}, [{"nprobe": p} for p in (1, 4, 8, 16, 32)]),
+        ("ivf_pq", {"pq_m": 48}, [{"nprobe": p} for p in (4, 8, 16, 32)]),
+        ("hnsw", {}, [{"ef_search": ef} for ef in (16, 32, 64, 128)]),
+    ]
+
+    results = []
+    truth = None
+    for index_type, build_params, search_params in configs:
+        start = time.perf_counter()
+        index = build_index(vectors, index_type=index_type, **build_params)
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+
+        for params in search_params:
+            tune_index(index, **params)
+            ids, latencies = timed_search(index, queries, k)
+            if truth is None:
+                truth = ids  # flat runs first and is exact
+            results.append({
+                "index": index_type,
+                "params": params,
+                "build_s": round(build_s, 2),
+                f"recall@{k}": round(recall_at_k(ids, truth), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            })
+            print(results[-1], flush=True)
+    return results
+
+def to_markdown(results, k: int) -> str:
+    lines = [
+        f"| Index | Params | Build (s) | Recall@{k} | p50 (ms) | p99 (ms) |",
+        "|-------|--------|-----------|-----------|----------|----------|",
+    ]
+    for r in results:
+        params = ", ".join(f"{key}={value}" for key, value in r["params"].items()) or "-"
+        lines.append(f"| {r['index']} | {params} | {r['build_s']} | {r[f'recall@{k}']} | {r['p50_ms']} | {r['p99_ms']} |")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FAISS index types against the flat index.")
+    parser.add_argument("--n", type=int, default=100000, help="Corpus size (vectors)")
+    parser.add_argument("--dim", type=int, default=384, help="Vector dimension")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.n, args.dim, args.queries, args.k)
+    print()
+    print(to_markdown(results, args.k))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"n": args.n, "dim": args.dim, "k": args.k, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
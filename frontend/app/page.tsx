@@ -143,12 +143,22 @@ export default function Home() {
     formData.append('file', file);
 
     try {
-      await axios.post('/api/upload', formData, {
+      const { data } = await axios.post('/api/upload', formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
         },
       });
 
+      // Ingestion runs in the background; wait for the job to finish
+      let job = data;
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        job = (await axios.get(`/api/jobs/${data.job_id}`)).data;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Ingestion failed');
+      }
+
       const newPDF: UploadedPDF = {
         id: Date.now().toString(),
         name: file.name,
@@ -0,0 +1,103 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set
+import numpy as np
+from langchain_core.documents import Document
+
+# Words that usually point back to earlier turns ("explain it again")
+FOLLOW_UP_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their",
+    "he", "she", "above", "previous", "earlier", "again", "more", "else", "same",
+}
+
+def is_history_independent(question: str) -> bool:
+    """True if the question reads as standalone (no references to earlier turns)."""
+    words = set(re.findall(r"[a-z']+", question.lower()))
+    return bool(words) and not words & FOLLOW_UP_WORDS
+
+def chunk_ids(docs: List[Document]) -> FrozenSet[str]:
+    """Identity of a retrieval result: docstore ids, or a content hash for documents without one."""
+    return frozenset(
+        doc.id or hashlib.blake2b(doc.page_content.encode("utf-8"), digest_size=16).hexdigest()
+        for doc in docs
+    )
+
+class SemanticAnswerCache:
+    """
+    LRU cache of generated answers. A new question reuses an answer when it
+    retrieved exactly the same chunks as a cached question and their query
+    embeddings have cosine similarity of at least `threshold`. Entries belong
+    to one index generation; when the index changes they are all dropped.
+    """
+    def __init__(self, max_size: int = 512, threshold: float = 0.95):
+        self.max_size = max_size
+        self.threshold = threshold
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # id -> (chunks, unit vector, answer)
+        self._by_chunks: Dict[FrozenSet[str], Set[int]] = {}
+        self._generation = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_generation(self, generation):
+        # Caller holds the lock
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._by_chunks.clear()
+            self._generation = generation
+
+    def get(self, vector, chunks: FrozenSet[str], generation) -> Optional[str]:
+        with self._lock:
+            self._check_generation(generation)
+            candidates = self._by_chunks.get(chunks, ())
+            if candidates:
+                query = self._unit(vector)
+                entry_id = max(candidates, key=lambda i: float(self._entries[i][1] @ query))
+                if float(self._entries[entry_id][1] @ query) >= self.threshold:
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return self._entries[entry_id][2]
+            self.misses += 1
+            return None
+
+    def put(self, vector, chunks: FrozenSet[str], generation, answer: str):
+        with self._lock:
+            self._check_generation(generation)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (chunks, self._unit(vector), answer)
+            self._by_chunks.setdefault(chunks, set()).add(entry_id)
+            while len(self._entries) > self.max_size:
+                old_id, (old_chunks, _, _) = self._entries.popitem(last=False)
+                self._by_chunks[old_chunks].discard(old_id)
+                if not self._by_chunks[old_chunks]:
+                    del self._by_chunks[old_chunks]
+
+    def clear(self):
+        with self._lock:
+            self._check_generation(object())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,113 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from src.utils.text_similarity import jaccard, shingles
+from src.utils.tokens import approximate_tokens
+
+class PackedContext:
+    """Result of ContextPacker.pack(): the documents to put in the prompt plus token accounting."""
+    def __init__(self, docs: List[Document], tokens: int, original_tokens: int, chunks_in: int):
+        self.docs = docs
+        self.tokens = tokens
+        self.original_tokens = original_tokens
+        self.chunks_in = chunks_in
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+    def to_dict(self) -> dict:
+        return {
+            "context_tokens": self.tokens,
+            "original_tokens": self.original_tokens,
+            "tokens_saved": self.tokens_saved,
+            "chunks_retrieved": self.chunks_in,
+            "passages_used": len(self.docs),
+        }
+
+class ContextPacker:
+    """
+    Turns retrieved chunks (in relevance order) into a prompt context that
+    fits a token budget:
+      1. chunks of the same page that overlap or touch (by start_index) are
+         merged into one passage, so the splitter's overlap is sent once;
+      2. passages that are near-duplicates of a more relevant one are dropped;
+      3. passages are added in relevance order while they fit `max_tokens`.
+    `format_docs` renders the passages exactly as the prompt will see them,
+    so the token counts match what is sent.
+    """
+    def __init__(self, format_docs: Callable[[List[Document]], str], max_tokens: int = 3000,
+                 dedupe_threshold: float = 0.9, count_tokens: Optional[Callable[[str], int]] = None):
+        self.format_docs = format_docs
+        self.max_tokens = max_tokens
+        self.dedupe_threshold = dedupe_threshold
+        self.count_tokens = count_tokens or approximate_tokens
+
+    def pack(self, docs: List[Document]) -> PackedContext:
+        original_tokens = self.count_tokens(self.format_docs(docs)) if docs else 0
+        passages = self._dedupe(self._merge(docs))
+
+        packed, used = [], 0
+        for passage in passages:
+            cost = self.count_tokens(self.format_docs([passage]))
+            if used + cost <= self.max_tokens:
+                packed.append(passage)
+                used += cost
+            elif not packed:
+                # Even the best passage is too long: keep its beginning
+                packed.append(self._truncate(passage, self.max_tokens))
+                used = self.count_tokens(self.format_docs(packed))
+        return PackedContext(packed, used, original_tokens, len(docs))
+
+    def _merge(self, docs: List[Document]) -> List[Document]:
+        """Merges overlapping/adjacent chunks per (source, page); output sorted by best member rank."""
+        groups: Dict[Tuple, List[Tuple[int, Document]]] = {}
+        standalone: List[Tuple[int, Document]] = []
+        for rank, doc in enumerate(docs):
+            if "start_index" in doc.metadata:
+                key = (doc.metadata.get("source"), doc.metadata.get("page"))
+                groups.setdefault(key, []).append((rank, doc))
+            else:
+                standalone.append((rank, doc))
+
+        merged = list(standalone)
+        for members in groups.values():
+            members.sort(key=lambda m: m[1].metadata["start_index"])
+            rank, doc = members[0]
+            start, text = doc.metadata["start_index"], doc.page_content
+            for next_rank, next_doc in members[1:]:
+                next_start = next_doc.metadata["start_index"]
+                end = start + len(text)
+                if next_start <= end:
+                    # Overlapping or touching: append only the part not already covered
+                    text += next_doc.page_content[end - next_start:]
+                    rank = min(rank, next_rank)
+                else:
+                    merged.append((rank, self._passage(doc, start, text)))
+                    rank, doc, start, text = next_rank, next_doc, next_start, next_doc.page_content
+            merged.append((rank, self._passage(doc, start, text)))
+
+        merged.sort(key=lambda m: m[0])
+        return [doc for _, doc in merged]
+
+    @staticmethod
+    def _passage(doc: Document, start: int, text: str) -> Document:
+        if text == doc.page_content:
+            return doc
+        return Document(page_content=text, metadata={**doc.metadata, "start_index": start})
+
+    def _dedupe(self, passages: List[Document]) -> List[Document]:
+        kept, kept_shingles = [], []
+        for passage in passages:
+            passage_shingles = shingles(passage.page_content)
+            if any(jaccard(passage_shingles, other) >= self.dedupe_threshold for other in kept_shingles):
+                continue
+            kept.append(passage)
+            kept_shingles.append(passage_shingles)
+        return kept
+
+    def _truncate(self, passage: Document, max_tokens: int) -> Document:
+        text = passage.page_content
+        overhead = self.count_tokens(self.format_docs([Document(page_content="", metadata=passage.metadata)]))
+        while text and self.count_tokens(text) > max_tokens - overhead:
+            text = text[:int(len(text) * 0.9)]
+        return Document(page_content=text, metadata=passage.metadata)
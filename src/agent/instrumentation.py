@@ -0,0 +1,59 @@
+import time
+from typing import Any, Dict
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from src.utils.metrics import COUNT_BUCKETS, TOKEN_BUCKETS, record_stage, registry
+
+LLM_TOKENS = registry.counter("tutor_llm_tokens_total", "Tokens reported by the LLM provider, by type (prompt/completion).")
+PROMPT_TOKENS = registry.histogram("tutor_llm_prompt_tokens", "Prompt size per LLM call, as reported by the provider.", TOKEN_BUCKETS)
+CONTEXT_TOKENS = registry.histogram("tutor_context_tokens", "Tokens of retrieved context sent per answer.", TOKEN_BUCKETS)
+CONTEXT_TOKENS_SAVED = registry.counter("tutor_context_tokens_saved_total", "Context tokens removed by merging, deduplication and the budget.")
+CHUNKS = registry.histogram("tutor_context_chunks", "Chunks per answer, by step (retrieved/used).", COUNT_BUCKETS)
+
+def record_context(packed):
+    """Records the token and chunk accounting of one packed context (see ContextPacker.pack)."""
+    CONTEXT_TOKENS.observe(packed.tokens)
+    CONTEXT_TOKENS_SAVED.inc(packed.tokens_saved)
+    CHUNKS.observe(packed.chunks_in, step="retrieved")
+    CHUNKS.observe(len(packed.docs), step="used")
+
+class LLMTimingCallback(BaseCallbackHandler):
+    """
+    Records the LLM stage of the chain: total time ("llm"), time to the
+    first streamed token ("llm_first_token") and provider token usage.
+    Runs inline so stage timings land in the caller's request trace.
+    """
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, float] = {}
+        self._first_token_seen = set()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts, *, run_id: UUID, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs):
+        started = self._started.get(run_id)
+        if started is not None and run_id not in self._first_token_seen:
+            self._first_token_seen.add(run_id)
+            record_stage("llm_first_token", time.perf_counter() - started)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        started = self._started.pop(run_id, None)
+        self._first_token_seen.discard(run_id)
+        if started is not None:
+            record_stage("llm", time.perf_counter() - started)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.inc(usage.get("input_tokens", 0), type="prompt")
+                    LLM_TOKENS.inc(usage.get("output_tokens", 0), type="completion")
+                    PROMPT_TOKENS.observe(usage.get("input_tokens", 0))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._started.pop(run_id, None)
+        self._first_token_seen.discard(run_id)
@@ -1,4 +1,4 @@
-from src.rag.vector_store import RAGPipeline
+from src.rag.resources import get_rag_pipeline
 from typing import List
 from langchain_core.tools import Tool
 
@@ -7,7 +7,7 @@ class ToolFactory:
     Factory class to create tools for the agent (Open/Closed Principle).
     """
     def __init__(self):
-        self.rag = RAGPipeline()
+        self.rag = get_rag_pipeline()
 
     def create_tools(self) -> List[Tool]:
         """Creates and returns the list of tools available to the agent."""
@@ -1,11 +1,20 @@
-from langchain_openai import ChatOpenAI
+import asyncio
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import AIMessage, HumanMessage
 from src.config.settings import config
-from src.rag.vector_store import RAGPipeline
-from src.memory.memory_manager import BaseMemoryManager, InMemoryHistoryManager
+from src.agent.context_packer import ContextPacker
+from src.agent.answer_cache import SemanticAnswerCache, chunk_ids, is_history_independent
+from src.agent.instrumentation import LLMTimingCallback, record_context
+from src.rag.resources import get_rag_pipeline
+from src.rag.local_embeddings import get_local_embeddings
+from src.rag.reranker import Reranker, RerankingRetriever, get_cross_encoder
+from src.memory.memory_manager import BaseMemoryManager, BoundedHistoryManager, llm_summarizer
+from src.memory.sqlite_manager import SQLiteHistoryManager
+from src.utils.metrics import stage
+from src.utils.tokens import tiktoken_counter
 
 def format_docs(docs):
     """Enhanced document formatting to preserve all content and improve comprehension."""
@@ -17,18 +26,42 @@ def format_docs(docs):
     
     return "\n\n".join(formatted_parts)
 
+def source_list(docs):
+    """Unique (source, page) pairs of the retrieved documents, in retrieval order."""
+    sources = []
+    seen = set()
+    for doc in docs:
+        source = doc.metadata.get('source', 'Unknown document')
+        page = doc.metadata.get('page')
+        if (source, page) not in seen:
+            seen.add((source, page))
+            sources.append({"source": source, "page": page})
+    return sources
+
 class TutorAgent:
-    def __init__(self, memory_manager: BaseMemoryManager = None):
-        self.llm = ChatOpenAI(
-            model=config.MODEL_NAME, 
-            temperature=0.3, 
-            openai_api_key=config.OPENAI_API_KEY
-        )
-        self.rag = RAGPipeline()
-        self.retriever = self.rag.get_retriever(k=12)  # Get more documents for comprehensive answers
+    def __init__(self, memory_manager: BaseMemoryManager = None, llm=None):
+        if llm is None:
+            from langchain_openai import ChatOpenAI  # Heavy; imported when the agent is built, not with the module
+
+            llm = ChatOpenAI(
+                model=config.MODEL_NAME, 
+                temperature=0.3, 
+                openai_api_key=config.OPENAI_API_KEY
+            )
+        self.llm = llm
+        self.rag = get_rag_pipeline()
+        self.retrieval_k = 12  # Get more documents for comprehensive answers
+        self.reranker = self._default_reranker()
+        if self.reranker is not None:
+            # Fetch a wider candidate set; the reranker keeps the best, least redundant ones
+            self.retriever = RerankingRetriever(
+                base=self.rag.get_retriever(k=config.RERANK_FETCH_K), reranker=self.reranker
+            )
+        else:
+            self.retriever = self.rag.get_retriever(k=self.retrieval_k)
         
         # Dependency Injection (DIP)
-        self.memory_manager = memory_manager or InMemoryHistoryManager()
+        self.memory_manager = memory_manager or self._default_memory_manager()
         
         # System Prompt (comprehensive with focus on listing all types/categories)
         system_prompt = (
@@ -56,6 +89,97 @@ class TutorAgent:
             ]
         )
         
+        # Bounds concurrent LLM calls from the async path so one worker can
+        # keep many sessions in flight without flooding the provider.
+        self._llm_semaphore = asyncio.Semaphore(config.LLM_MAX_CONCURRENCY)
+
+        # Merges overlapping chunks and trims the context to a token budget
+        self.context_packer = ContextPacker(
+            format_docs,
+            max_tokens=config.CONTEXT_TOKEN_BUDGET,
+            dedupe_threshold=config.CONTEXT_DEDUPE_THRESHOLD,
+            count_tokens=tiktoken_counter(config.MODEL_NAME),
+        )
+
+        # Repeated standalone questions over an unchanged index reuse earlier answers
+        self.answer_cache = SemanticAnswerCache(
+            max_size=config.ANSWER_CACHE_SIZE,
+            threshold=config.ANSWER_CACHE_THRESHOLD,
+        ) if config.ANSWER_CACHE_SIZE > 0 else None
+
+        # Times the LLM stage (and first streamed token) of every chain run
+        self._llm_callback = LLMTimingCallback()
+
+        self._build_chain()
+
+    def _run_config(self, session_id: str) -> dict:
+        return {"configurable": {"session_id": session_id}, "callbacks": [self._llm_callback]}
+
+    def _default_memory_manager(self) -> BaseMemoryManager:
+        """Memory manager selected by config.MEMORY_BACKEND."""
+        if config.MEMORY_BACKEND == "sqlite":
+            # Shared by all server workers on this host
+            return SQLiteHistoryManager(
+                config.SESSION_DB_PATH,
+                flush_interval=config.SESSION_DB_FLUSH_SECONDS,
+                max_cached_sessions=config.SESSION_MAX_COUNT,
+                session_token_budget=config.HISTORY_TOKEN_BUDGET,
+                ttl_seconds=config.SESSION_TTL_SECONDS,
+            )
+        return BoundedHistoryManager(
+            max_sessions=config.SESSION_MAX_COUNT,
+            ttl_seconds=config.SESSION_TTL_SECONDS,
+            max_total_tokens=config.SESSION_MEMORY_MAX_TOKENS,
+            session_token_budget=config.HISTORY_TOKEN_BUDGET,
+            summarizer=llm_summarizer(self.llm) if config.HISTORY_SUMMARIZE else None,
+        )
+
+    @staticmethod
+    def _default_reranker():
+        """Reranker configured by the RERANK_* settings, or None when disabled."""
+        if not config.RERANK_ENABLED:
+            return None
+        cross_encoder = None
+        if config.RERANK_CROSS_ENCODER:
+            try:
+                cross_encoder = get_cross_encoder(config.RERANK_CROSS_ENCODER)
+            except Exception as e:
+                print(f"Cross-encoder unavailable, reranking with MMR only: {e}")
+        return Reranker(
+            get_local_embeddings(config.LOCAL_EMBEDDING_BACKEND),
+            k=config.RERANK_TOP_K,
+            lambda_mult=config.RERANK_MMR_LAMBDA,
+            cross_encoder=cross_encoder,
+            budget_ms=config.RERANK_BUDGET_MS,
+        )
+
+    def _pack_context(self, x, docs):
+        """Packs the retrieved chunks into the token budget; token accounting goes to x["details"]."""
+        with stage("pack_context"):
+            packed = self.context_packer.pack(docs)
+        record_context(packed)
+        if x.get("details") is not None:
+            x["details"].update(packed.to_dict())
+        return format_docs(packed.docs)
+
+    def _retrieve_context(self, x):
+        docs = x.get("docs")
+        if docs is None:
+            with stage("retrieve"):
+                docs = self.retriever.invoke(x["input"])
+        return self._pack_context(x, docs)
+
+    async def _aretrieve_context(self, x):
+        # Callers that already retrieved (e.g. streaming, which reports the
+        # sources first) pass the documents in so we don't search twice.
+        docs = x.get("docs")
+        if docs is None:
+            with stage("retrieve"):
+                docs = await self.retriever.ainvoke(x["input"])
+        return self._pack_context(x, docs)
+
+    def _build_chain(self):
+        """Builds the conversational RAG chain around the current retriever."""
         # Construct Chain using pure LCEL (No 'create_retrieval_chain' dependency)
         # 1. Retrieve context
         # 2. Format context
@@ -63,11 +187,12 @@ class TutorAgent:
         # 4. Generate answer
         
         # We need a chain that accepts 'input' and 'chat_history'
-        # The retriever needs 'input'.
+        # The retriever needs 'input'. The async variant is used by ainvoke so
+        # retrieval never blocks the event loop.
         
         rag_chain = (
             RunnablePassthrough.assign(
-                context=lambda x: format_docs(self.retriever.invoke(x["input"]))
+                context=RunnableLambda(self._retrieve_context, afunc=self._aretrieve_context)
             )
             | self.prompt
             | self.llm
@@ -80,43 +205,220 @@ class TutorAgent:
             self.memory_manager.get_session_history,
             input_messages_key="input",
             history_messages_key="chat_history",
-            output_messages_key="answer", # StrOutputParser returns the string directly as output
+            # No output_messages_key: StrOutputParser returns the string directly as output
         )
 
-    def ask(self, question: str, session_id: str = "default_session"):
-        """Ask a question to the AI Tutor with memory."""
+    def _cacheable(self, question: str, session_id: str) -> bool:
+        """Only first turns and questions that don't refer back can share answers."""
+        if self.answer_cache is None:
+            return False
+        history = self.memory_manager.get_session_history(session_id).messages
+        return not history or is_history_independent(question)
+
+    def _index_generation(self):
+        snapshot = self.rag.handle.snapshot()
+        return snapshot.generation if snapshot else None
+
+    def _record_turn(self, session_id: str, question: str, answer: str):
+        """Writes a turn answered from the cache to the session history."""
+        self.memory_manager.get_session_history(session_id).add_messages(
+            [HumanMessage(content=question), AIMessage(content=answer)]
+        )
+
+    def ask(self, question: str, session_id: str = "default_session", details: dict = None):
+        """
+        Ask a question to the AI Tutor with memory.
+        If `details` is given it is filled with the context token accounting
+        (see PackedContext.to_dict) or {"answer_cache": "hit"}.
+        """
+        docs = vector = None
+        if self._cacheable(question, session_id):
+            with stage("embed_query"):
+                vector = self.rag.embeddings.embed_query(question)
+            with stage("retrieve"):
+                docs = self.retriever.invoke(question)  # Reuses the query embedding just cached
+            key, generation = chunk_ids(docs), self._index_generation()
+            with stage("answer_cache_lookup"):
+                cached = self.answer_cache.get(vector, key, generation)
+            if cached is not None:
+                self._record_turn(session_id, question, cached)
+                if details is not None:
+                    details["answer_cache"] = "hit"
+                return cached
+
         # For RunnableWithMessageHistory wrapping a chain that returns a string, 
         # the output is just the result.
         response_text = self.conversational_rag_chain.invoke(
-            {"input": question},
-            config={"configurable": {"session_id": session_id}}
+            {"input": question, "docs": docs, "details": details},
+            config=self._run_config(session_id)
         )
+        if vector is not None:
+            self.answer_cache.put(vector, key, generation, response_text)
         return response_text
 
+    async def _acached_answer(self, question: str, session_id: str):
+        """Returns (docs, cache_entry, cached_answer); docs is None if the cache does not apply."""
+        if not self._cacheable(question, session_id):
+            return None, None, None
+        with stage("embed_query"):
+            vector = await self.rag.embeddings.aembed_query(question)
+        with stage("retrieve"):
+            docs = await self.retriever.ainvoke(question)
+        entry = (vector, chunk_ids(docs), self._index_generation())
+        with stage("answer_cache_lookup"):
+            return docs, entry, self.answer_cache.get(*entry)
+
+    async def aask(self, question: str, session_id: str = "default_session", details: dict = None):
+        """Async version of ask() that does not block the event loop."""
+        docs, entry, cached = await self._acached_answer(question, session_id)
+        if cached is not None:
+            self._record_turn(session_id, question, cached)
+            if details is not None:
+                details["answer_cache"] = "hit"
+            return cached
+
+        async with self._llm_semaphore:
+            response_text = await self.conversational_rag_chain.ainvoke(
+                {"input": question, "docs": docs, "details": details},
+                config=self._run_config(session_id)
+            )
+        if entry is not None:
+            self.answer_cache.put(*entry, response_text)
+        return response_text
+
+    async def astream_answer(self, question: str, session_id: str = "default_session"):
+        """
+        Stream an answer as events: the retrieved sources first, then the answer token by token,
+        then a "context" event with the context token accounting.
+        The turn is written to the session history only once the stream completes.
+        """
+        docs, entry, cached = await self._acached_answer(question, session_id)
+        if cached is not None:
+            yield {"type": "sources", "sources": source_list(docs)}
+            yield {"type": "token", "content": cached}
+            self._record_turn(session_id, question, cached)
+            yield {"type": "context", "answer_cache": "hit"}
+            return
+
+        async with self._llm_semaphore:
+            if docs is None:
+                with stage("retrieve"):
+                    docs = await self.retriever.ainvoke(question)
+            yield {"type": "sources", "sources": source_list(docs)}
+
+            tokens, details = [], {}
+            async for token in self.conversational_rag_chain.astream(
+                {"input": question, "docs": docs, "details": details},
+                config=self._run_config(session_id)
+            ):
+                if token:
+                    tokens.append(token)
+                    yield {"type": "token", "content": token}
+        if entry is not None:
+            self.answer_cache.put(*entry, "".join(tokens))
+        yield {"type": "context", **details}
+
+    def warm_up(self, embed_query: bool = False):
+        """Loads everything lazily initialised on the first request (index pages, token encoding, reranker model)."""
+        self.rag.warm_up(embed_query=embed_query)
+        self.context_packer.count_tokens("warm-up")
+        if self.reranker is not None:
+            self.reranker.embeddings.embed_query("warm-up")
+
     def refresh_retriever(self):
-        """Reload the retriever with updated index (after new document upload)."""
+        """
+        Reload the index from disk (e.g. after an ingest run in another process).
+        Uploads handled by this process are already visible: the retriever reads
+        the shared live index, so no reload or chain rebuild is needed for them.
+        """
         print("Refreshing retriever with updated knowledge base...")
-        self.rag = RAGPipeline()
-        self.retriever = self.rag.get_retriever(k=12)  # Get more documents for comprehensive answers
+        self.rag.load_index(from_disk=True)
+        print("Retriever refreshed successfully.")
+
+    @staticmethod
+    def _expand_queries(query: str):
+        """For questions about types/categories, expand search terms."""
+        search_queries = [query]
         
-        # Rebuild the chain with new retriever
-        rag_chain = (
-            RunnablePassthrough.assign(
-                context=lambda x: format_docs(self.retriever.invoke(x["input"]))
-            )
-            | self.prompt
-            | self.llm
-            | StrOutputParser()
-        )
+        # If asking about types, add variations to capture more content
+        if any(word in query.lower() for word in ['types', 'kinds', 'categories', 'methods', 'techniques', 'approaches']):
+            base_term = query.lower()
+            # Extract the main concept
+            for word in ['types of', 'kinds of', 'categories of', 'methods of', 'techniques of']:
+                if word in base_term:
+                    concept = base_term.split(word)[1].strip()
+                    search_queries.extend([
+                        concept,
+                        f"{concept} methods",
+                        f"{concept} techniques", 
+                        f"{concept} approaches",
+                        f"different {concept}",
+                        f"{concept} examples"
+                    ])
+                    break
+        return search_queries
+
+    @staticmethod
+    def _dedupe_docs(doc_lists):
+        """Combine results of several searches, dropping repeated chunks (by chunk id; by text if a result has none)."""
+        all_docs = []
+        seen = set()
         
-        self.conversational_rag_chain = RunnableWithMessageHistory(
-            rag_chain,
-            self.memory_manager.get_session_history,
-            input_messages_key="input",
-            history_messages_key="chat_history",
-            output_messages_key="answer",
-        )
-        print("Retriever refreshed successfully.")
+        for docs in doc_lists:
+            for doc in docs:
+                key = doc.id if doc.id is not None else doc.page_content.strip()
+                if key not in seen:
+                    seen.add(key)
+                    all_docs.append(doc)
+        return all_docs
+
+    @staticmethod
+    def _format_search_results(all_docs, k: int) -> str:
+        if not all_docs:
+            return "No relevant information found in the uploaded documents. Please upload a document first or try a different question."
+        
+        # Candidates arrive best first when reranking is on; take top k*2 for comprehensive coverage
+        unique_docs = all_docs[:k*2]  # Get more docs for comprehensive answers
+        
+        # Format the results nicely
+        results = []
+        results.append("📚 **Found relevant information from your documents:**\n")
+        
+        # Show ONLY the top result as requested
+        for i, doc in enumerate(unique_docs[:1], 1):
+            source = doc.metadata.get('source', 'Unknown document')
+            # Get just the filename
+            if '/' in source or '\\' in source:
+                source = source.replace('\\', '/').split('/')[-1]
+            
+            content = doc.page_content.strip()
+            # Truncate if too long
+            if len(content) > 500:
+                content = content[:500] + "..."
+            
+            results.append(f"**📄 Source {i}: {source}**")
+            results.append(f"> {content}\n")
+        
+        return "\n".join(results)
+
+    def _search_many(self, queries):
+        """
+        Document-only search. The default modes make no network calls, so it
+        keeps working when the provider is unavailable:
+          local   - the offline index (local embeddings) fused with BM25
+          keyword - BM25 over the main index
+          vector  - provider embeddings (all variants in one batched call)
+        """
+        mode = config.DOCUMENT_SEARCH_MODE
+        if mode == "vector":
+            return self.rag.search_many(queries, k=self.retrieval_k)
+        if mode == "local" and self.rag.local is not None:
+            try:
+                return self.rag.local.hybrid_search_many(queries, k=self.retrieval_k)
+            except ValueError as e:
+                # No local index yet (the main index predates it)
+                print(f"Local index unavailable, using keyword search: {e}")
+        return self.rag.keyword_search_many(queries, k=self.retrieval_k)
 
     def search_documents(self, query: str, k: int = 8) -> str:
         """
@@ -124,64 +426,34 @@ class TutorAgent:
         Enhanced to find comprehensive answers for types/categories questions.
         """
         try:
-            # For questions about types/categories, expand search terms
-            search_queries = [query]
-            
-            # If asking about types, add variations to capture more content
-            if any(word in query.lower() for word in ['types', 'kinds', 'categories', 'methods', 'techniques', 'approaches']):
-                base_term = query.lower()
-                # Extract the main concept
-                for word in ['types of', 'kinds of', 'categories of', 'methods of', 'techniques of']:
-                    if word in base_term:
-                        concept = base_term.split(word)[1].strip()
-                        search_queries.extend([
-                            concept,
-                            f"{concept} methods",
-                            f"{concept} techniques", 
-                            f"{concept} approaches",
-                            f"different {concept}",
-                            f"{concept} examples"
-                        ])
-                        break
+            search_queries = self._expand_queries(query)
             
-            # Perform multiple searches and combine results
-            all_docs = []
-            seen_content = set()
-            
-            for search_query in search_queries:
-                docs = self.retriever.invoke(search_query)
-                for doc in docs:
-                    content_hash = doc.page_content.strip()[:200]  # Use first 200 chars as fingerprint
-                    if content_hash not in seen_content:
-                        seen_content.add(content_hash)
-                        all_docs.append(doc)
-            
-            if not all_docs:
-                return "No relevant information found in the uploaded documents. Please upload a document first or try a different question."
-            
-            # Sort by relevance score (if available) and take top k*2 for comprehensive coverage
-            unique_docs = all_docs[:k*2]  # Get more docs for comprehensive answers
-            
-            # Format the results nicely
-            results = []
-            results.append("📚 **Found relevant information from your documents:**\n")
-            
-            # Show ONLY the top result as requested
-            for i, doc in enumerate(unique_docs[:1], 1):
-                source = doc.metadata.get('source', 'Unknown document')
-                # Get just the filename
-                if '/' in source or '\\' in source:
-                    source = source.replace('\\', '/').split('/')[-1]
-                
-                content = doc.page_content.strip()
-                # Truncate if too long
-                if len(content) > 500:
-                    content = content[:500] + "..."
-                
-                results.append(f"**📄 Source {i}: {source}**")
-                results.append(f"> {content}\n")
+            # Search all variants together and combine results
+            with stage("document_search"):
+                all_docs = self._dedupe_docs(self._search_many(search_queries))
+            if self.reranker is not None:
+                with stage("rerank"):
+                    all_docs = self.reranker.rerank(query, all_docs, k=k * 2)
+            return self._format_search_results(all_docs, k)
+        except Exception as e:
+            return f"Error searching documents: {str(e)}"
+
+    async def asearch_documents(self, query: str, k: int = 8) -> str:
+        """Async version of search_documents()."""
+        try:
+            search_queries = self._expand_queries(query)
             
-            return "\n".join(results)
+            with stage("document_search"):
+                if config.DOCUMENT_SEARCH_MODE == "vector":
+                    results = await self.rag.asearch_many(search_queries, k=self.retrieval_k)
+                else:
+                    loop = asyncio.get_running_loop()
+                    results = await loop.run_in_executor(None, self._search_many, search_queries)
+            all_docs = self._dedupe_docs(results)
+            if self.reranker is not None:
+                with stage("rerank"):
+                    all_docs = await self.reranker.arerank(query, all_docs, k=k * 2)
+            return self._format_search_results(all_docs, k)
         except Exception as e:
             return f"Error searching documents: {str(e)}"
 
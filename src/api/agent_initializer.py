@@ -0,0 +1,94 @@
+import asyncio
+import random
+import time
+import traceback
+from typing import Any, Callable, Optional
+
+class AgentInitializer:
+    """
+    Builds the tutor agent in the background so the server accepts
+    connections, and answers liveness checks, while the index loads.
+
+    Building and warm-up run in a worker thread. A failed build (no index
+    yet, provider unreachable, ...) is retried with exponential backoff and
+    jitter until it succeeds; wake() cuts the current wait short, e.g. when
+    an upload has just created the first index. Warm-up failures are logged
+    but do not hold back readiness.
+    """
+    def __init__(self, build: Callable[[], Any], on_ready: Callable[[Any], None],
+                 warm_up: Optional[Callable[[Any], None]] = None,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.build = build
+        self.on_ready = on_ready
+        self.warm_up = warm_up
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = "pending"  # pending | starting | retrying | warming | ready
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self._loop = None
+        self._wake = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def next_delay(self) -> float:
+        """Backoff before the next attempt: doubling per failure, capped, with jitter."""
+        delay = min(self.max_delay, self.base_delay * 2 ** max(0, self.attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def run(self):
+        """Builds (and warms) the agent, retrying until it succeeds. Returns the agent."""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self.started_at = time.monotonic()
+        while True:
+            self.attempts += 1
+            self.state = "starting"
+            try:
+                agent = await asyncio.to_thread(self.build)
+                break
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                delay = self.next_delay()
+                print(f"Tutor Agent initialization failed (attempt {self.attempts}): {self.error}. Retrying in {delay:.1f}s.", flush=True)
+                traceback.print_exc()
+                self.state = "retrying"
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+        if self.warm_up is not None:
+            self.state = "warming"
+            try:
+                await asyncio.to_thread(self.warm_up, agent)
+            except Exception as e:
+                print(f"Warm-up failed, serving anyway: {e}", flush=True)
+
+        self.error = None
+        self.on_ready(agent)
+        self.state = "ready"
+        self.ready_at = time.monotonic()
+        print(f"AI Tutor Agent ready after {self.ready_at - self.started_at:.1f}s ({self.attempts} attempt(s)).", flush=True)
+        return agent
+
+    def wake(self):
+        """Retries immediately instead of waiting out the backoff. Safe to call from any thread."""
+        if self._loop is not None and not self.ready:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def stats(self) -> dict:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.ready_at or time.monotonic()) - self.started_at
+        return {
+            "state": self.state,
+            "attempts": self.attempts,
+            "error": self.error,
+            "seconds": round(elapsed, 3) if elapsed is not None else None,
+        }
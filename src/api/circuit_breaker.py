@@ -0,0 +1,59 @@
+import threading
+import time
+
+class CircuitBreaker:
+    """
+    Tracks failures of the LLM/embedding provider.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    allow() returns False, so requests go straight to the offline document
+    search instead of waiting for the provider to time out or reject them.
+    Every `retry_seconds` one request is let through as a trial; a success
+    closes the circuit again, a failure keeps it open for another period.
+    """
+    def __init__(self, failure_threshold: int = 3, retry_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.retry_seconds = retry_seconds
+        self._failures = 0
+        self._opened_at = None  # None while closed
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.short_circuited = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """True if a request should try the provider."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.retry_seconds:
+                # Let this request through as a trial; others keep skipping
+                self._opened_at = time.monotonic()
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self.trips += 1
+                    print(f"Provider failing ({self._failures} consecutive errors); using offline mode for {self.retry_seconds}s.")
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": "open" if self.is_open else "closed",
+            "consecutive_failures": self._failures,
+            "trips": self.trips,
+            "short_circuited": self.short_circuited,
+        }
@@ -0,0 +1,107 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+class IngestJob:
+    """Status of one background ingestion, as reported by /jobs/{id}."""
+    def __init__(self, filename: str, content_hash: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.content_hash = content_hash
+        self.status = "queued"  # queued | running | completed | failed
+        self.stage = "queued"  # parsing | parsed | splitting | embedding | committing | indexed | done
+        self.pages_parsed = 0
+        self.chunks_embedded = 0
+        self.chunks_total = 0
+        self.result: Optional[dict] = None  # What indexing did (see RAGPipeline.update_document)
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def update(self, stage: str, **counters):
+        """Progress callback handed to ingest_single_file."""
+        self.stage = stage
+        for name, value in counters.items():
+            setattr(self, name, value)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "content_hash": self.content_hash,
+            "status": self.status,
+            "stage": self.stage,
+            "pages_parsed": self.pages_parsed,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_total": self.chunks_total,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+class IngestJobManager:
+    """
+    Runs ingestion jobs on a worker pool so /upload can return immediately.
+    Jobs are deduplicated by file name and content hash: submitting a file
+    whose identical upload is still queued or running returns that job.
+    Once a job has finished, the same upload runs again, and the index
+    decides whether it changes anything (e.g. re-uploading an older version
+    is a revert, not a duplicate).
+    """
+    def __init__(self, max_workers: int = 2, max_history: int = 500):
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs: Dict[str, IngestJob] = {}
+        self._active: Dict[tuple, IngestJob] = {}  # (filename, content hash) -> queued or running job
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str, content_hash: str, work: Callable[[IngestJob], bool]):
+        """
+        Queues `work(job)` unless the same content is already handled.
+        Returns (job, deduplicated).
+        """
+        key = (filename, content_hash)
+        with self._lock:
+            existing = self._active.get(key)
+            if existing is not None:
+                return existing, True
+            job = IngestJob(filename, content_hash)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._prune()
+
+        self._executor.submit(self._run, job, work)
+        return job, False
+
+    def _run(self, job: IngestJob, work: Callable[[IngestJob], bool]):
+        job.status = "running"
+        try:
+            if not work(job):
+                raise Exception("Failed to process document")
+            job.stage = "done"
+            job.status = "completed"
+        except Exception as e:
+            print(f"Ingest job {job.id} failed: {e}")
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            with self._lock:
+                job.finished_at = time.time()
+                del self._active[(job.filename, job.content_hash)]
+
+    def _prune(self):
+        """Forgets the oldest finished jobs beyond max_history (caller holds the lock)."""
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        for job in sorted(finished, key=lambda j: j.finished_at)[:max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
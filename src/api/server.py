@@ -1,70 +1,233 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
 from src.agent.tutor import TutorAgent
+from src.api.jobs import IngestJobManager
+from src.api.agent_initializer import AgentInitializer
+from src.api.circuit_breaker import CircuitBreaker
+from src.config.settings import ENV_PATH, config
 from src.ingest import ingest_data, ingest_single_file
-import uvicorn
+from src.rag.resources import aclose_resources
+from src.utils.metrics import registry, start_trace
+import asyncio
+import hashlib
+import json
 import os
-import shutil
+import sys
+import threading
+import time
 import traceback
+import uuid
 
 # Initialize FastAPI app
 app = FastAPI(title="AI Tutor API", version="1.0.0")
 
 # Global State
 tutor_agent = None
-init_error = None
+ingest_jobs = IngestJobManager(max_workers=config.INGEST_WORKERS)
+provider_breaker = CircuitBreaker(
+    failure_threshold=config.PROVIDER_FAILURE_THRESHOLD,
+    retry_seconds=config.PROVIDER_RETRY_SECONDS,
+)
+
+def set_tutor_agent(agent):
+    global tutor_agent
+    tutor_agent = agent
+
+def warm_up_agent(agent):
+    agent.warm_up(embed_query=config.STARTUP_WARMUP_EMBEDDING)
+
+agent_initializer = AgentInitializer(
+    build=TutorAgent,
+    on_ready=set_tutor_agent,
+    warm_up=warm_up_agent if config.STARTUP_WARMUP else None,
+    base_delay=config.STARTUP_RETRY_BASE_SECONDS,
+    max_delay=config.STARTUP_RETRY_MAX_SECONDS,
+)
+
+REQUEST_SECONDS = registry.histogram("tutor_request_duration_seconds", "Chat request latency, by endpoint and answer mode.")
+
+def _agent_stats(read):
+    """Gauge reader over the current agent; reports nothing while it is starting."""
+    def stats():
+        return read(tutor_agent) if tutor_agent else {}
+    return stats
+
+def _cache_stats(agent) -> dict:
+    caches = {"embedding": agent.rag.embeddings, "query": agent.rag.embeddings.query_cache}
+    if agent.answer_cache is not None:
+        caches["answer"] = agent.answer_cache
+    return {(("cache", name),): cache.stats()["hit_rate"] for name, cache in caches.items()}
+
+def _index_stats(agent) -> dict:
+    snapshot = agent.rag.handle.snapshot()
+    return {(): snapshot.ntotal} if snapshot else {}
+
+def _session_stats(agent) -> dict:
+    if not hasattr(agent.memory_manager, "stats"):
+        return {}
+    return {(): agent.memory_manager.stats()["sessions"]}
+
+registry.gauge_callback("tutor_cache_hit_ratio", "Hit rate of each cache since startup.", _agent_stats(_cache_stats))
+registry.gauge_callback("tutor_index_chunks", "Chunks in the live index.", _agent_stats(_index_stats))
+registry.gauge_callback("tutor_sessions", "Chat sessions currently held.", _agent_stats(_session_stats))
+registry.gauge_callback(
+    "tutor_provider_circuit_open", "1 while requests skip the failing provider.",
+    lambda: {(): int(provider_breaker.is_open)},
+)
 
 # Request Models
 class ChatRequest(BaseModel):
     message: str
     session_id: str = "default_session"
     use_ai: bool = True  # Toggle for AI mode vs Document-only mode
+    include_timings: bool = False  # Add the per-stage latency breakdown to the response
 
 class ChatResponse(BaseModel):
     answer: str
     mode: str = "ai"  # "ai" or "document_only"
+    context: Optional[dict] = None  # Context token accounting for AI answers (tokens_saved, ...)
+    timings: Optional[dict] = None  # Milliseconds per stage, if include_timings was set
+
+def is_quota_error(error: Exception) -> bool:
+    """True if the LLM provider rejected the call for quota/rate-limit reasons."""
+    error_str = str(error)
+    return "RESOURCE_EXHAUSTED" in error_str or "429" in error_str or "quota" in error_str.lower()
+
+def is_provider_error(error: Exception) -> bool:
+    """True if the provider is unavailable: quota, rate limit, timeout, connection or 5xx errors."""
+    if is_quota_error(error):
+        return True
+    # The SDK is only imported once a provider client exists, so an error
+    # cannot be an openai exception while the module is not loaded yet
+    openai = sys.modules.get("openai")
+    if openai is None:
+        return False
+    provider_errors = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+    return isinstance(error, provider_errors)
+
+def sse_event(event: str, data: dict) -> str:
+    """Formats one Server-Sent-Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def require_agent():
+    """The tutor agent, or a 503 the client can retry while it is still starting."""
+    if not tutor_agent:
+        detail_msg = f"Tutor Agent is not ready ({agent_initializer.state}). Error: {agent_initializer.error}"
+        raise HTTPException(status_code=503, detail=detail_msg, headers={"Retry-After": "5"})
+    return tutor_agent
+
+def staging_dir() -> str:
+    """Where uploads wait for their ingest job (not scanned by the loader, same filesystem as the PDFs)."""
+    return os.path.join(config.RAW_PDFS_DIR, ".uploads")
+
+def save_upload(upload: UploadFile) -> tuple:
+    """
+    Writes the upload to its own file in the staging directory, named by its
+    SHA-256, so concurrent uploads never write the same file. Returns (hash, path).
+    """
+    os.makedirs(staging_dir(), exist_ok=True)
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(staging_dir(), f"{uuid.uuid4().hex}.part")
+    with open(tmp_path, "wb") as buffer:
+        for block in iter(lambda: upload.file.read(1024 * 1024), b""):
+            digest.update(block)
+            buffer.write(block)
+    content_hash = digest.hexdigest()
+    staged_path = os.path.join(staging_dir(), f"{content_hash}-{uuid.uuid4().hex[:8]}.pdf")
+    os.replace(tmp_path, staged_path)
+    return content_hash, staged_path
+
+def discard_staged(staged_path: str):
+    """Removes a staged upload that an identical queued or running job already covers."""
+    try:
+        os.remove(staged_path)
+    except FileNotFoundError:
+        pass
+
+_filename_locks = {}
+_filename_locks_guard = threading.Lock()
+
+def filename_lock(filename: str) -> threading.Lock:
+    """One lock per PDF name: jobs for the same name publish and ingest it one at a time."""
+    with _filename_locks_guard:
+        return _filename_locks.setdefault(filename, threading.Lock())
 
 @app.on_event("startup")
 async def startup_event():
-    global tutor_agent, init_error
-    from src.config.settings import config
-    print(f"Server Startup. Using Key: {config.OPENAI_API_KEY[:10]}...", flush=True)
-    print("Attempting to initialize Tutor Agent...", flush=True)
-    try:
-        tutor_agent = TutorAgent()
-        print("AI Tutor Agent initialized successfully.", flush=True)
-    except Exception as e:
-        error_msg = f"{type(e).__name__}: {str(e)}"
-        print(f"CRITICAL ERROR: Failed to initialize Tutor Agent: {error_msg}", flush=True)
-        traceback.print_exc()
-        init_error = error_msg
+    if config.OPENAI_API_KEY:
+        print(f"Server Startup. Using Key: {config.OPENAI_API_KEY[:10]}...", flush=True)
+    else:
+        print(f"ERROR: Could not find OPENAI_API_KEY (checked the environment and {ENV_PATH}).", flush=True)
+    # Build the agent in the background so the server binds immediately;
+    # requests get 503 + Retry-After until it is ready.
+    print("Initializing Tutor Agent in the background...", flush=True)
+    app.state.agent_init_task = asyncio.create_task(agent_initializer.run())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await aclose_resources()
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness: the process is up and serving requests (the agent may still be starting)."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: 200 once the agent can answer, 503 while it is starting or retrying."""
+    if tutor_agent:
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content=agent_initializer.stats())
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint to verify API is running."""
-    status = "ready" if tutor_agent else "failed"
-    return {
+    status = "ready" if tutor_agent else agent_initializer.state
+    response = {
         "status": status, 
-        "error": init_error
+        "error": agent_initializer.error,
+        "startup": agent_initializer.stats(),
     }
+    if tutor_agent and hasattr(tutor_agent.memory_manager, "stats"):
+        # Session counts and eviction counters
+        response["sessions"] = tutor_agent.memory_manager.stats()
+    if tutor_agent and tutor_agent.answer_cache is not None:
+        response["answer_cache"] = tutor_agent.answer_cache.stats()
+    if tutor_agent and tutor_agent.reranker is not None:
+        response["reranker"] = tutor_agent.reranker.stats()
+    response["provider"] = provider_breaker.stats()
+    return response
+
+@app.get("/metrics")
+async def metrics():
+    """Stage latencies, token and chunk counts and cache hit rates in the Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
     Chat endpoint to interact with the AI Tutor.
     Supports AI mode and document-only mode (fallback).
+    With include_timings the response carries the time spent per stage.
     """
-    global tutor_agent
-    
-    if not tutor_agent:
-        detail_msg = f"Tutor Agent is not initialized. Error: {init_error}"
-        raise HTTPException(status_code=503, detail=detail_msg)
-    
-    # If user explicitly wants document-only mode
-    if not request.use_ai:
+    tutor_agent = require_agent()
+    start = time.perf_counter()
+    with start_trace() as timings:
+        response = await answer_chat(tutor_agent, request)
+    seconds = time.perf_counter() - start
+    REQUEST_SECONDS.observe(seconds, endpoint="/chat", mode=response.mode)
+    if request.include_timings:
+        response.timings = {**timings, "total": round(seconds * 1000, 3)}
+    return response
+
+async def answer_chat(tutor_agent, request: ChatRequest) -> ChatResponse:
+    # Document-only mode: chosen by the user, or the provider is known to be failing
+    if not request.use_ai or not provider_breaker.allow():
         try:
-            response = tutor_agent.search_documents(request.message)
+            response = await tutor_agent.asearch_documents(request.message)
             return ChatResponse(answer=response, mode="document_only")
         except Exception as e:
             print(f"Error in document search: {e}")
@@ -72,18 +235,20 @@ async def chat(request: ChatRequest):
     
     # Try AI mode first
     try:
-        response = tutor_agent.ask(request.message, session_id=request.session_id)
-        return ChatResponse(answer=response, mode="ai")
+        details = {}
+        response = await tutor_agent.aask(request.message, session_id=request.session_id, details=details)
+        provider_breaker.record_success()
+        return ChatResponse(answer=response, mode="ai", context=details or None)
     except Exception as e:
-        error_str = str(e)
         print(f"Error processing chat request: {e}")
         traceback.print_exc()
         
-        # Check if it's a quota error - fallback to document search
-        if "RESOURCE_EXHAUSTED" in error_str or "429" in error_str or "quota" in error_str.lower():
-            print("AI quota exceeded, falling back to document search...")
+        # Provider unavailable (quota, outage) - fallback to offline document search
+        if is_provider_error(e):
+            provider_breaker.record_failure()
+            print("AI provider unavailable, falling back to document search...")
             try:
-                fallback_response = tutor_agent.search_documents(request.message)
+                fallback_response = await tutor_agent.asearch_documents(request.message)
                 return ChatResponse(answer=fallback_response, mode="document_only")
             except Exception as fallback_error:
                 print(f"Fallback also failed: {fallback_error}")
@@ -91,48 +256,127 @@ async def chat(request: ChatRequest):
         
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
-@app.post("/upload")
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint (Server-Sent Events).
+    Sends a 'sources' event, then 'token' events as the answer is generated,
+    then a 'done' event. Document-only mode sends the search result as one token.
+    With include_timings the 'done' event carries the time spent per stage.
+    """
+    tutor_agent = require_agent()
+
+    def done_event(mode: str, start: float, timings: dict) -> str:
+        seconds = time.perf_counter() - start
+        REQUEST_SECONDS.observe(seconds, endpoint="/chat/stream", mode=mode)
+        data = {"mode": mode}
+        if request.include_timings:
+            data["timings"] = {**timings, "total": round(seconds * 1000, 3)}
+        return sse_event("done", data)
+
+    async def document_only_events(start: float, timings: dict):
+        response = await tutor_agent.asearch_documents(request.message)
+        yield sse_event("token", {"content": response})
+        yield done_event("document_only", start, timings)
+
+    async def event_stream():
+        start = time.perf_counter()
+        with start_trace() as timings:
+            async for event in answer_events(start, timings):
+                yield event
+
+    async def answer_events(start: float, timings: dict):
+        if not request.use_ai or not provider_breaker.allow():
+            async for event in document_only_events(start, timings):
+                yield event
+            return
+
+        sent_tokens = False
+        try:
+            async for event in tutor_agent.astream_answer(request.message, session_id=request.session_id):
+                if event["type"] == "sources":
+                    yield sse_event("sources", {"sources": event["sources"]})
+                elif event["type"] == "context":
+                    yield sse_event("context", {k: v for k, v in event.items() if k != "type"})
+                else:
+                    sent_tokens = True
+                    yield sse_event("token", {"content": event["content"]})
+            provider_breaker.record_success()
+            yield done_event("ai", start, timings)
+        except Exception as e:
+            print(f"Error streaming chat response: {e}")
+            traceback.print_exc()
+
+            if is_provider_error(e):
+                provider_breaker.record_failure()
+            # Fallback only makes sense if the answer has not started yet
+            if is_provider_error(e) and not sent_tokens:
+                print("AI provider unavailable, falling back to document search...")
+                async for event in document_only_events(start, timings):
+                    yield event
+                return
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/upload", status_code=202)
 async def upload_document(file: UploadFile = File(...)):
     """
-    Upload a PDF file and add it to the knowledge base (fast incremental update).
+    Upload a PDF file and queue it for ingestion into the knowledge base.
+    Returns a job id right away; poll /jobs/{job_id} for progress.
     """
-    global tutor_agent
-    
     # 1. Validate File
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
     
-    # 2. Save File
-    from src.config.settings import config
+    # 2. Stage File (off the event loop); it only replaces RAW_PDFS_DIR/<filename> in its job
     save_path = os.path.join(config.RAW_PDFS_DIR, file.filename)
     
     try:
-        with open(save_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        print(f"File saved to: {save_path}")
-        
-        # 3. Fast incremental ingestion (only new file)
-        print("Starting fast incremental ingestion...")
-        success = ingest_single_file(save_path)
-        
-        if not success:
-            raise Exception("Failed to process document")
-        
-        # 4. Reload Agent's retriever (lightweight reload)
-        print("Refreshing Agent's knowledge base...")
-        if tutor_agent:
-            tutor_agent.refresh_retriever()
-        else:
-            tutor_agent = TutorAgent()
-        
-        return JSONResponse(content={"filename": file.filename, "message": "File uploaded and processed successfully."})
-        
+        content_hash, staged_path = await run_in_threadpool(save_upload, file)
+        print(f"File staged at: {staged_path}")
     except Exception as e:
-        print(f"Error during upload/ingest: {e}")
+        print(f"Error saving upload: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+    # 3. Incremental ingestion runs on the background worker pool
+    def work(job):
+        with filename_lock(file.filename):
+            os.replace(staged_path, save_path)
+            print(f"File saved to: {save_path}")
+            success = ingest_single_file(save_path, progress=job.update, content_hash=content_hash)
+        # The agent's retriever reads the shared live index, which the ingest
+        # just updated in place. If the agent is still waiting for an index,
+        # retry its initialization now instead of after the backoff.
+        if success and not tutor_agent:
+            agent_initializer.wake()
+        return success
+
+    job, deduplicated = ingest_jobs.submit(file.filename, content_hash, work)
+    if deduplicated:
+        await run_in_threadpool(discard_staged, staged_path)
+    message = "The same file is already being processed." if deduplicated else "File uploaded; processing started."
+    return JSONResponse(
+        status_code=202,
+        content={"filename": file.filename, "job_id": job.id, "status": job.status,
+                 "deduplicated": deduplicated, "message": message},
+    )
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Progress of a background ingestion job."""
+    job = ingest_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
+
 if __name__ == "__main__":
     # For debugging/development
+    import uvicorn
+
     uvicorn.run("src.api.server:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,46 +1,137 @@
-from dotenv import load_dotenv
 import os
+import threading
 from pathlib import Path
 
 # Get Project Root (3 levels up from src/config/settings.py)
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 ENV_PATH = BASE_DIR / ".env"
 
-print(f"Loading .env from: {ENV_PATH}")
-load_dotenv(dotenv_path=ENV_PATH, override=True)
-
-# Debug: Check if key is loaded
-key = os.getenv("OPENAI_API_KEY")
-
-if not key:
-    print("CRITICAL WARNING: OPENAI_API_KEY is still None after loading .env!")
-    # Fallback: Manual read
-    if ENV_PATH.exists():
-        print("Attempting manual read of .env file...")
-        with open(ENV_PATH, "r") as f:
-            for line in f:
-                if line.strip().startswith("OPENAI_API_KEY="):
-                    key = line.strip().split("=", 1)[1].strip('"').strip("'")
-                    print("Key found via manual read (OPENAI_API_KEY).")
-                    break
-
-if key:
-    # Strip quotes just in case
-    key = key.strip('"').strip("'")
-    print(f"OPENAI_API_KEY loaded successfully (starts with {key[:4]}...)")
-else:
-    print("ERROR: Could not find OPENAI_API_KEY.")
+_env_loaded = False
+_env_lock = threading.Lock()
+
+def load_env():
+    """Loads .env into os.environ once per process (on first settings access, not at import)."""
+    global _env_loaded
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv(dotenv_path=ENV_PATH, override=True)
+            _env_loaded = True
+
+def flag(value: str) -> bool:
+    return value.lower() == "true"
+
+def api_key(value: str) -> str:
+    return value.strip('"').strip("'")
+
+class EnvSetting:
+    """
+    Config value read from the environment on first access, after .env is
+    loaded. The result is cached on the config instance, so assigning (or
+    patching) a setting behaves like a plain attribute.
+    """
+    def __init__(self, default, cast=str):
+        self.default = default
+        self.cast = cast
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        load_env()
+        raw = os.getenv(self.name, self.default)
+        value = None if raw is None else self.cast(raw)
+        instance.__dict__[self.name] = value
+        return value
 
 class Config:
-    OPENAI_API_KEY = key
+    OPENAI_API_KEY = EnvSetting(None, api_key)
     DATA_DIR = BASE_DIR / "data"
     RAW_PDFS_DIR = DATA_DIR / "raw_pdfs"
     PROCESSED_TEXT_DIR = DATA_DIR / "processed_text"
     EMBEDDINGS_DIR = DATA_DIR / "embeddings"
+    EMBEDDING_CACHE_DIR = EMBEDDINGS_DIR / "embedding_cache"
     
     # Model Config
     MODEL_NAME = "gpt-4o-mini"
     EMBEDDING_MODEL = "text-embedding-3-small"
+    EMBEDDING_BATCH_SIZE = 512  # Cache misses sent to the provider per request (at most)...
+    EMBEDDING_BATCH_TOKENS = EnvSetting("8000", int)  # ...and tokens per request; smaller batches run in parallel
+    EMBEDDING_MAX_CONCURRENCY = EnvSetting("8", int)  # Embedding requests in flight per process
+    EMBEDDING_REQUESTS_PER_MINUTE = EnvSetting("3000", int)  # Provider quota per process (0 = unlimited)
+    EMBEDDING_TOKENS_PER_MINUTE = EnvSetting("1000000", int)  # Provider quota per process (0 = unlimited)
+    EMBEDDING_MAX_RETRIES = EnvSetting("6", int)  # Retries of a rate-limited or failed embedding request
+    EMBEDDING_QUERY_MAX_RETRIES = EnvSetting("2", int)  # ...of a query embedding (a user is waiting)
+    EMBEDDING_QUERY_MAX_WAIT_SECONDS = EnvSetting("5", float)  # Rate-limit and retry waits of a query embedding, in total
+    EMBEDDING_QUERY_BUDGET_SHARE = EnvSetting("0.1", float)  # Share of the quotas kept for query embeddings
+    EMBEDDING_RETRY_BASE_SECONDS = 1.0  # Jittered backoff between retries doubles from here...
+    EMBEDDING_RETRY_MAX_SECONDS = 60.0  # ...up to this
+    QUERY_CACHE_SIZE = 1024  # Query embeddings kept in memory (LRU)
+    QUERY_CACHE_TTL_SECONDS = 3600
+    ANSWER_CACHE_SIZE = EnvSetting("512", int)  # Cached answers (LRU); 0 disables the cache
+    ANSWER_CACHE_THRESHOLD = EnvSetting("0.95", float)  # Min cosine similarity between questions
+
+    # Retrieval Config
+    RETRIEVAL_MODE = EnvSetting("hybrid")  # vector | hybrid | keyword
+    DOCUMENT_SEARCH_MODE = EnvSetting("local")  # Document-only mode: local | keyword (both offline) | vector
+    LOCAL_INDEX_ENABLED = EnvSetting("true", flag)  # Offline index kept next to the main one
+    LOCAL_EMBEDDING_BACKEND = EnvSetting("hashing")  # hashing | sentence-transformers:<model>
+    PROVIDER_FAILURE_THRESHOLD = EnvSetting("3", int)  # Consecutive failures that open the circuit
+    PROVIDER_RETRY_SECONDS = EnvSetting("30", float)  # How long requests skip the provider once open
+
+    RERANK_ENABLED = EnvSetting("true", flag)  # MMR (+ optional cross-encoder) after retrieval
+    RERANK_FETCH_K = 24  # Candidates fetched for the reranker
+    RERANK_TOP_K = 8  # Chunks kept after reranking
+    RERANK_MMR_LAMBDA = 0.7  # 1.0 = relevance only, lower values favour diversity
+    RERANK_CROSS_ENCODER = EnvSetting("")  # e.g. cross-encoder/ms-marco-MiniLM-L-6-v2 (needs sentence-transformers)
+    RERANK_BUDGET_MS = EnvSetting("150", float)  # Per-request limit; retrieval order is used past it
+
+    CONTEXT_TOKEN_BUDGET = EnvSetting("3000", int)  # Max prompt tokens for retrieved context
+    CONTEXT_DEDUPE_THRESHOLD = 0.9  # Passages this similar (word 3-gram Jaccard) to a better one are dropped
+
+    # Vector Index Config (see benchmarks/index_recall.py for the recall/latency trade-off)
+    VECTOR_INDEX_TYPE = EnvSetting("flat")  # flat | ivf_flat | ivf_pq | hnsw
+    INDEX_NLIST = 0  # IVF cells, 0 = auto (~4*sqrt(n))
+    INDEX_NPROBE = 8  # IVF cells visited per query
+    INDEX_PQ_M = 64  # PQ sub-quantizers
+    INDEX_PQ_NBITS = 8
+    INDEX_HNSW_M = 32
+    INDEX_HNSW_EF_CONSTRUCTION = 80
+    INDEX_HNSW_EF_SEARCH = 64
+    INDEX_TRAIN_SAMPLE_SIZE = 50000
+    INDEX_COMPACTION_SEGMENTS = 8  # Merge upload segments into the base after this many
+    INDEX_COMPACTION_DELETED_FRACTION = 0.1  # ...or once this share of indexed chunks is deleted (replaced by uploads)
+    INDEX_MMAP = EnvSetting("true", flag)  # Memory-map the saved index (pages shared by workers) instead of reading it into RAM
+
+    # Session Memory Config
+    MEMORY_BACKEND = EnvSetting("memory")  # memory | sqlite (required for more than one server worker)
+    SESSION_DB_PATH = EnvSetting(str(DATA_DIR / "sessions.db"), Path)
+    SESSION_DB_FLUSH_SECONDS = EnvSetting("0.05", float)  # Batching window for history writes
+    SESSION_MAX_COUNT = EnvSetting("1000", int)  # Least recently used sessions are evicted beyond this
+    SESSION_TTL_SECONDS = EnvSetting("3600", int)  # Idle sessions are evicted after this
+    SESSION_MEMORY_MAX_TOKENS = EnvSetting("2000000", int)  # All histories together
+    HISTORY_TOKEN_BUDGET = EnvSetting("3000", int)  # History sent with each prompt
+    HISTORY_SUMMARIZE = EnvSetting("false", flag)  # Summarize trimmed turns instead of dropping them
+
+    # Server Startup Config
+    STARTUP_WARMUP = EnvSetting("true", flag)  # Page in the index and build the keyword index before reporting ready
+    STARTUP_WARMUP_EMBEDDING = EnvSetting("false", flag)  # Also make one test embedding call during warm-up
+    STARTUP_RETRY_BASE_SECONDS = 1.0  # Backoff between failed agent builds doubles from here...
+    STARTUP_RETRY_MAX_SECONDS = 60.0  # ...up to this
+
+    # Concurrency Config
+    LLM_MAX_CONCURRENCY = EnvSetting("32", int)  # In-flight LLM calls per worker
+    INGEST_WORKERS = EnvSetting("2", int)  # Background upload ingestion threads
+    PDF_LOADER_WORKERS = EnvSetting(str(os.cpu_count() or 1), int)  # Parser processes for full ingests
+    PDF_PAGES_PER_TASK = 50  # Longer PDFs are parsed as page ranges in parallel
+    INGEST_BATCH_SIZE = EnvSetting("256", int)  # Chunks embedded and committed per step of a full ingest
+    INGEST_NEAR_DUPLICATE_THRESHOLD = EnvSetting("0.9", float)  # Word 3-gram Jaccard above which an uploaded chunk is skipped as a duplicate; >1 disables
+    HTTP_MAX_CONNECTIONS = EnvSetting("64", int)  # Shared provider connection pool (see src/rag/resources.py)
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = 32
+    HTTP_TIMEOUT_SECONDS = 60
 
 config = Config()
 
@@ -1,53 +1,205 @@
 from src.loaders.pdf_loader import PDFLoader
-from src.rag.vector_store import RAGPipeline
+from src.rag.document_registry import DocumentRegistry, chunk_hash, chunk_key, file_hash
+from src.rag.resources import get_rag_pipeline
+from src.rag.segment_store import SegmentStore
 from src.config.settings import config
+from src.utils.metrics import registry, stage
+import hashlib
+import itertools
+import shutil
 import sys
 import os
+import uuid
 
-def ingest_data():
-    """Full ingestion of all PDFs (used for initial setup)."""
+INGESTED_CHUNKS = registry.counter("tutor_ingested_chunks_total", "Chunks embedded and staged by full ingests.")
+INGESTED_PAGES = registry.counter("tutor_uploaded_pages_total", "Pages parsed from uploaded PDFs.")
+
+class IngestCheckpoint:
+    """
+    Progress of a streaming full ingest: the position just after the last
+    committed batch, and how many registry rows describe the chunks staged
+    so far. It lives in the staging manifest, so a batch's segment and
+    position are committed by one atomic manifest write; the registry is
+    committed just before it, and rows past the checkpoint are dropped on
+    resume, so the resumed run sees either all of them or none. It is tied to a
+    fingerprint of the PDF directory, so a changed corpus starts over
+    instead of resuming.
+    """
+    def __init__(self, staging: SegmentStore, fingerprint: str):
+        self.staging = staging
+        self.fingerprint = fingerprint
+
+    def load(self):
+        """Returns {"position": ..., "chunks": n, "registry_rows": n}, or None if there is nothing to resume."""
+        state = self.staging.checkpoint() if self.staging.manifest_path.exists() else None
+        if state is None or state.get("fingerprint") != self.fingerprint or "registry_rows" not in state:
+            return None  # Changed corpus, or a run staged before the registry was kept in SQLite
+        return state
+
+    def commit(self, state: dict, registry: DocumentRegistry, segment: tuple = None) -> dict:
+        """
+        Saves `registry`, then commits `segment` (texts, vectors, metadatas,
+        ids), if any, with `state` recording the registry rows it covers.
+        """
+        registry.save()
+        state = {**state, "registry_rows": registry.last_row(), "fingerprint": self.fingerprint}
+        if segment is not None:
+            self.staging.append_segment(*segment, checkpoint=state)
+        else:
+            self.staging.save_checkpoint(state)
+        return state
+
+def corpus_fingerprint(directory: str) -> str:
+    """Hash of the name, size and mtime of every PDF in `directory`."""
+    digest = hashlib.sha256()
+    if os.path.exists(directory):
+        for filename in sorted(os.listdir(directory)):
+            if filename.lower().endswith(".pdf"):
+                stat = os.stat(os.path.join(directory, filename))
+                digest.update(f"{filename}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+def next_position(position: tuple) -> tuple:
+    """Where to resume after the chunk at `position`: (filename, page, chunks to skip in that page)."""
+    filename, page, chunk, last_in_page = position
+    if last_in_page:
+        return filename, page + 1, 0
+    return filename, page, chunk + 1
+
+def batched(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def ingest_data(resume: bool = True):
+    """
+    Full ingestion of all PDFs (used for initial setup).
+
+    Runs as a pipeline of generators: pages -> chunks -> fixed-size batches.
+    Each stage pulls from the previous one only when it needs more, so memory
+    does not grow with the corpus. Every batch is embedded and committed as a
+    staging segment before the next one is read, in the same commit as the
+    position after it (see IngestCheckpoint). A crashed run resumes from the
+    last committed batch.
+    """
     print("Starting data ingestion...")
-    
-    # 1. Load Documents
-    loader = PDFLoader(config.RAW_PDFS_DIR)
-    documents = loader.load_documents()
-    
-    if not documents:
-        print("No documents found in raw_pdfs directory.")
-        return
 
-    print(f"Loaded {len(documents)} pages from PDFs.")
+    loader = PDFLoader(
+        config.RAW_PDFS_DIR,
+        workers=config.PDF_LOADER_WORKERS,
+        pages_per_task=config.PDF_PAGES_PER_TASK,
+    )
+    rag = get_rag_pipeline()
+    staging_dir = config.EMBEDDINGS_DIR / "ingest_staging"
+    staging = SegmentStore(staging_dir)
+    checkpoint = IngestCheckpoint(staging, corpus_fingerprint(config.RAW_PDFS_DIR))
+
+    state = checkpoint.load() if resume else None
+    if state is None:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir, exist_ok=True)
+        state = {"position": None, "chunks": 0, "registry_rows": 0}
+    else:
+        print(f"Resuming after {state['chunks']} committed chunks (at {state['position'][0]}, page {state['position'][1]})...")
+    # Staged with the segments, so a resumed run still knows which chunks it has seen
+    with DocumentRegistry(staging_dir / DocumentRegistry.FILENAME) as file_registry:
+        file_registry.drop_rows_after(state["registry_rows"])  # Saved by a batch that was not committed
+        file_hashes = {}
+
+        start_file, start_page, skip = state["position"] or (None, 0, 0)
+        splits = rag.iter_splits(loader.iter_pages(start_file, start_page))
+        if skip:
+            # Chunks of a partly committed page that are already staged
+            splits = ((chunk, pos) for chunk, pos in splits if not (pos[:2] == (start_file, start_page) and pos[2] < skip))
+
+        for batch in batched(splits, config.INGEST_BATCH_SIZE):
+            texts, metadatas, ids = [], [], []
+            for chunk, (filename, *_) in batch:
+                if filename not in file_hashes:
+                    file_hashes[filename] = file_hash(os.path.join(config.RAW_PDFS_DIR, filename))
+                text_hash = chunk_hash(chunk.page_content)
+                chunk_id = file_registry.chunk_id_for(text_hash)
+                if chunk_id is None:
+                    # Exact repeats (boilerplate, copies of a file) are embedded and indexed once
+                    chunk_id = str(uuid.uuid4())
+                    texts.append(chunk.page_content)
+                    metadatas.append(chunk.metadata)
+                    ids.append(chunk_id)
+                key = chunk_key(text_hash, chunk.metadata.get("page"), chunk.metadata.get("start_index"))
+                file_registry.add_chunk(filename, file_hashes[filename], key, chunk_id)
+            segment = (texts, rag.embed_texts(texts), metadatas, ids) if texts else None
+            state = {"position": next_position(batch[-1][1]), "chunks": state["chunks"] + len(batch)}
+            with stage("segment_commit"):
+                state = checkpoint.commit(state, file_registry, segment)
+            INGESTED_CHUNKS.inc(len(texts))
+            print(f"Committed {state['chunks']} chunks (through {batch[-1][1][0]}, page {batch[-1][1][1]}).")
+
+        if loader.errors:
+            print(f"Skipped {len(loader.errors)} file(s) that failed to load: {', '.join(f for f, _ in loader.errors)}")
+
+        if state["chunks"] == 0:
+            print("No documents found in raw_pdfs directory.")
+            return
+
+        with stage("index_build"):
+            rag.create_index_from_segments(staging, registry=file_registry)
+    shutil.rmtree(staging_dir, ignore_errors=True)
 
-    # 2. Create/Update Index
-    rag = RAGPipeline()
-    rag.create_index(documents)
-    
     print("Ingestion complete!")
 
-def ingest_single_file(filepath: str):
-    """Fast incremental ingestion of a single PDF file."""
+def ingest_single_file(filepath: str, progress=None, content_hash: str = None):
+    """
+    Fast incremental ingestion of a single PDF file.
+    `progress`, if given, is called as progress(stage, **counters) as the
+    file moves through parsing, splitting, embedding and committing.
+    A file already indexed with the same content is not parsed again; a new
+    version of an indexed file replaces only the chunks that changed (see
+    RAGPipeline.update_document). `content_hash` is the file's SHA-256, if
+    the caller already has it.
+    """
     print(f"Starting incremental ingestion for: {filepath}")
     
     if not os.path.exists(filepath):
         print(f"File not found: {filepath}")
         return False
+
+    rag = get_rag_pipeline()
+    content_hash = content_hash or file_hash(filepath)
+    with DocumentRegistry(rag.registry_path) as file_registry:
+        same = file_registry.file_with_content(content_hash)
+    if same is not None:
+        print(f"{os.path.basename(filepath)} has the same content as the indexed {same}; nothing to do.")
+        if progress:
+            progress("indexed", result={"status": "unchanged", "same_as": same})
+        return True
     
     # 1. Load single document
+    if progress:
+        progress("parsing")
     loader = PDFLoader(os.path.dirname(filepath))
-    documents = loader.load_single_file(filepath)
+    with stage("upload_parse"):
+        documents = loader.load_single_file(filepath)
     
     if not documents:
         print("Failed to load document.")
         return False
 
     print(f"Loaded {len(documents)} pages from {os.path.basename(filepath)}")
+    INGESTED_PAGES.inc(len(documents))
+    if progress:
+        progress("parsed", pages_parsed=len(documents))
 
-    # 2. Add to existing index
-    rag = RAGPipeline()
-    success = rag.add_documents(documents)
+    # 2. Add to (or update in) the existing index
+    with stage("upload_index"):
+        result = rag.update_document(documents, content_hash, progress=progress)
+    if progress:
+        progress("indexed", result=result)
     
     print("Incremental ingestion complete!")
-    return success
+    return result["status"] != "empty"
 
 if __name__ == "__main__":
     ingest_data()
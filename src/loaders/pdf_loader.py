@@ -1,32 +1,191 @@
 import os
-from langchain_community.document_loaders import PyMuPDFLoader
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
 from langchain_core.documents import Document
 
+def _pdf_loader(file_path: str):
+    """PyMuPDFLoader for a file; langchain_community is only imported once something is parsed."""
+    from langchain_community.document_loaders import PyMuPDFLoader
+
+    return PyMuPDFLoader(file_path)
+
+def _load_file(file_path: str) -> List[Document]:
+    """Parses a whole PDF (runs in a worker process)."""
+    return _pdf_loader(file_path).load()
+
+def _load_page_range(file_path: str, start: int, end: int) -> List[Document]:
+    """
+    Parses pages [start, end) of a PDF (runs in a worker process).
+    Metadata mirrors what PyMuPDFLoader produces for the same page.
+    """
+    import pymupdf
+
+    with pymupdf.open(file_path) as doc:
+        base_metadata = {
+            "producer": "PyMuPDF",
+            "creator": "PyMuPDF",
+            "creationdate": "",
+            "source": file_path,
+            "file_path": file_path,
+            "total_pages": len(doc),
+            **{k: v for k, v in doc.metadata.items() if isinstance(v, (str, int))},
+        }
+        return [
+            Document(page_content=doc[n].get_text().strip(), metadata={**base_metadata, "page": n})
+            for n in range(start, end)
+        ]
+
+def _page_count(file_path: str) -> int:
+    import pymupdf
+
+    with pymupdf.open(file_path) as doc:
+        return len(doc)
+
 class PDFLoader:
-    def __init__(self, directory_path: str):
+    def __init__(self, directory_path: str, workers: int = 1, pages_per_task: int = 50):
+        """
+        workers > 1 parses files in a process pool. Files longer than
+        `pages_per_task` pages are split into page ranges parsed in parallel.
+        Errors for individual files are collected in `self.errors`.
+        """
         self.directory_path = directory_path
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+        self.errors: List[Tuple[str, str]] = []
+
+    def _pdf_filenames(self) -> List[str]:
+        # Sorted so results come back in the same order on every run
+        return sorted(f for f in os.listdir(self.directory_path) if f.lower().endswith(".pdf"))
 
     def load_documents(self) -> List[Document]:
         """Loads all PDFs from the specified directory."""
-        documents = []
+        self.errors = []
         if not os.path.exists(self.directory_path):
             print(f"Directory not found: {self.directory_path}")
             return []
 
-        for filename in os.listdir(self.directory_path):
-            if filename.lower().endswith(".pdf"):
+        if self.workers > 1:
+            return self._load_documents_parallel()
+
+        documents = []
+        for filename in self._pdf_filenames():
+            file_path = os.path.join(self.directory_path, filename)
+            print(f"Loading: {filename}")
+            try:
+                loader = _pdf_loader(file_path)
+                docs = loader.load()
+                documents.extend(docs)
+            except Exception as e:
+                print(f"Error loading {filename}: {e}")
+                self.errors.append((filename, str(e)))
+
+        return documents
+
+    def _load_documents_parallel(self) -> List[Document]:
+        """Process-pool version of load_documents(); same output order as the sequential path."""
+        filenames = self._pdf_filenames()
+        print(f"Loading {len(filenames)} PDFs with {self.workers} worker processes...")
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            # One task per file, or per page range for long files
+            tasks = []  # (filename, future)
+            for filename in filenames:
                 file_path = os.path.join(self.directory_path, filename)
-                print(f"Loading: {filename}")
                 try:
-                    loader = PyMuPDFLoader(file_path)
-                    docs = loader.load()
-                    documents.extend(docs)
+                    pages = _page_count(file_path)
                 except Exception as e:
                     print(f"Error loading {filename}: {e}")
-        
+                    self.errors.append((filename, str(e)))
+                    continue
+
+                if pages <= self.pages_per_task:
+                    tasks.append((filename, executor.submit(_load_file, file_path)))
+                else:
+                    for start in range(0, pages, self.pages_per_task):
+                        end = min(start + self.pages_per_task, pages)
+                        tasks.append((filename, executor.submit(_load_page_range, file_path, start, end)))
+
+            # Collect in submission order; a failed range drops its whole file
+            per_file = {}
+            failed = set()
+            for filename, future in tasks:
+                try:
+                    per_file.setdefault(filename, []).extend(future.result())
+                except Exception as e:
+                    if filename not in failed:
+                        print(f"Error loading {filename}: {e}")
+                        self.errors.append((filename, str(e)))
+                        failed.add(filename)
+
+        documents = []
+        for filename in filenames:
+            if filename in per_file and filename not in failed:
+                documents.extend(per_file[filename])
         return documents
 
+    def iter_pages(self, start_file: Optional[str] = None, start_page: int = 0) -> Iterator[Document]:
+        """
+        Yields pages one at a time, in the same order as load_documents().
+        Parsing runs only as far ahead as the consumer pulls (with workers > 1,
+        at most 2 * workers page ranges are in flight), so memory stays flat
+        however large the corpus is. Files sorted before `start_file` are
+        skipped, as are its first `start_page` pages (used to resume).
+        """
+        self.errors = []
+        if not os.path.exists(self.directory_path):
+            print(f"Directory not found: {self.directory_path}")
+            return
+
+        tasks = self._page_tasks(start_file, start_page)
+        if self.workers <= 1:
+            for filename, file_path, start, end in tasks:
+                try:
+                    pages = _load_page_range(file_path, start, end)
+                except Exception as e:
+                    print(f"Error loading {filename}: {e}")
+                    self.errors.append((filename, str(e)))
+                    continue
+                yield from pages
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            in_flight = deque()
+            for task in tasks:
+                filename, file_path, start, end = task
+                in_flight.append((filename, executor.submit(_load_page_range, file_path, start, end)))
+                if len(in_flight) >= 2 * self.workers:
+                    yield from self._collect(*in_flight.popleft())
+            while in_flight:
+                yield from self._collect(*in_flight.popleft())
+
+    def _page_tasks(self, start_file: Optional[str], start_page: int) -> Iterator[tuple]:
+        """(filename, file_path, start, end) page ranges of at most pages_per_task pages."""
+        for filename in self._pdf_filenames():
+            if start_file is not None and filename < start_file:
+                continue
+            file_path = os.path.join(self.directory_path, filename)
+            print(f"Loading: {filename}")
+            try:
+                pages = _page_count(file_path)
+            except Exception as e:
+                print(f"Error loading {filename}: {e}")
+                self.errors.append((filename, str(e)))
+                continue
+
+            first = start_page if filename == start_file else 0
+            for start in range(first, pages, self.pages_per_task):
+                yield filename, file_path, start, min(start + self.pages_per_task, pages)
+
+    def _collect(self, filename: str, future) -> List[Document]:
+        # Pages already yielded cannot be taken back, so a failed range only drops itself
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Error loading {filename}: {e}")
+            self.errors.append((filename, str(e)))
+            return []
+
     def load_single_file(self, file_path: str) -> List[Document]:
         """Loads a single PDF file."""
         documents = []
@@ -37,16 +196,16 @@ class PDFLoader:
         filename = os.path.basename(file_path)
         print(f"Loading: {filename}")
         try:
-            loader = PyMuPDFLoader(file_path)
+            loader = _pdf_loader(file_path)
             documents = loader.load()
         except Exception as e:
             print(f"Error loading {filename}: {e}")
-        
+
         return documents
 
 if __name__ == "__main__":
     # Test
     from src.config.settings import config
-    loader = PDFLoader(config.RAW_PDFS_DIR)
+    loader = PDFLoader(config.RAW_PDFS_DIR, workers=config.PDF_LOADER_WORKERS)
     docs = loader.load_documents()
     print(f"Loaded {len(docs)} pages.")
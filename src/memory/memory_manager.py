@@ -1,7 +1,11 @@
 from abc import ABC, abstractmethod
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.chat_history import BaseChatMessageHistory
-from typing import Dict
+from collections import OrderedDict
+from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory as ChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from typing import Callable, Dict, List, Optional, Sequence
+import threading
+import time
 
 class BaseMemoryManager(ABC):
     """
@@ -24,3 +28,150 @@ class InMemoryHistoryManager(BaseMemoryManager):
         if session_id not in self.store:
             self.store[session_id] = ChatMessageHistory()
         return self.store[session_id]
+
+# summarizer(previous_summary, dropped_messages) -> new summary
+Summarizer = Callable[[Optional[str], List[BaseMessage]], str]
+
+def llm_summarizer(llm) -> Summarizer:
+    """Summarizer that asks `llm` to fold dropped turns into the running summary."""
+    def summarize(previous: Optional[str], messages: List[BaseMessage]) -> str:
+        transcript = "\n".join(f"{m.type}: {m.content}" for m in messages)
+        prompt = (
+            "Update the summary of a tutoring conversation with the turns below. "
+            "Keep the topics, questions and conclusions; at most 150 words.\n\n"
+            f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        return llm.invoke(prompt).content
+    return summarize
+
+class TokenBudgetHistory(BaseChatMessageHistory):
+    """
+    Chat history kept within a token budget. When a new turn pushes it over,
+    the oldest whole turns are dropped, or folded into a running summary if a
+    summarizer is given, so the prompt never carries more than `max_tokens`
+    of history. The latest turn is always kept.
+    """
+    def __init__(self, max_tokens: int, summarizer: Optional[Summarizer] = None, on_change=None):
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.on_change = on_change  # Called with (history, trimmed_turns, summarized)
+        self.summary: Optional[str] = None
+        self.tokens = 0
+        self._messages: List[BaseMessage] = []
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        if self.summary:
+            return [SystemMessage(content=f"Summary of the earlier conversation: {self.summary}")] + self._messages
+        return list(self._messages)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self._messages.extend(messages)
+        trimmed, summarized = self._trim()
+        if self.on_change:
+            self.on_change(self, trimmed, summarized)
+
+    def clear(self) -> None:
+        self._messages = []
+        self.summary = None
+        self.tokens = 0
+        if self.on_change:
+            self.on_change(self, 0, False)
+
+    def _turn_starts(self) -> List[int]:
+        return [i for i, m in enumerate(self._messages) if isinstance(m, HumanMessage)] or [0]
+
+    def _trim(self):
+        dropped: List[BaseMessage] = []
+        self.tokens = count_tokens_approximately(self.messages)
+        turns = 0
+        while self.tokens > self.max_tokens:
+            starts = [i for i in self._turn_starts() if i > 0]
+            if not starts:
+                break  # Only the latest turn is left
+            dropped.extend(self._messages[:starts[0]])
+            self._messages = self._messages[starts[0]:]
+            turns += 1
+            self.tokens = count_tokens_approximately(self.messages)
+
+        summarized = bool(dropped and self.summarizer)
+        if summarized:
+            self.summary = self.summarizer(self.summary, dropped)
+            self.tokens = count_tokens_approximately(self.messages)
+        return turns, summarized
+
+class BoundedHistoryManager(BaseMemoryManager):
+    """
+    Memory manager with bounded memory use:
+      - sessions idle for more than `ttl_seconds` are evicted
+      - at most `max_sessions` sessions are kept (least recently used go first)
+      - all histories together stay under `max_total_tokens`
+      - each history stays under `session_token_budget` (see TokenBudgetHistory)
+    Counters for every kind of eviction are available from stats().
+    """
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600,
+                 max_total_tokens: int = 2_000_000, session_token_budget: int = 3000,
+                 summarizer: Optional[Summarizer] = None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_total_tokens = max_total_tokens
+        self.session_token_budget = session_token_budget
+        self.summarizer = summarizer
+        self._sessions: "OrderedDict[str, TokenBudgetHistory]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._counted: Dict[str, int] = {}  # Each session's tokens as included in _total_tokens
+        self._total_tokens = 0
+        self._lock = threading.RLock()
+        self._counters = {"evicted_lru": 0, "evicted_ttl": 0, "evicted_memory": 0, "trimmed_turns": 0, "summaries": 0}
+
+    def get_session_history(self, session_id: str) -> BaseChatMessageHistory:
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            history = self._sessions.get(session_id)
+            if history is None:
+                history = TokenBudgetHistory(
+                    self.session_token_budget,
+                    summarizer=self.summarizer,
+                    on_change=lambda h, trimmed, summarized, sid=session_id: self._on_change(sid, h, trimmed, summarized),
+                )
+                self._sessions[session_id] = history
+                self._counted[session_id] = 0
+                while len(self._sessions) > self.max_sessions:
+                    self._evict(next(iter(self._sessions)), "evicted_lru")
+            self._sessions.move_to_end(session_id)
+            self._last_used[session_id] = now
+            return history
+
+    def _on_change(self, session_id: str, history: TokenBudgetHistory, trimmed: int, summarized: bool):
+        with self._lock:
+            self._counters["trimmed_turns"] += trimmed
+            self._counters["summaries"] += int(summarized)
+            if self._sessions.get(session_id) is not history:
+                return  # Evicted while a request still held it
+            self._total_tokens += history.tokens - self._counted[session_id]
+            self._counted[session_id] = history.tokens
+            self._sessions.move_to_end(session_id)
+            self._last_used[session_id] = time.monotonic()
+            # Never evict the session being written
+            while self._total_tokens > self.max_total_tokens and len(self._sessions) > 1:
+                self._evict(next(iter(self._sessions)), "evicted_memory")
+
+    def _expire(self, now: float):
+        # Sessions are kept in order of last use, so the idle ones are at the head
+        while self._sessions:
+            session_id = next(iter(self._sessions))
+            if now - self._last_used[session_id] <= self.ttl_seconds:
+                break
+            self._evict(session_id, "evicted_ttl")
+
+    def _evict(self, session_id: str, reason: str):
+        del self._sessions[session_id]
+        del self._last_used[session_id]
+        self._total_tokens -= self._counted.pop(session_id)
+        self._counters[reason] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            return {"sessions": len(self._sessions), "total_tokens": self._total_tokens, **self._counters}
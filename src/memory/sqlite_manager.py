@@ -0,0 +1,222 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage, message_to_dict, messages_from_dict
+from langchain_core.messages.utils import count_tokens_approximately
+from src.memory.memory_manager import BaseMemoryManager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+"""
+
+# One row per session, so counting sessions does not scan the messages
+SESSIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL
+);
+INSERT OR IGNORE INTO sessions SELECT session_id, MIN(created_at) FROM messages GROUP BY session_id;
+"""
+
+def latest_turns(messages: List[BaseMessage], max_tokens: Optional[int]) -> List[BaseMessage]:
+    """The most recent whole turns that fit in `max_tokens` (the latest turn is always kept)."""
+    if not max_tokens:
+        return messages
+    # Per-message approximate counts add up to the count of the whole window
+    start, tokens = None, 0
+    for i in range(len(messages) - 1, -1, -1):
+        tokens += count_tokens_approximately([messages[i]])
+        if i == 0 or isinstance(messages[i], HumanMessage):
+            if start is not None and tokens > max_tokens:
+                break
+            start = i
+    return messages[start:] if start is not None else messages
+
+class _CachedSession:
+    def __init__(self):
+        self.persisted: List[BaseMessage] = []  # Only the rows latest_turns() can return
+        self.last_id = 0  # Highest row id already read
+        self.pending: List[BaseMessage] = []  # Added here, not yet flushed
+        self.last_used = time.monotonic()
+
+class SQLiteHistory(BaseChatMessageHistory):
+    """Chat history for one session, read and written through the manager."""
+    def __init__(self, manager: "SQLiteHistoryManager", session_id: str):
+        self.manager = manager
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return latest_turns(self.manager.read(self.session_id), self.manager.session_token_budget)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.manager.write(self.session_id, list(messages))
+
+    def clear(self) -> None:
+        self.manager.delete(self.session_id)
+
+class SQLiteHistoryManager(BaseMemoryManager):
+    """
+    Durable memory manager backed by SQLite in WAL mode, so every uvicorn
+    worker on the host sees the same history and it survives restarts.
+
+    Writes are queued and flushed in one transaction every `flush_interval`
+    seconds by a background thread. Reads go through an in-process LRU cache
+    of sessions. A cached session is checked with one indexed MAX(id) lookup
+    and only rows written since (e.g. by another worker) are fetched.
+    History sent to the prompt is limited to `session_token_budget` tokens,
+    and the cache keeps no more than that per session. Sessions idle for more
+    than `ttl_seconds` leave the cache (their history stays in the database).
+    """
+    def __init__(self, db_path, flush_interval: float = 0.05, max_cached_sessions: int = 1000,
+                 session_token_budget: Optional[int] = None, ttl_seconds: float = 3600):
+        self.db_path = str(db_path)
+        self.flush_interval = flush_interval
+        self.max_cached_sessions = max_cached_sessions
+        self.session_token_budget = session_token_budget
+        self.ttl_seconds = ttl_seconds
+        self._cache: "OrderedDict[str, _CachedSession]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {"cache_hits": 0, "cache_misses": 0, "rows_written": 0, "flushes": 0, "cache_expired": 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+            has_sessions = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'"
+            ).fetchone()
+            if not has_sessions:
+                self._conn.executescript(SESSIONS_SCHEMA)  # Once, for databases from before the table
+
+        self._closed = threading.Event()
+        self._wake = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-history-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def get_session_history(self, session_id: str) -> BaseChatMessageHistory:
+        return SQLiteHistory(self, session_id)
+
+    def _entry(self, session_id: str) -> _CachedSession:
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._cache.get(session_id)
+        if entry is None:
+            entry = self._cache[session_id] = _CachedSession()
+            while len(self._cache) > self.max_cached_sessions:
+                # Never drop unflushed messages
+                oldest = next((s for s, e in self._cache.items() if not e.pending), None)
+                if oldest is None:
+                    break
+                del self._cache[oldest]
+        self._cache.move_to_end(session_id)
+        entry.last_used = now
+        return entry
+
+    def _expire(self, now: float):
+        """Drops idle sessions from the LRU head, stopping at the first one still in use."""
+        while self._cache:
+            session_id, entry = next(iter(self._cache.items()))
+            if now - entry.last_used <= self.ttl_seconds or entry.pending:
+                break
+            del self._cache[session_id]
+            self._stats["cache_expired"] += 1
+
+    def read(self, session_id: str) -> List[BaseMessage]:
+        with self._lock:
+            entry = self._entry(session_id)
+            (max_id,) = self._conn.execute(
+                "SELECT MAX(id) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if (max_id or 0) == entry.last_id:
+                self._stats["cache_hits"] += 1
+            else:
+                self._stats["cache_misses"] += 1
+                rows = self._conn.execute(
+                    "SELECT id, message FROM messages WHERE session_id = ? AND id > ? ORDER BY id",
+                    (session_id, entry.last_id),
+                ).fetchall()
+                entry.persisted.extend(messages_from_dict([json.loads(m) for _, m in rows]))
+                entry.last_id = rows[-1][0] if rows else entry.last_id
+                # Adding messages only moves the window forward, so older rows are never needed again
+                entry.persisted = latest_turns(entry.persisted, self.session_token_budget)
+            return entry.persisted + entry.pending
+
+    def write(self, session_id: str, messages: List[BaseMessage]):
+        with self._lock:
+            self._entry(session_id).pending.extend(messages)
+        self._wake.set()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._cache.pop(session_id, None)
+            with self._conn:
+                self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def flush(self):
+        """Writes all queued messages in one transaction."""
+        with self._lock:
+            now = time.time()
+            rows = [
+                (session_id, now, json.dumps(message_to_dict(m)))
+                for session_id, entry in self._cache.items()
+                for m in entry.pending
+            ]
+            if not rows:
+                return
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO messages (session_id, created_at, message) VALUES (?, ?, ?)", rows
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO sessions (session_id, created_at) VALUES (?, ?)",
+                    {(session_id, now) for session_id, _, _ in rows},
+                )
+            # Flushed messages come back from the table on the next read, in row order
+            for entry in self._cache.values():
+                entry.pending = []
+            self._stats["rows_written"] += len(rows)
+            self._stats["flushes"] += 1
+
+    def _write_loop(self):
+        while not self._closed.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            time.sleep(self.flush_interval)  # Let more writes join this batch
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Failed to write chat history: {e}")
+                self._wake.set()
+
+    def close(self):
+        """Flushes queued messages and closes the database (also runs at exit)."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._wake.set()
+        self._writer.join(timeout=5)
+        self.flush()
+        self._conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            (sessions,) = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            return {"sessions": sessions, "cached_sessions": len(self._cache), **self._stats}
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Set
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's content (the same digest /upload computes while saving)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_hash(text: str) -> str:
+    """Hash of a chunk's text, ignoring case and whitespace differences."""
+    normalized = re.sub(r"\s+", " ", text).strip().lower()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+def chunk_key(text_hash: str, page, start_index) -> str:
+    """Identity of a chunk within one file: its text at its position."""
+    return f"{text_hash}:{page}:{start_index}"
+
+class DocumentRegistry:
+    """
+    Which files an index holds and which chunks each consists of, stored
+    next to the index as registry.db (SQLite):
+
+        files  (name, content_hash)                  - indexed by content hash
+        chunks (file, key, chunk_id, text_hash)      - indexed by text hash and chunk id
+
+    where a chunk's key is "<chunk hash>:<page>:<start>" (see chunk_key).
+    Lookups are indexed and a file is rewritten on its own, so an upload
+    costs the size of that file, not of the corpus. Changes are written by
+    save(), in one transaction.
+
+    A chunk id may be listed by several files: a chunk that duplicates one
+    already indexed is recorded with the existing chunk's id instead of
+    being indexed again, and its vector is only deleted once no file lists it.
+    A registry.json from before (one JSON object) is imported on first open.
+    """
+    FILENAME = "registry.db"
+    LEGACY_FILENAME = "registry.json"
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (
+        name TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_files_content ON files (content_hash);
+    CREATE TABLE IF NOT EXISTS chunks (
+        file TEXT NOT NULL,
+        key TEXT NOT NULL,
+        chunk_id TEXT NOT NULL,
+        text_hash TEXT NOT NULL,
+        PRIMARY KEY (file, key)
+    );
+    CREATE INDEX IF NOT EXISTS idx_chunks_text ON chunks (text_hash);
+    CREATE INDEX IF NOT EXISTS idx_chunks_id ON chunks (chunk_id);
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.executescript(self.SCHEMA)
+        self._import_legacy()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def _import_legacy(self):
+        legacy = os.path.join(os.path.dirname(self.path), self.LEGACY_FILENAME)
+        if not os.path.exists(legacy) or self.file_names():
+            return
+        with open(legacy, "r") as f:
+            files = json.load(f)["files"]
+        for name, entry in files.items():
+            self.set_file(name, entry["content_hash"], entry["chunks"])
+        self.save()
+        os.remove(legacy)
+
+    def save(self):
+        self._conn.commit()
+
+    def save_as(self, path):
+        """Commits, then atomically replaces the registry at `path` with a copy of this one."""
+        self.save()
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            self._conn.backup(target)
+        finally:
+            target.close()
+        os.replace(tmp_path, path)
+
+    def file_names(self) -> List[str]:
+        return [name for (name,) in self._conn.execute("SELECT name FROM files ORDER BY name")]
+
+    def file_chunks(self, name: str) -> Dict[str, str]:
+        """Chunk key -> chunk id for one file (empty if it is not registered)."""
+        return dict(self._conn.execute("SELECT key, chunk_id FROM chunks WHERE file = ?", (name,)))
+
+    def file_with_content(self, content_hash: str) -> Optional[str]:
+        """Name of an indexed file with exactly this content, if any."""
+        row = self._conn.execute("SELECT name FROM files WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone()
+        return row[0] if row else None
+
+    def chunk_id_for(self, text_hash: str, exclude: str = None) -> Optional[str]:
+        """Id of an indexed chunk with this text hash, in a file other than `exclude`."""
+        row = self._conn.execute(
+            "SELECT chunk_id FROM chunks WHERE text_hash = ? AND file IS NOT ? LIMIT 1", (text_hash, exclude)
+        ).fetchone()
+        return row[0] if row else None
+
+    def chunk_ids_by_hash(self, exclude: str = None) -> Dict[str, str]:
+        """Chunk hash -> chunk id over all files except `exclude` (reads every row)."""
+        ids = {}
+        for text_hash, chunk_id in self._conn.execute(
+            "SELECT text_hash, chunk_id FROM chunks WHERE file IS NOT ? ORDER BY rowid", (exclude,)
+        ):
+            ids.setdefault(text_hash, chunk_id)
+        return ids
+
+    def referenced_ids(self, exclude: str = None) -> Set[str]:
+        """Every chunk id listed by a file other than `exclude` (reads every row)."""
+        return {chunk_id for (chunk_id,) in self._conn.execute(
+            "SELECT DISTINCT chunk_id FROM chunks WHERE file IS NOT ?", (exclude,)
+        )}
+
+    def still_referenced(self, chunk_ids: Iterable[str], exclude: str = None) -> Set[str]:
+        """Those of `chunk_ids` that a file other than `exclude` lists."""
+        chunk_ids, found = list(chunk_ids), set()
+        for start in range(0, len(chunk_ids), 500):  # Below SQLite's limit on query parameters
+            batch = chunk_ids[start:start + 500]
+            found.update(chunk_id for (chunk_id,) in self._conn.execute(
+                f"SELECT DISTINCT chunk_id FROM chunks WHERE chunk_id IN ({', '.join('?' * len(batch))}) AND file IS NOT ?",
+                (*batch, exclude),
+            ))
+        return found
+
+    def add_chunk(self, name: str, content_hash: str, key: str, chunk_id: str):
+        self._conn.execute("INSERT OR IGNORE INTO files (name, content_hash) VALUES (?, ?)", (name, content_hash))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO chunks (file, key, chunk_id, text_hash) VALUES (?, ?, ?, ?)",
+            (name, key, chunk_id, key.split(":", 1)[0]),
+        )
+
+    def set_file(self, name: str, content_hash: str, chunks: Dict[str, str]):
+        self._conn.execute("DELETE FROM chunks WHERE file = ?", (name,))
+        self._conn.execute("INSERT OR REPLACE INTO files (name, content_hash) VALUES (?, ?)", (name, content_hash))
+        self._conn.executemany(
+            "INSERT INTO chunks (file, key, chunk_id, text_hash) VALUES (?, ?, ?, ?)",
+            [(name, key, chunk_id, key.split(":", 1)[0]) for key, chunk_id in chunks.items()],
+        )
+
+    def last_row(self) -> int:
+        """Position of the most recently added chunk row, for drop_rows_after()."""
+        return self._conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM chunks").fetchone()[0]
+
+    def drop_rows_after(self, row: int):
+        """Drops chunk rows added after last_row() returned `row`, and files left without chunks."""
+        self._conn.execute("DELETE FROM chunks WHERE rowid > ?", (row,))
+        self._conn.execute("DELETE FROM files WHERE name NOT IN (SELECT file FROM chunks)")
+        self.save()
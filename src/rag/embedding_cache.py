@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.rag.embedding_scheduler import EmbeddingScheduler
+from src.rag.query_cache import QueryEmbeddingCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are serialized within a process only
+    fcntl = None
+
+def text_key(text: str) -> bytes:
+    """Content address of a chunk: 16-byte BLAKE2b digest of its text."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+class CachedEmbeddings(Embeddings):
+    """
+    Persistent, content-addressed cache in front of an embedding provider.
+
+    Vectors are keyed by (embedding model, chunk text hash). Each model gets
+    three append-only files under `cache_dir`:
+      <model>.keys  - 16-byte text digests, one per row
+      <model>.f32   - raw float32 vectors, one row per key
+      <model>.json  - {"model": ..., "dim": ...}
+    Rows are paired by position. Only the keys are loaded; vectors are read
+    through a memory map of <model>.f32, so a worker keeps no vectors of its
+    own and the pages are shared through the OS cache. Appends and loads hold an exclusive lock
+    on <model>.lock (workers share the directory), and both first cut the
+    files back to the rows they have in common, so a torn append can never
+    shift later keys onto another text's vector.
+    Only cache misses are sent to the provider, in batches planned and sent
+    by `scheduler` (by default one batch of up to `batch_size` texts at a
+    time). Each batch is persisted as soon as it completes, so an embedding
+    run that fails partway resumes from the batches already done.
+
+    Query embeddings are not persisted; they go through an in-memory
+    QueryEmbeddingCache shared by every retrieval path that uses this object.
+    Uncached queries are sent through the scheduler too, on its query
+    budget, with at most `query_retries` retries and `query_max_wait`
+    seconds of waiting since a user is waiting.
+    """
+    KEY_SIZE = 16
+
+    def __init__(self, underlying: Embeddings, model_name: str, cache_dir, batch_size: int = 512,
+                 query_cache: QueryEmbeddingCache = None, scheduler: EmbeddingScheduler = None,
+                 query_retries: int = None, query_max_wait: float = None):
+        self.underlying = underlying
+        self.query_cache = query_cache or QueryEmbeddingCache()
+        self.model_name = model_name
+        self.cache_dir = Path(cache_dir)
+        self.batch_size = batch_size
+        self.scheduler = scheduler or EmbeddingScheduler(max_batch_size=batch_size)
+        self.query_retries = query_retries
+        self.query_max_wait = query_max_wait
+
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.keys_path = self.cache_dir / f"{slug}.keys"
+        self.vectors_path = self.cache_dir / f"{slug}.f32"
+        self.meta_path = self.cache_dir / f"{slug}.json"
+        self.lock_path = self.cache_dir / f"{slug}.lock"
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, int] = None  # digest -> row in <model>.f32, loaded lazily
+        self._vectors: np.ndarray = None  # Memory map of the complete rows at the last _map()
+        self._dim = None
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive across processes (where fcntl exists) while the files are read or appended to."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _truncate_to_complete_rows(self) -> int:
+        """
+        Cuts both files back to the rows they have in common (a crash between
+        the vector and key appends leaves one longer). Returns the row count.
+        """
+        key_bytes = self.keys_path.stat().st_size if self.keys_path.exists() else 0
+        vector_bytes = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+        row_bytes = self._dim * 4
+        rows = min(key_bytes // self.KEY_SIZE, vector_bytes // row_bytes)
+        if key_bytes != rows * self.KEY_SIZE:
+            os.truncate(self.keys_path, rows * self.KEY_SIZE)
+        if vector_bytes != rows * row_bytes:
+            os.truncate(self.vectors_path, rows * row_bytes)
+        return rows
+
+    def _load(self):
+        """Reads the keys once, dropping a torn last append, and maps the vectors."""
+        if self._index is not None:
+            return
+        self._index = {}
+        if not (self.meta_path.exists() and self.keys_path.exists() and self.vectors_path.exists()):
+            return
+
+        with open(self.meta_path, "r") as f:
+            self._dim = json.load(f)["dim"]
+        with self._file_lock():
+            rows = self._truncate_to_complete_rows()
+            with open(self.keys_path, "rb") as f:
+                keys = f.read(rows * self.KEY_SIZE)
+        for row in range(rows):
+            self._index[keys[row * self.KEY_SIZE:(row + 1) * self.KEY_SIZE]] = row
+        self._map()
+
+    def _map(self):
+        """(Re)maps the complete rows of <model>.f32, after appends made them longer."""
+        rows = self.vectors_path.stat().st_size // (self._dim * 4)
+        if rows == 0:
+            self._vectors = np.empty((0, self._dim), dtype=np.float32)  # A zero-length file cannot be mapped
+        else:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dim))
+
+    def _append(self, digests: List[bytes], vectors: np.ndarray):
+        """Appends new rows to disk and records where they are."""
+        # Another caller may have embedded the same text in the meantime
+        fresh = [i for i, d in enumerate(digests) if d not in self._index]
+        if not fresh:
+            return
+        digests = [digests[i] for i in fresh]
+        vectors = vectors[fresh]
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+            with open(self.meta_path, "w") as f:
+                json.dump({"model": self.model_name, "dim": self._dim}, f)
+
+        with self._file_lock():
+            # Another process may have crashed mid-append since this one loaded
+            start = self._truncate_to_complete_rows()
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.asarray(vectors, dtype=np.float32).tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(digests))
+
+        for row, digest in enumerate(digests):
+            self._index[digest] = start + row
+
+    def _split_misses(self, texts: List[str]):
+        """Returns per-text digests and the unique texts that are not cached."""
+        self._load()
+        digests = [text_key(t) for t in texts]
+        missing = {}
+        for digest, text in zip(digests, texts):
+            if digest not in self._index and digest not in missing:
+                missing[digest] = text
+
+        misses = len([d for d in digests if d in missing])
+        self.hits += len(texts) - misses
+        self.misses += misses
+        return digests, missing
+
+    def _collect(self, digests: List[bytes]) -> List[List[float]]:
+        if not digests:
+            return []
+        rows = [self._index[d] for d in digests]
+        if self._vectors is None or max(rows) >= len(self._vectors):
+            self._map()
+        return self._vectors[rows].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            digests, missing = self._split_misses(texts)
+        # Not under the lock: batches complete (and are appended) concurrently
+        self.scheduler.run(self.underlying.embed_documents, list(missing.values()), self._checkpoint(missing))
+        with self._lock:
+            return self._collect(digests)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            digests, missing = self._split_misses(texts)
+        await self.scheduler.arun(self.underlying.aembed_documents, list(missing.values()), self._checkpoint(missing))
+        with self._lock:
+            return self._collect(digests)
+
+    def _checkpoint(self, missing: Dict[bytes, str]):
+        """on_batch callback for the scheduler: persists each completed batch."""
+        missing_digests = list(missing)
+
+        def checkpoint(positions, vectors):
+            with self._lock:
+                self._append([missing_digests[i] for i in positions], vectors)
+        return checkpoint
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_queries([text]))[0]
+
+    def _cached_queries(self, queries: List[str]):
+        vectors = [self.query_cache.get(q) for q in queries]
+        missing = list(dict.fromkeys(q for q, v in zip(queries, vectors) if v is None))
+        return vectors, missing
+
+    def _fill_queries(self, queries, vectors, missing, embedded):
+        fresh = dict(zip(missing, embedded))
+        for query, vector in fresh.items():
+            self.query_cache.put(query, vector)
+        return [v if v is not None else fresh[q] for q, v in zip(queries, vectors)]
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embeds several queries with at most one provider call for the uncached ones."""
+        vectors, missing = self._cached_queries(queries)
+        embedded = self.scheduler.send(
+            self.underlying.embed_documents, missing, self.query_retries, query=True, max_wait=self.query_max_wait
+        ).tolist() if missing else []
+        return self._fill_queries(queries, vectors, missing, embedded)
+
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        vectors, missing = self._cached_queries(queries)
+        embedded = (await self.scheduler.asend(
+            self.underlying.aembed_documents, missing, self.query_retries, query=True, max_wait=self.query_max_wait
+        )).tolist() if missing else []
+        return self._fill_queries(queries, vectors, missing, embedded)
+
+    def stats(self) -> dict:
+        """Hit/miss counters since this process started."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "cached_vectors": len(self._index or {}),
+        }
@@ -0,0 +1,240 @@
+import asyncio
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+import numpy as np
+from src.utils.metrics import registry
+from src.utils.tokens import approximate_tokens
+
+EMBEDDING_REQUESTS = registry.counter("tutor_embedding_requests_total", "Embedding provider requests by outcome (ok | retried | failed).")
+EMBEDDING_THROTTLED = registry.counter("tutor_embedding_throttled_seconds_total", "Time embedding requests waited for the rate budget.")
+
+RETRYABLE_STATUS = {408, 409, 429}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts, connection errors and 5xx responses (by duck typing, so the SDK is not imported)."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    return type(error).__name__ in RETRYABLE_ERRORS or isinstance(error, (TimeoutError, ConnectionError))
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds from the response's Retry-After header, if the error carries one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class MinuteBudget:
+    """
+    Token bucket for a per-minute quota: holds up to one minute's worth and
+    refills continuously. reserve() takes the amount right away, going into
+    debt if needed, and returns how long the caller must wait before using
+    it, so concurrent callers are spaced out in arrival order.
+    """
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.clock = clock
+        self._available = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        if self.capacity <= 0:
+            return 0.0  # Unlimited
+        with self._lock:
+            now = self.clock()
+            self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            # A request larger than the whole quota still goes through, once the bucket is full
+            self._available -= min(amount, self.capacity)
+            return max(0.0, -self._available / self.rate)
+
+class EmbeddingScheduler:
+    """
+    Sends embedding requests for many texts within the provider's quota.
+
+    Texts are packed in order into batches of at most `max_batch_size`
+    texts and `max_batch_tokens` tokens. Up to `max_concurrency` batches are
+    in flight at once (the pool is shared by every caller of this
+    scheduler), and each request first waits for its share of the
+    `requests_per_minute` / `tokens_per_minute` budgets (0 = unlimited). A
+    retryable failure is retried up to `max_retries` times after a random
+    delay of up to backoff_base * 2^attempt seconds (capped at backoff_max,
+    and no less than the response's Retry-After). Throughput is then bound
+    by the quota rather than by round trips.
+
+    A `query_share` of both quotas is set aside for send(..., query=True):
+    the batches of an ingest, which keep their budget in debt, never delay
+    a user's query behind them. Queries also take `max_wait`, a limit on
+    the time spent waiting for the budget and between retries; a retry
+    that would go past it fails the query instead.
+
+    run() / arun() report every batch to `on_batch` as soon as it completes,
+    so the caller can persist it: when a batch finally fails, the batches
+    already done are not lost (see CachedEmbeddings). send() / asend() make
+    one request under the same budget and retry policy.
+    """
+    def __init__(self, max_batch_size: int = 512, max_batch_tokens: int = 0, max_concurrency: int = 1,
+                 requests_per_minute: int = 0, tokens_per_minute: int = 0, max_retries: int = 0,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0, query_share: float = 0.0,
+                 count_tokens: Callable[[str], int] = approximate_tokens, sleep=time.sleep, asleep=asyncio.sleep):
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests = MinuteBudget(requests_per_minute * (1 - query_share))
+        self.tokens = MinuteBudget(tokens_per_minute * (1 - query_share))
+        if query_share > 0:
+            self.query_requests = MinuteBudget(requests_per_minute * query_share)
+            self.query_tokens = MinuteBudget(tokens_per_minute * query_share)
+        else:
+            self.query_requests, self.query_tokens = self.requests, self.tokens
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.count_tokens = count_tokens
+        self.sleep = sleep
+        self.asleep = asleep
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def plan(self, texts: List[str]) -> List[List[int]]:
+        """Packs text positions into batches, keeping their order."""
+        batches, current, current_tokens = [], [], 0
+        for position, text in enumerate(texts):
+            tokens = self.count_tokens(text) if self.max_batch_tokens else 0
+            full = len(current) >= self.max_batch_size or (
+                self.max_batch_tokens and current and current_tokens + tokens > self.max_batch_tokens
+            )
+            if full:
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(position)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _budget_delay(self, texts: List[str], query: bool = False) -> float:
+        """Reserves one request and its tokens; returns how long to wait before sending."""
+        requests, tokens = (self.query_requests, self.query_tokens) if query else (self.requests, self.tokens)
+        count = sum(self.count_tokens(t) for t in texts) if tokens.capacity > 0 else 0
+        delay = max(requests.reserve(1), tokens.reserve(count))
+        if delay:
+            EMBEDDING_THROTTLED.inc(delay)
+        return delay
+
+    def _retry_delay(self, error: Exception, attempt: int, max_retries: int, wait_left: float = None) -> Optional[float]:
+        """Jittered backoff before retrying after `error`, or None to give up (also if it exceeds `wait_left`)."""
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        backoff = max(backoff, retry_after(error) or 0.0)
+        if attempt >= max_retries or not is_retryable(error) or (wait_left is not None and backoff > wait_left):
+            EMBEDDING_REQUESTS.inc(outcome="failed")
+            return None
+        EMBEDDING_REQUESTS.inc(outcome="retried")
+        print(f"Embedding request failed ({type(error).__name__}); retrying in {backoff:.1f}s...")
+        return backoff
+
+    def send(self, embed, texts: List[str], max_retries: int = None, query: bool = False,
+             max_wait: float = None) -> np.ndarray:
+        """
+        One request: waits for the budget, retries retryable errors with
+        jittered backoff. A `query` uses the query budget; `max_wait` caps
+        the seconds spent waiting overall.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        waited = 0.0
+        for attempt in itertools.count():
+            delay = self._budget_delay(texts, query)
+            if delay:
+                self.sleep(delay)
+                waited += delay
+            try:
+                vectors = np.asarray(embed(texts), dtype=np.float32)
+            except Exception as e:
+                backoff = self._retry_delay(e, attempt, max_retries, None if max_wait is None else max_wait - waited)
+                if backoff is None:
+                    raise
+                self.sleep(backoff)
+                waited += backoff
+                continue
+            EMBEDDING_REQUESTS.inc(outcome="ok")
+            return vectors
+
+    async def asend(self, aembed, texts: List[str], max_retries: int = None, query: bool = False,
+                    max_wait: float = None) -> np.ndarray:
+        """send() for a coroutine `aembed`, waiting without blocking the event loop."""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        waited = 0.0
+        for attempt in itertools.count():
+            delay = self._budget_delay(texts, query)
+            if delay:
+                await self.asleep(delay)
+                waited += delay
+            try:
+                vectors = np.asarray(await aembed(texts), dtype=np.float32)
+            except Exception as e:
+                backoff = self._retry_delay(e, attempt, max_retries, None if max_wait is None else max_wait - waited)
+                if backoff is None:
+                    raise
+                await self.asleep(backoff)
+                waited += backoff
+                continue
+            EMBEDDING_REQUESTS.inc(outcome="ok")
+            return vectors
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embed")
+            return self._executor
+
+    def run(self, embed: Callable[[List[str]], list], texts: List[str],
+            on_batch: Callable[[List[int], np.ndarray], None]):
+        """
+        Embeds `texts` with `embed` (a provider's embed_documents), calling
+        on_batch(positions, vectors) for each batch as it completes (from a
+        pool thread). Raises the first error that is not retried away,
+        after the batches already in flight have finished.
+        """
+        batches = self.plan(texts)
+        if self.max_concurrency == 1 or len(batches) == 1:
+            for positions in batches:
+                on_batch(positions, self.send(embed, [texts[i] for i in positions]))
+            return
+
+        def task(positions):
+            on_batch(positions, self.send(embed, [texts[i] for i in positions]))
+
+        futures = [self._pool().submit(task, positions) for positions in batches]
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                for pending in futures:
+                    pending.cancel()
+                wait(futures)
+                raise
+
+    async def arun(self, aembed, texts: List[str], on_batch: Callable[[List[int], np.ndarray], None]):
+        """run() for a coroutine `aembed` (a provider's aembed_documents), with up to max_concurrency batches in flight."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def task(positions):
+            async with semaphore:
+                on_batch(positions, await self.asend(aembed, [texts[i] for i in positions]))
+
+        tasks = [asyncio.ensure_future(task(positions)) for positions in self.plan(texts)]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            for pending in tasks:
+                pending.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
@@ -0,0 +1,68 @@
+import asyncio
+import hashlib
+from typing import Dict, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from src.rag.store_handle import IndexSnapshot, SnapshotRetriever
+from src.utils.metrics import stage
+
+def _doc_key(doc: Document) -> str:
+    return doc.id or hashlib.blake2b(doc.page_content.encode("utf-8"), digest_size=16).hexdigest()
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """
+    Merges ranked lists: each document scores sum(1 / (rrf_k + rank)) over
+    the lists it appears in. Only ranks are used, so BM25 scores and L2
+    distances never need to be put on the same scale.
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ordered[:k]]
+
+class HybridRetriever(SnapshotRetriever):
+    """
+    Retriever that fuses BM25 keyword matches with vector search results
+    using reciprocal-rank fusion. Keyword matching catches exact terms the
+    embedding may blur. mode="keyword" skips the vector search, so no
+    embedding calls are made at all.
+    """
+    mode: str = "hybrid"  # hybrid | keyword
+    fetch_k: int = 0  # Candidates per ranker; 0 means 2 * k
+    rrf_k: int = 60
+
+    def _candidates(self) -> int:
+        return self.fetch_k or 2 * self.k
+
+    def _keyword_docs(self, snapshot: IndexSnapshot, query: str) -> List[Document]:
+        return snapshot.keyword_search(self.handle.lexical_index(snapshot), query, self._candidates())
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        snapshot = self._snapshot()
+        with stage("keyword_search"):
+            keyword_docs = self._keyword_docs(snapshot, query)
+        if self.mode == "keyword":
+            return keyword_docs[:self.k]
+        with stage("embed_query"):
+            vector = self.embeddings.embed_query(query)
+        with stage("vector_search"):
+            vector_docs = snapshot.search([vector], self._candidates())[0]
+        return reciprocal_rank_fusion([vector_docs, keyword_docs], self.k, self.rrf_k)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        snapshot = self._snapshot()
+        loop = asyncio.get_running_loop()
+        with stage("keyword_search"):
+            keyword_docs = await loop.run_in_executor(None, self._keyword_docs, snapshot, query)
+        if self.mode == "keyword":
+            return keyword_docs[:self.k]
+        with stage("embed_query"):
+            vector = await self.embeddings.aembed_query(query)
+        with stage("vector_search"):
+            vector_docs = (await loop.run_in_executor(None, snapshot.search, [vector], self._candidates()))[0]
+        return reciprocal_rank_fusion([vector_docs, keyword_docs], self.k, self.rrf_k)
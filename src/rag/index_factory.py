@@ -0,0 +1,98 @@
+import math
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+def _pq_subquantizers(dim: int, requested: int) -> int:
+    """Largest divisor of `dim` not above `requested` (PQ needs dim % m == 0)."""
+    for m in range(min(requested, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+def build_index(vectors: np.ndarray, index_type: str = "flat", nlist: int = 0, pq_m: int = 64,
+                pq_nbits: int = 8, hnsw_m: int = 32, ef_construction: int = 80,
+                train_sample_size: int = 50000, seed: int = 0, n_total: int = None):
+    """
+    Builds an empty (but trained) FAISS index for `vectors`.
+
+    index_type:
+      flat      - exact L2 search, cost grows linearly with the corpus
+      ivf_flat  - inverted lists over k-means cells, exact distances inside a cell
+      ivf_pq    - inverted lists with product-quantized vectors (much smaller in RAM)
+      hnsw      - graph index, no training needed
+    IVF indexes are trained on a random sample of at most `train_sample_size`
+    vectors. If the corpus is too small to train the requested index, an
+    exact flat index is returned instead. When `vectors` is only a sample
+    of the corpus (streaming builds), pass the corpus size as `n_total`.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Expected one of: {', '.join(INDEX_TYPES)}")
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        return index
+
+    # IVF: rule-of-thumb cell count is ~4*sqrt(n)
+    nlist = nlist or max(1, int(4 * math.sqrt(n_total or n)))
+    min_train = nlist if index_type == "ivf_flat" else max(nlist, 2 ** pq_nbits)
+    if n < min_train:
+        print(f"Only {n} vectors, too few to train '{index_type}' (needs {min_train}). Using flat index.")
+        return faiss.IndexFlatL2(dim)
+
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+    else:
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim, pq_m), pq_nbits)
+
+    if n > train_sample_size:
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, size=train_sample_size, replace=False)]
+    else:
+        sample = vectors
+    index.train(sample)
+    return index
+
+def tune_index(index, nprobe: int = 8, ef_search: int = 64):
+    """Applies query-time parameters; these trade recall for latency."""
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(nprobe, index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    return index
+
+def describe_index(index) -> str:
+    if isinstance(index, faiss.IndexIVFPQ):
+        return f"ivf_pq(nlist={index.nlist}, nprobe={index.nprobe})"
+    if isinstance(index, faiss.IndexIVF):
+        return f"ivf_flat(nlist={index.nlist}, nprobe={index.nprobe})"
+    if isinstance(index, faiss.IndexHNSW):
+        return f"hnsw(efSearch={index.hnsw.efSearch})"
+    return "flat"
+
+def remove_positions(index, positions):
+    """
+    Drops the vectors at `positions` from a writable index, keeping the rest
+    in order (positions are docstore keys, so they have to stay dense). The
+    index is refilled from its stored vectors: remove_ids() is not supported
+    by HNSW and leaves gaps in IVF ids. IVF-PQ vectors are re-encoded from
+    their codes. Training is kept.
+    """
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    vectors = index.reconstruct_n(0, index.ntotal)
+    keep = np.setdiff1d(np.arange(index.ntotal), np.asarray(positions, dtype=np.int64))
+    if isinstance(index, faiss.IndexIVF):
+        index.set_direct_map_type(faiss.DirectMap.NoMap)
+    index.reset()
+    index.add(vectors[keep])
+    return index
@@ -0,0 +1,120 @@
+import math
+from array import array
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from heapq import nlargest
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how in is it of on or that the "
+    "this to was what when where which who why with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"\w+", text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+class BM25Index:
+    """
+    In-memory inverted index over chunk texts, scored with Okapi BM25.
+
+    It is append-only: documents get increasing positions and postings lists
+    stay sorted by position. A search can be limited to the first `limit`
+    documents, which lets an index snapshot keep reading a consistent view
+    while uploads append to the same index.
+
+    Entries are Documents (add()) or references to them (add_refs()), which
+    `resolve` turns into Documents for the hits a search returns. With
+    references the texts are not kept, only the postings.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75, resolve: Callable[[Any], Document] = None):
+        self.k1 = k1
+        self.b = b
+        self.resolve = resolve
+        self.docs: List[Any] = []  # Documents, or references when `resolve` is set
+        # Typed arrays, not lists of ints: postings are most of the index's memory
+        self._lengths = array("I")
+        self._total_lengths = array("Q")  # Running sum of _lengths
+        self._postings: Dict[str, Tuple[array, array]] = defaultdict(lambda: (array("I"), array("I")))  # term -> (positions, tfs)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, docs: Iterable[Document]):
+        self.add_refs((doc, doc.page_content) for doc in docs)
+
+    def add_refs(self, entries: Iterable[Tuple[Any, str]]):
+        """Indexes (reference, text) pairs; only the reference is kept."""
+        with self._lock:
+            for ref, text in entries:
+                position = len(self.docs)
+                terms = Counter(tokenize(text))
+                for term, tf in terms.items():
+                    positions, tfs = self._postings[term]
+                    tfs.append(tf)
+                    positions.append(position)
+                length = sum(terms.values())
+                self._lengths.append(length)
+                self._total_lengths.append((self._total_lengths[-1] if self._total_lengths else 0) + length)
+                # Appended last: readers only look at positions below len(self.docs)
+                self.docs.append(ref)
+
+    def search(self, query: str, k: int, limit: Optional[int] = None,
+               keep: Callable[[Document], bool] = None) -> List[Tuple[Document, float]]:
+        """
+        Top-k (document, BM25 score) among the first `limit` documents. With
+        `keep`, documents it rejects are skipped and the next best fill in.
+        """
+        n = len(self.docs) if limit is None else min(limit, len(self.docs))
+        if n == 0:
+            return []
+        avg_length = max(self._total_lengths[n - 1] / n, 1e-9)
+
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            positions, tfs = self._postings[term]
+            df = bisect_left(positions, n)
+            if df == 0:
+                continue
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for i in range(df):
+                tf, length = tfs[i], self._lengths[positions[i]]
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[positions[i]] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        resolve = self.resolve or (lambda doc: doc)
+        hits, seen, fetch = [], 0, k
+        while True:
+            # nlargest(n) is a prefix of nlargest(2n), so only the new tail is resolved
+            top = nlargest(fetch, scores.items(), key=lambda item: item[1])
+            for position, score in top[seen:]:
+                doc = resolve(self.docs[position])
+                if keep is None or keep(doc):
+                    hits.append((doc, score))
+            seen = len(top)
+            if len(hits) >= k or len(top) < fetch:
+                return hits[:k]
+            fetch *= 2
+
+def store_chunks(stores) -> Iterator[Tuple[Tuple[Any, int], str]]:
+    """((store, position), text) for every chunk of FAISS stores, in index order; see resolve_chunk()."""
+    for store in stores:
+        for i in range(store.index.ntotal):
+            yield (store, i), store.docstore.search(store.index_to_docstore_id[i]).page_content
+
+def resolve_chunk(ref: Tuple[Any, int]) -> Document:
+    store, position = ref
+    return store.docstore.search(store.index_to_docstore_id[position])
+
+def documents_in_order(stores) -> List[Document]:
+    """All documents of FAISS stores, in index order."""
+    docs = []
+    for store in stores:
+        for i in range(store.index.ntotal):
+            docs.append(store.docstore.search(store.index_to_docstore_id[i]))
+    return docs
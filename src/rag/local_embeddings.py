@@ -0,0 +1,82 @@
+from functools import lru_cache
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+class LocalEmbeddings(Embeddings):
+    """Base for CPU embedding backends; adds the batched query API RAGPipeline uses."""
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        return await self.aembed_documents(texts)
+
+class HashingEmbeddings(LocalEmbeddings):
+    """
+    CPU-only embeddings from scikit-learn's HashingVectorizer: word unigrams
+    and bigrams hashed into `n_features` buckets, sublinear term frequency,
+    L2-normalised. Stateless, so the same text always gets the same vector
+    and nothing has to be fitted or saved alongside the index.
+    """
+    def __init__(self, n_features: int = 1024):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.n_features = n_features
+        self._vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None,
+            stop_words="english",
+        )
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        counts = self._vectorizer.transform(texts).astype(np.float32)
+        counts.data = 1.0 + np.log(counts.data)  # Sublinear tf
+        matrix = counts.toarray()
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+    def stats(self) -> dict:
+        return {"backend": "hashing", "n_features": self.n_features}
+
+class SentenceTransformerEmbeddings(LocalEmbeddings):
+    """Small local sentence-embedding model (needs the optional sentence-transformers package)."""
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "LOCAL_EMBEDDING_BACKEND=sentence-transformers:<model> needs `pip install sentence-transformers`"
+            ) from e
+        self.model_name = model_name
+        self._model = SentenceTransformer(model_name, device="cpu")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._model.encode(texts, normalize_embeddings=True).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> dict:
+        return {"backend": "sentence-transformers", "model": self.model_name}
+
+@lru_cache(maxsize=None)
+def get_local_embeddings(backend: str) -> Embeddings:
+    """
+    Local embedding backend by name:
+      hashing                           - HashingEmbeddings (default, no extra dependencies)
+      sentence-transformers:<model>     - e.g. sentence-transformers:all-MiniLM-L6-v2
+    One instance per backend is shared by the process (models load once).
+    """
+    if backend == "hashing":
+        return HashingEmbeddings()
+    if backend.startswith("sentence-transformers:"):
+        return SentenceTransformerEmbeddings(backend.split(":", 1)[1])
+    raise ValueError(f"Unknown local embedding backend '{backend}'")
@@ -0,0 +1,100 @@
+import json
+import mmap
+import os
+from typing import Iterable, Iterator
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+INDEX_FILE = "index.faiss"
+DOCS_FILE = "docs.jsonl"
+OFFSETS_FILE = "docs.offsets.npy"
+
+# Zero-copy mapping where this FAISS build supports it (flat and HNSW
+# storage); IVF lists are mapped with either flag.
+_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+def is_mapped_store(path: str) -> bool:
+    return os.path.exists(os.path.join(path, OFFSETS_FILE))
+
+def read_index(path: str, mmap_enabled: bool = True):
+    """Reads a FAISS index, memory-mapped unless disabled or unsupported for its type."""
+    if mmap_enabled:
+        try:
+            return faiss.read_index(path, _MMAP_FLAG)
+        except RuntimeError as e:
+            print(f"Index cannot be memory-mapped, reading it into memory: {e}")
+    return faiss.read_index(path)
+
+def write_docstore(path: str, documents: Iterable[Document]) -> int:
+    """
+    Writes documents as one JSON record per line plus an array of the byte
+    offset of every line (and the end of the file). Returns the count.
+    """
+    offsets = [0]
+    with open(os.path.join(path, DOCS_FILE), "wb") as f:
+        for doc in documents:
+            record = {"id": doc.id, "text": doc.page_content, "metadata": doc.metadata}
+            f.write(json.dumps(record, default=str).encode("utf-8") + b"\n")
+            offsets.append(f.tell())
+    np.save(os.path.join(path, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+    return len(offsets) - 1
+
+def write_store(path: str, index, documents: Iterable[Document]):
+    """Saves an index and its documents (in index order) in the format MappedStore reads."""
+    os.makedirs(path, exist_ok=True)
+    count = write_docstore(path, documents)
+    if count != index.ntotal:
+        raise ValueError(f"Index has {index.ntotal} vectors but {count} documents were written")
+    faiss.write_index(index, os.path.join(path, INDEX_FILE))
+
+class MappedDocstore:
+    """
+    Chunk texts and metadata of a saved index, read on demand. The records
+    file and the offsets are memory-mapped, so loading reads nothing and
+    every worker shares the pages through the OS cache. Keys are index
+    positions (see MappedStore.index_to_docstore_id).
+    """
+    def __init__(self, path: str):
+        self._offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(path, DOCS_FILE), "rb") as f:
+            # mmap cannot map an empty file
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if len(self) else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def search(self, position: int) -> Document:
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        record = json.loads(self._data[start:end])
+        return Document(id=record["id"], page_content=record["text"], metadata=record["metadata"])
+
+    def __iter__(self) -> Iterator[Document]:
+        for position in range(len(self)):
+            yield self.search(position)
+
+class MappedStore:
+    """
+    Read-only vector store over a directory written by write_store(): the
+    FAISS index is memory-mapped and documents are read from MappedDocstore
+    as search results need them. It has the attributes the snapshot search
+    uses on LangChain FAISS stores (index, docstore, index_to_docstore_id,
+    embeddings). New chunks go into separate delta stores; a mapped index
+    must never be added to.
+    """
+    def __init__(self, path: str, embeddings, mmap_enabled: bool = True):
+        self.path = path
+        self.embeddings = embeddings
+        self.index = read_index(os.path.join(path, INDEX_FILE), mmap_enabled)
+        self.docstore = MappedDocstore(path)
+        if len(self.docstore) != self.index.ntotal:
+            raise ValueError(f"Index at {path} has {self.index.ntotal} vectors but {len(self.docstore)} documents")
+        # Positions are the docstore keys; a range takes no memory per chunk
+        self.index_to_docstore_id = range(self.index.ntotal)
+
+    def writable_index(self):
+        """An in-memory copy of the index that vectors can be added to (for compaction)."""
+        return faiss.read_index(os.path.join(self.path, INDEX_FILE))
+
+    def save_local(self, folder_path: str):
+        write_store(folder_path, self.index, self.docstore)
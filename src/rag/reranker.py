@@ -0,0 +1,162 @@
+import asyncio
+import time
+from functools import lru_cache
+from typing import Any, List, Optional
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.utils.metrics import stage
+
+def mmr(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float = 0.7) -> List[int]:
+    """
+    Maximal marginal relevance: greedily picks the candidate with the best
+    lambda * relevance - (1 - lambda) * (max similarity to those already
+    picked). Returns candidate positions in selection order.
+    """
+    similarity = vectors @ vectors.T
+    candidates = list(range(len(relevance)))
+    selected: List[int] = []
+    while candidates and len(selected) < k:
+        if selected:
+            redundancy = similarity[np.ix_(candidates, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(candidates))
+        scores = lambda_mult * relevance[candidates] - (1 - lambda_mult) * redundancy
+        selected.append(candidates.pop(int(np.argmax(scores))))
+    return selected
+
+def rank_relevance(n: int, rrf_k: int = 60) -> np.ndarray:
+    """
+    Relevance of n candidates from their retrieval order: the reciprocal
+    rank 1 / (rrf_k + rank) used by hybrid fusion, scaled so the top
+    candidate scores 1. It decays slowly, so a near-duplicate of a chosen
+    chunk drops below the next distinct one.
+    """
+    return (rrf_k + 1) / (rrf_k + np.arange(1, n + 1))
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+class CrossEncoderScorer:
+    """Local CPU cross-encoder (needs the optional sentence-transformers package)."""
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError(
+                "RERANK_CROSS_ENCODER needs `pip install sentence-transformers`"
+            ) from e
+        self.model_name = model_name
+        self._model = CrossEncoder(model_name, device="cpu")
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        return [float(s) for s in self._model.predict([(query, text) for text in texts])]
+
+@lru_cache(maxsize=None)
+def get_cross_encoder(model_name: str) -> CrossEncoderScorer:
+    """One cross-encoder per model is shared by the process (models load once)."""
+    return CrossEncoderScorer(model_name)
+
+class Reranker:
+    """
+    Reorders retrieved candidates before they are formatted into the prompt.
+
+    Relevance comes from the cross-encoder when one is configured and it
+    scores every candidate within the budget, otherwise from the order the
+    retriever returned (see rank_relevance), which already reflects the
+    provider embeddings and hybrid fusion. Local (CPU) embeddings of the
+    candidates only measure how much they repeat each other: MMR picks the
+    top `k` while skipping candidates too similar to those already picked.
+
+    `budget_ms` bounds the time spent per request. The cross-encoder runs in
+    batches and is abandoned once the budget is spent (embedding relevance
+    is used instead); arerank() also stops waiting at the budget and falls
+    back to the retriever's own order. Errors fall back the same way, so
+    reranking can only cost latency up to the budget, never a failed request.
+    """
+    def __init__(self, embeddings, k: int = 8, lambda_mult: float = 0.7,
+                 cross_encoder: Optional[Any] = None, budget_ms: float = 150, batch_size: int = 8):
+        self.embeddings = embeddings
+        self.k = k
+        self.lambda_mult = lambda_mult
+        self.cross_encoder = cross_encoder
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.reranked = 0
+        self.cross_encoder_timeouts = 0
+        self.fallbacks = 0
+
+    def rerank(self, query: str, docs: List[Document], k: Optional[int] = None,
+               deadline: Optional[float] = None) -> List[Document]:
+        k = k or self.k
+        if len(docs) <= 1:
+            return docs[:k]
+        if deadline is None:
+            deadline = time.monotonic() + self.budget_ms / 1000
+        try:
+            texts = [doc.page_content for doc in docs]
+            vectors = _normalize_rows(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+            relevance = rank_relevance(len(docs))
+            if self.cross_encoder is not None:
+                scores = self._cross_encoder_scores(query, texts, deadline)
+                if scores is not None:
+                    relevance = scores
+            order = mmr(relevance, vectors, k, self.lambda_mult)
+        except Exception as e:
+            self.fallbacks += 1
+            print(f"Reranking failed, keeping retrieval order: {e}")
+            return docs[:k]
+        self.reranked += 1
+        return [docs[i] for i in order]
+
+    async def arerank(self, query: str, docs: List[Document], k: Optional[int] = None) -> List[Document]:
+        k = k or self.k
+        if len(docs) <= 1:
+            return docs[:k]
+        budget = self.budget_ms / 1000
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + budget
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(None, self.rerank, query, docs, k, deadline), timeout=budget
+            )
+        except asyncio.TimeoutError:
+            self.fallbacks += 1
+            return docs[:k]
+
+    def _cross_encoder_scores(self, query: str, texts: List[str], deadline: float) -> Optional[np.ndarray]:
+        """Min-max scaled scores for all texts, or None if the budget ran out first."""
+        scores: List[float] = []
+        for start in range(0, len(texts), self.batch_size):
+            if time.monotonic() >= deadline:
+                self.cross_encoder_timeouts += 1
+                return None
+            scores.extend(self.cross_encoder.score(query, texts[start:start + self.batch_size]))
+        scores = np.asarray(scores, dtype=np.float32)
+        spread = scores.max() - scores.min()
+        return (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+
+    def stats(self) -> dict:
+        return {
+            "cross_encoder": getattr(self.cross_encoder, "model_name", None),
+            "reranked": self.reranked,
+            "cross_encoder_timeouts": self.cross_encoder_timeouts,
+            "fallbacks": self.fallbacks,
+        }
+
+class RerankingRetriever(BaseRetriever):
+    """Fetches candidates with `base` and returns the reranker's top-k."""
+    base: Any
+    reranker: Any
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs = self.base.invoke(query)
+        with stage("rerank"):
+            return self.reranker.rerank(query, docs)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        docs = await self.base.ainvoke(query)
+        with stage("rerank"):
+            return await self.reranker.arerank(query, docs)
@@ -0,0 +1,59 @@
+import threading
+import httpx
+from src.config.settings import config
+
+# Process-wide RAG resources. TutorAgent, ToolFactory and the ingest entry
+# points all take their pipeline from here, so a process holds one
+# embedding client, one HTTP connection pool and one copy of each index.
+_resources = {}
+_lock = threading.RLock()  # Reentrant: factories below call each other
+
+def _shared(name: str, factory):
+    with _lock:
+        if name not in _resources:
+            _resources[name] = factory()
+        return _resources[name]
+
+def register(name: str, value):
+    """
+    Installs a resource in place of its default, e.g. register("embeddings",
+    ...) before the first get_rag_pipeline() to run without the provider.
+    """
+    with _lock:
+        _resources[name] = value
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+def get_http_client() -> httpx.Client:
+    """Pooled client for blocking provider calls (ingest, thread-pool work)."""
+    return _shared("http_client", lambda: httpx.Client(limits=_http_limits(), timeout=config.HTTP_TIMEOUT_SECONDS))
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Pooled client for provider calls made from the event loop."""
+    return _shared("http_async_client", lambda: httpx.AsyncClient(limits=_http_limits(), timeout=config.HTTP_TIMEOUT_SECONDS))
+
+def get_embeddings():
+    """The provider embedding client (with its caches), sharing the pooled HTTP clients."""
+    from src.rag.vector_store import provider_embeddings
+
+    return _shared("embeddings", lambda: provider_embeddings(get_http_client(), get_async_http_client()))
+
+def get_rag_pipeline():
+    """The main RAGPipeline for this process, created on first use."""
+    from src.rag.vector_store import RAGPipeline
+
+    return _shared("rag_pipeline", lambda: RAGPipeline(embeddings=get_embeddings()))
+
+async def aclose_resources():
+    """Closes the pooled HTTP clients and forgets all shared resources (server shutdown)."""
+    with _lock:
+        resources = dict(_resources)
+        _resources.clear()
+    if "http_client" in resources:
+        resources["http_client"].close()
+    if "http_async_client" in resources:
+        await resources["http_async_client"].aclose()
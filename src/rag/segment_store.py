@@ -0,0 +1,211 @@
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Iterator, List, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+_ANY_BASE = object()
+
+class SegmentStore:
+    """
+    On-disk layout for an append-only vector index.
+
+    <root>/manifest.json   - {"base": ..., "segments": [...], "retired": [...], "deleted": [...], "next_id": n,
+                              "checkpoint": {...}}  (the writer's progress, committed with its segments)
+    <root>/base-000001/    - a full index: index.faiss + docs.jsonl + docs.offsets.npy (see mapped_store)
+    <root>/seg-000002/     - vectors.npy + docs.jsonl for the chunks of one ingest
+
+    Each ingest writes one small segment, so its cost depends on the upload
+    size rather than the corpus size. Compaction folds segments into a new
+    base. Deleting chunks only records their ids ("deleted"); searches skip
+    them and compaction leaves them out of the new base. The manifest is replaced atomically, and replaced directories are
+    only deleted one generation later so in-flight loads never lose files.
+    A root with index.faiss but no manifest (the old layout) is read as base "."
+    (it is only recognized so that a rebuild can delete it).
+    """
+    MANIFEST = "manifest.json"
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.manifest_path = self.root / self.MANIFEST
+        self._lock = threading.Lock()
+
+    def read_manifest(self) -> dict:
+        if self.manifest_path.exists():
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        base = "." if os.path.exists(self.root / "index.faiss") else None
+        return {"base": base, "segments": [], "retired": [], "deleted": [], "next_id": 1}
+
+    def _write_manifest(self, manifest: dict):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def _new_name(self, manifest: dict, prefix: str) -> str:
+        name = f"{prefix}-{manifest['next_id']:06d}"
+        manifest["next_id"] += 1
+        return name
+
+    def _delete(self, name: str):
+        if name == ".":
+            # Old single-directory layout
+            for filename in ("index.faiss", "index.pkl"):
+                path = self.root / filename
+                if path.exists():
+                    path.unlink()
+        else:
+            shutil.rmtree(self.root / name, ignore_errors=True)
+
+    def base_path(self):
+        """Directory of the current base index, or None if there is no index."""
+        base = self.read_manifest()["base"]
+        if base is None:
+            return None
+        return str(self.root / base)
+
+    def segment_count(self) -> int:
+        return len(self.read_manifest()["segments"])
+
+    def reserve_base(self) -> Tuple[str, str]:
+        """Allocates a directory name for a new base. Returns (name, path)."""
+        with self._lock:
+            manifest = self.read_manifest()
+            name = self._new_name(manifest, "base")
+            self._write_manifest(manifest)
+        path = self.root / name
+        os.makedirs(path, exist_ok=True)
+        return name, str(path)
+
+    def commit_base(self, name: str, merged_segments: List[str] = None, expected_base=_ANY_BASE,
+                    removed_ids: List[str] = ()) -> bool:
+        """
+        Makes `name` the base. With merged_segments=None every segment is dropped
+        (full rebuild); otherwise only the merged ones are, and `removed_ids`
+        are the deleted chunks the new base no longer contains. If the base
+        changed since `expected_base` was read, the commit is abandoned.
+        """
+        with self._lock:
+            manifest = self.read_manifest()
+            if expected_base is not _ANY_BASE and manifest["base"] != expected_base:
+                self._delete(name)
+                return False
+
+            for old in manifest.get("retired", []):
+                self._delete(old)
+
+            full_rebuild = merged_segments is None
+            if full_rebuild:
+                merged_segments = list(manifest["segments"])
+            retired = [s for s in merged_segments if s in manifest["segments"]]
+            if manifest["base"] is not None:
+                retired.append(manifest["base"])
+
+            manifest["segments"] = [s for s in manifest["segments"] if s not in merged_segments]
+            if full_rebuild:
+                manifest["deleted"] = []
+            else:
+                removed = set(removed_ids)
+                manifest["deleted"] = [i for i in manifest.get("deleted", []) if i not in removed]
+            manifest["base"] = name
+            manifest["retired"] = retired
+            self._write_manifest(manifest)
+            return True
+
+    def append_segment(self, texts: List[str], vectors, metadatas: List[dict], ids: List[str],
+                       checkpoint: dict = None) -> str:
+        """
+        Writes one segment and commits it to the manifest, together with
+        `checkpoint` if given. A segment left behind by a crash before its
+        commit is not in the manifest and is overwritten.
+        """
+        with self._lock:
+            manifest = self.read_manifest()
+            name = self._new_name(manifest, "seg")
+            tmp_dir = self.root / f".{name}.tmp"
+            shutil.rmtree(self.root / name, ignore_errors=True)
+            os.makedirs(tmp_dir, exist_ok=True)
+
+            np.save(tmp_dir / "vectors.npy", np.asarray(vectors, dtype=np.float32))
+            with open(tmp_dir / "docs.jsonl", "w", encoding="utf-8") as f:
+                for doc_id, text, metadata in zip(ids, texts, metadatas):
+                    f.write(json.dumps({"id": doc_id, "text": text, "metadata": metadata}, default=str) + "\n")
+
+            os.replace(tmp_dir, self.root / name)
+            manifest["segments"].append(name)
+            if checkpoint is not None:
+                manifest["checkpoint"] = checkpoint
+            self._write_manifest(manifest)
+            return name
+
+    def save_checkpoint(self, checkpoint: dict):
+        """Commits the writer's progress without a new segment."""
+        with self._lock:
+            manifest = self.read_manifest()
+            manifest["checkpoint"] = checkpoint
+            self._write_manifest(manifest)
+
+    def checkpoint(self):
+        return self.read_manifest().get("checkpoint")
+
+    def delete_chunks(self, ids: List[str]):
+        """Marks chunks as deleted; they stay on disk until the next compaction or rebuild."""
+        with self._lock:
+            manifest = self.read_manifest()
+            deleted = manifest.setdefault("deleted", [])
+            known = set(deleted)
+            deleted.extend(i for i in ids if i not in known)
+            self._write_manifest(manifest)
+
+    def read_segment(self, name: str):
+        """Returns (texts, vectors, metadatas, ids) for one segment."""
+        path = self.root / name
+        vectors = np.load(path / "vectors.npy")
+        texts, metadatas, ids = [], [], []
+        with open(path / "docs.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                texts.append(record["text"])
+                metadatas.append(record["metadata"])
+                ids.append(record["id"])
+        return texts, vectors, metadatas, ids
+
+    def iter_documents(self, names: List[str]) -> Iterator[Document]:
+        """The segments' chunks as Documents, read one line at a time (vectors are not loaded)."""
+        for name in names:
+            with open(self.root / name / "docs.jsonl", "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    yield Document(id=record["id"], page_content=record["text"], metadata=record["metadata"])
+
+    def iter_segments(self, names: List[str] = None) -> Iterator[tuple]:
+        names = self.read_manifest()["segments"] if names is None else names
+        for name in names:
+            yield self.read_segment(name)
+
+    def sample_vectors(self, names: List[str], size: int, seed: int = 0) -> Tuple[np.ndarray, int]:
+        """
+        Random sample of at most `size` vectors across segments, read through
+        memory maps so only the sampled rows are loaded. Returns (sample, total).
+        """
+        arrays = [np.load(self.root / name / "vectors.npy", mmap_mode="r") for name in names]
+        counts = [len(a) for a in arrays]
+        total = sum(counts)
+        if total <= size:
+            return np.vstack([np.asarray(a) for a in arrays]), total
+
+        chosen = np.sort(np.random.default_rng(seed).choice(total, size=size, replace=False))
+        offsets = np.cumsum([0] + counts)
+        rows = []
+        for i, array in enumerate(arrays):
+            local = chosen[(chosen >= offsets[i]) & (chosen < offsets[i + 1])] - offsets[i]
+            if len(local):
+                rows.append(np.asarray(array[local]))
+        return np.vstack(rows), total
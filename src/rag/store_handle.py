@@ -0,0 +1,228 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.rag.lexical_index import BM25Index, resolve_chunk, store_chunks
+from src.utils.metrics import stage
+
+class IndexSnapshot:
+    """
+    Immutable view of the index: the base store plus small delta stores added
+    by uploads since it was loaded, minus the `deleted` chunk ids (replaced
+    chunks, which stay in the stores until compaction). A request searches
+    one snapshot from start to finish, so an upload finishing mid-request
+    cannot change its results.
+    """
+    def __init__(self, stores, generation: int, deleted=frozenset()):
+        self.stores = tuple(stores)
+        self.generation = generation
+        self.deleted = frozenset(deleted)
+
+    @property
+    def base(self):
+        return self.stores[0]
+
+    @property
+    def ntotal(self) -> int:
+        return sum(store.index.ntotal for store in self.stores)
+
+    def _store_hits(self, store, matrix: np.ndarray, k: int) -> List[List[tuple]]:
+        """
+        Per query row, the store's k nearest chunks that are not deleted, as
+        (distance, store, position). The first search fetches k; only rows
+        that lost hits to deleted chunks are searched again, fetching twice
+        as many each round.
+        """
+        results = [[] for _ in range(len(matrix))]
+        pending, fetch_k = list(range(len(matrix))), k
+        while pending:
+            distances, indices = store.index.search(matrix[pending], fetch_k)
+            short = []
+            for j, row in enumerate(pending):
+                hits, returned = [], 0
+                for distance, i in zip(distances[j], indices[j]):
+                    if i == -1:  # Fewer than fetch_k vectors in this store
+                        continue
+                    returned += 1
+                    if self.deleted and store.docstore.search(store.index_to_docstore_id[i]).id in self.deleted:
+                        continue
+                    hits.append((float(distance), store, i))
+                    if len(hits) == k:
+                        break
+                results[row] = hits
+                if len(hits) < k and returned == fetch_k and fetch_k < store.index.ntotal:
+                    short.append(row)
+            pending, fetch_k = short, fetch_k * 2
+        return results
+
+    def search_with_scores(self, vectors, k: int) -> List[List[Tuple[Document, float]]]:
+        """Top-k (document, L2 distance) per query row, merged across all stores."""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        per_store = [self._store_hits(store, matrix, k) for store in self.stores]
+
+        results = []
+        for row in range(len(matrix)):
+            candidates = sorted((hit for hits in per_store for hit in hits[row]), key=lambda hit: hit[0])
+            results.append([
+                (store.docstore.search(store.index_to_docstore_id[i]), distance)
+                for distance, store, i in candidates[:k]
+            ])
+        return results
+
+    def search(self, vectors, k: int) -> List[List[Document]]:
+        return [[doc for doc, _ in row] for row in self.search_with_scores(vectors, k)]
+
+    def keyword_search(self, lexical: BM25Index, query: str, k: int) -> List[Document]:
+        """Top-k BM25 matches from `lexical` (see VectorStoreHandle.lexical_index), skipping deleted chunks."""
+        keep = (lambda doc: doc.id not in self.deleted) if self.deleted else None
+        return [doc for doc, _ in lexical.search(query, k, limit=self.ntotal, keep=keep)]
+
+def merge_flat_stores(embeddings, stores) -> FAISS:
+    """
+    Copies several flat stores into one new store; the inputs are left
+    untouched (FAISS.merge_from would move their vectors out, emptying them
+    for snapshots that still search them).
+    """
+    merged = FAISS(embeddings, faiss.IndexFlatL2(stores[0].index.d), InMemoryDocstore(), {})
+    for store in stores:
+        n = store.index.ntotal
+        ids = [store.index_to_docstore_id[i] for i in range(n)]
+        docs = [store.docstore.search(doc_id) for doc_id in ids]
+        merged.add_embeddings(
+            zip([doc.page_content for doc in docs], store.index.reconstruct_n(0, n)),
+            metadatas=[doc.metadata for doc in docs], ids=ids,
+        )
+    return merged
+
+class VectorStoreHandle:
+    """
+    Process-wide handle to the live index for one index path.
+    The ingest path publishes new snapshots here. Retrievers read whatever
+    snapshot is current, so new chunks are visible without a reload from
+    disk or a chain rebuild. Swapping the reference is atomic.
+    """
+    def __init__(self, max_deltas: int = 8):
+        self.max_deltas = max_deltas
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._lock = threading.Lock()
+        # Keyword index over the same chunks, built on first use and then
+        # extended by append(); (base store, index) so a rebuild resets it.
+        self._lexical: Optional[Tuple[Any, BM25Index]] = None
+
+    def snapshot(self) -> Optional[IndexSnapshot]:
+        return self._snapshot
+
+    def publish(self, store, deltas=(), deleted=()):
+        """
+        Replaces the whole index (initial load or full rebuild). `deltas` are
+        stores for segments appended since `store` was saved, `deleted` the
+        ids of chunks removed since then.
+        """
+        deltas = list(deltas)
+        if len(deltas) > self.max_deltas:
+            deltas = [merge_flat_stores(deltas[0].embeddings, deltas)]
+        with self._lock:
+            generation = self._snapshot.generation + 1 if self._snapshot else 1
+            self._snapshot = IndexSnapshot([store] + deltas, generation, deleted)
+            self._lexical = None
+
+    def append(self, delta) -> bool:
+        """Adds a delta store. Returns False if no index is loaded in this process."""
+        return self.update(delta=delta)
+
+    def update(self, delta=None, deleted=()) -> bool:
+        """
+        Adds a delta store and/or deletes chunks by id, as one new snapshot.
+        Returns False if no index is loaded in this process. Merging deltas
+        copies them, so it happens outside the lock; if another update or a
+        publish got in first, the new snapshot is rebuilt on top of theirs.
+        """
+        while True:
+            current = self._snapshot
+            if current is None:
+                return False
+            deltas = list(current.stores[1:])
+            if delta is not None:
+                deltas.append(delta)
+                if len(deltas) > self.max_deltas:
+                    # Keep the per-query fan-out bounded
+                    deltas = [merge_flat_stores(delta.embeddings, deltas)]
+            with self._lock:
+                if self._snapshot is not current:
+                    continue
+                if delta is not None and self._lexical is not None:
+                    # Before the new snapshot is visible, so its search limit covers these
+                    self._lexical[1].add_refs(store_chunks([delta]))
+                self._snapshot = IndexSnapshot(
+                    [current.base] + deltas, current.generation + 1, current.deleted | set(deleted)
+                )
+                return True
+
+    def clear(self):
+        with self._lock:
+            self._snapshot = None
+            self._lexical = None
+
+    def has_lexical_index(self) -> bool:
+        return self._lexical is not None
+
+    def lexical_index(self, snapshot: IndexSnapshot) -> BM25Index:
+        """
+        BM25 index covering `snapshot`; search it with limit=snapshot.ntotal.
+        Built from the stores' texts on first use (no embedding calls). It
+        keeps (store, position) references, not the texts: hits are read
+        from the (memory-mapped) docstore, so only the postings stay in
+        each worker's memory.
+        """
+        with self._lock:
+            if self._lexical is not None and self._lexical[0] is snapshot.base:
+                return self._lexical[1]
+            lexical = BM25Index(resolve=resolve_chunk)
+            lexical.add_refs(store_chunks(snapshot.stores))
+            if snapshot is self._snapshot:
+                self._lexical = (snapshot.base, lexical)
+            return lexical
+
+_handles: Dict[str, VectorStoreHandle] = {}
+_handles_lock = threading.Lock()
+
+def get_store_handle(path: str, max_deltas: int = 8) -> VectorStoreHandle:
+    """Returns the shared handle for an index path, creating it on first use."""
+    with _handles_lock:
+        if path not in _handles:
+            _handles[path] = VectorStoreHandle(max_deltas=max_deltas)
+        return _handles[path]
+
+class SnapshotRetriever(BaseRetriever):
+    """Retriever over the current snapshot of a VectorStoreHandle."""
+    handle: Any
+    embeddings: Any
+    k: int = 8
+
+    def _snapshot(self) -> IndexSnapshot:
+        snapshot = self.handle.snapshot()
+        if snapshot is None:
+            raise ValueError("Index not found. Please run ingestion first.")
+        return snapshot
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        snapshot = self._snapshot()
+        with stage("embed_query"):
+            vector = self.embeddings.embed_query(query)
+        with stage("vector_search"):
+            return snapshot.search([vector], self.k)[0]
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        snapshot = self._snapshot()
+        with stage("embed_query"):
+            vector = await self.embeddings.aembed_query(query)
+        loop = asyncio.get_running_loop()
+        with stage("vector_search"):
+            results = await loop.run_in_executor(None, snapshot.search, [vector], self.k)
+        return results[0]
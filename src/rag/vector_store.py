@@ -1,24 +1,151 @@
-from langchain_openai import OpenAIEmbeddings
+import asyncio
+import itertools
+import os
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from typing import Iterable, Iterator, List, Tuple
 from langchain_core.documents import Document
 from src.config.settings import config
-import os
+from src.rag.embedding_cache import CachedEmbeddings
+from src.rag.embedding_scheduler import EmbeddingScheduler
+from src.rag.query_cache import QueryEmbeddingCache
+from src.rag.document_registry import DocumentRegistry, chunk_hash, chunk_key
+from src.rag.index_factory import build_index, describe_index, remove_positions, tune_index
+from src.rag.lexical_index import documents_in_order
+from src.rag.mapped_store import MappedStore, is_mapped_store, write_store
+from src.rag.segment_store import SegmentStore
+from src.rag.store_handle import SnapshotRetriever, get_store_handle
+from src.rag.hybrid_retriever import HybridRetriever, reciprocal_rank_fusion
+from src.rag.local_embeddings import get_local_embeddings
+from src.utils.metrics import stage
+from src.utils.text_similarity import jaccard, shingles
+from src.utils.tokens import tiktoken_counter
+import threading
+import uuid
 
-class RAGPipeline:
-    def __init__(self):
-        self.embeddings = OpenAIEmbeddings(
+# Index paths with a compaction thread in flight (one per index per process)
+_compacting = set()
+_compaction_lock = threading.Lock()
+
+# Serializes writes that the live snapshot must follow, per index path: document
+# updates (each reads and updates the registry), segment appends and the swap
+# to a compacted base
+_update_locks = {}
+_update_locks_lock = threading.Lock()
+
+def _update_lock(path: str) -> threading.Lock:
+    with _update_locks_lock:
+        return _update_locks.setdefault(path, threading.Lock())
+
+class LegacyIndexError(RuntimeError):
+    """The index on disk is in the old pickle format, which is no longer loaded."""
+
+NEAR_DUPLICATE_CANDIDATES = 3  # Nearest indexed chunks compared by text for each new chunk
+
+def local_pipeline() -> "RAGPipeline":
+    """
+    Pipeline over the offline index: same chunks, embedded on the CPU by
+    config.LOCAL_EMBEDDING_BACKEND. Searching it makes no network calls.
+    """
+    return RAGPipeline(
+        embeddings=get_local_embeddings(config.LOCAL_EMBEDDING_BACKEND),
+        index_name="local_index",
+        index_type="flat",
+        with_local_index=False,
+    )
+
+def embedding_scheduler(count_tokens=None) -> EmbeddingScheduler:
+    """
+    Scheduler for provider embedding requests, sized by the EMBEDDING_*
+    settings. Tokens are counted with the model's tiktoken encoding unless
+    `count_tokens` is given.
+    """
+    return EmbeddingScheduler(
+        max_batch_size=config.EMBEDDING_BATCH_SIZE,
+        max_batch_tokens=config.EMBEDDING_BATCH_TOKENS,
+        max_concurrency=config.EMBEDDING_MAX_CONCURRENCY,
+        requests_per_minute=config.EMBEDDING_REQUESTS_PER_MINUTE,
+        tokens_per_minute=config.EMBEDDING_TOKENS_PER_MINUTE,
+        max_retries=config.EMBEDDING_MAX_RETRIES,
+        backoff_base=config.EMBEDDING_RETRY_BASE_SECONDS,
+        backoff_max=config.EMBEDDING_RETRY_MAX_SECONDS,
+        query_share=config.EMBEDDING_QUERY_BUDGET_SHARE,
+        count_tokens=count_tokens or tiktoken_counter(config.EMBEDDING_MODEL),
+    )
+
+def provider_embeddings(http_client=None, http_async_client=None) -> CachedEmbeddings:
+    """
+    Provider embeddings wrapped in the on-disk chunk cache and the in-memory
+    query cache. Pass httpx clients to reuse pooled connections (see
+    src.rag.resources); otherwise the OpenAI SDK creates its own.
+    """
+    from langchain_openai import OpenAIEmbeddings  # Offline-only processes never load the SDK
+
+    return CachedEmbeddings(
+        OpenAIEmbeddings(
             model=config.EMBEDDING_MODEL,
-            openai_api_key=config.OPENAI_API_KEY
-        )
+            openai_api_key=config.OPENAI_API_KEY,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            chunk_size=config.EMBEDDING_BATCH_SIZE,  # One scheduler batch is one request
+            max_retries=0,  # The scheduler retries every call (documents and queries), within the rate budget
+        ),
+        model_name=config.EMBEDDING_MODEL,
+        cache_dir=config.EMBEDDING_CACHE_DIR,
+        batch_size=config.EMBEDDING_BATCH_SIZE,
+        scheduler=embedding_scheduler(),
+        query_retries=config.EMBEDDING_QUERY_MAX_RETRIES,
+        query_max_wait=config.EMBEDDING_QUERY_MAX_WAIT_SECONDS,
+        query_cache=QueryEmbeddingCache(
+            max_size=config.QUERY_CACHE_SIZE,
+            ttl_seconds=config.QUERY_CACHE_TTL_SECONDS,
+        ),
+    )
+
+class RAGPipeline:
+    def __init__(self, embeddings=None, index_name: str = "faiss_index", index_type: str = None,
+                 with_local_index: bool = True):
+        """
+        With the defaults this is the main index, embedded by the provider.
+        Application code should use src.rag.resources.get_rag_pipeline(),
+        which shares one pipeline (and embedding client) per process.
+        Passing `embeddings` and `index_name` gives a separate index over the
+        same chunks (see local_pipeline()). When config.LOCAL_INDEX_ENABLED,
+        the main pipeline mirrors every create/add into the local index.
+        """
+        # Chunks are embedded once per (model, text): re-ingesting unchanged
+        # content is served from the on-disk cache.
+        self.embeddings = embeddings or provider_embeddings()
+        self._index_type = index_type  # None: config.VECTOR_INDEX_TYPE
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             add_start_index=True,
         )
-        self.vector_store_path = str(config.EMBEDDINGS_DIR / "faiss_index")
+        self.vector_store_path = str(config.EMBEDDINGS_DIR / index_name)
+        self.segments = SegmentStore(self.vector_store_path)
+        self.registry_path = os.path.join(self.vector_store_path, DocumentRegistry.FILENAME)
+        # Shared by every RAGPipeline in this process that uses the same index
+        self.handle = get_store_handle(self.vector_store_path, max_deltas=config.INDEX_COMPACTION_SEGMENTS)
         self.vector_store = None
+        self.local = local_pipeline() if with_local_index and config.LOCAL_INDEX_ENABLED else None
+
+    @property
+    def index_type(self) -> str:
+        return self._index_type or config.VECTOR_INDEX_TYPE
+
+    def _mirror(self, method: str, *args):
+        """Applies an index change to the local index too; its failures never fail the main ingest."""
+        if self.local is None:
+            return
+        try:
+            getattr(self.local, method)(*args)
+        except Exception as e:
+            print(f"Local index update failed: {e}")
 
     def create_index(self, documents: List[Document]):
         """Creates and saves the vector store index."""
@@ -30,55 +157,483 @@ class RAGPipeline:
         splits = self.text_splitter.split_documents(documents)
         
         print(f"Creating vector store with {len(splits)} chunks...")
-        self.vector_store = FAISS.from_documents(documents=splits, embedding=self.embeddings)
+        self.vector_store = self._from_documents(splits)
         
         print("Saving vector store...")
-        self.vector_store.save_local(self.vector_store_path)
-        print("Index saved successfully.")
+        self.vector_store = self._save_base(self.vector_store)
+        self.handle.publish(self.vector_store)
+        for path in (self.registry_path, os.path.join(self.vector_store_path, DocumentRegistry.LEGACY_FILENAME)):
+            if os.path.exists(path):
+                os.remove(path)  # Files are unknown here; uploads still skip near-duplicate chunks
+        print(f"Index saved successfully. Embedding cache: {self.embeddings.stats()}")
+        self._mirror("create_index", documents)
+
+    def _from_documents(self, splits: List[Document]):
+        """Builds a vector store using the index type from config.VECTOR_INDEX_TYPE."""
+        if self.index_type == "flat":
+            return FAISS.from_documents(documents=splits, embedding=self.embeddings)
 
-    def add_documents(self, documents: List[Document]):
-        """Add new documents to existing index (incremental update)."""
+        texts = [doc.page_content for doc in splits]
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        vector_store = self._empty_store(vectors)
+        vector_store.add_embeddings(zip(texts, vectors), metadatas=[doc.metadata for doc in splits])
+        return vector_store
+
+    def _empty_store(self, sample: np.ndarray, n_total: int = None):
+        """Empty store with a config.VECTOR_INDEX_TYPE index, trained on `sample` if needed."""
+        return FAISS(self.embeddings, self._empty_index(sample, n_total), InMemoryDocstore(), {})
+
+    def _empty_index(self, sample: np.ndarray, n_total: int = None):
+        """Bare config.VECTOR_INDEX_TYPE FAISS index, trained on `sample` if needed."""
+        index = build_index(
+            sample,
+            index_type=self.index_type,
+            nlist=config.INDEX_NLIST,
+            pq_m=config.INDEX_PQ_M,
+            pq_nbits=config.INDEX_PQ_NBITS,
+            hnsw_m=config.INDEX_HNSW_M,
+            ef_construction=config.INDEX_HNSW_EF_CONSTRUCTION,
+            train_sample_size=config.INDEX_TRAIN_SAMPLE_SIZE,
+            n_total=n_total,
+        )
+        tune_index(index, nprobe=config.INDEX_NPROBE, ef_search=config.INDEX_HNSW_EF_SEARCH)
+        print(f"Using {describe_index(index)} index.")
+        return index
+
+    def iter_splits(self, pages: Iterable[Document]) -> Iterator[Tuple[Document, tuple]]:
+        """
+        Splits a stream of pages one page at a time. Yields (chunk, position)
+        where position is (filename, page, chunk number in page, last in page).
+        """
+        for page in pages:
+            chunks = self.text_splitter.split_documents([page])
+            filename = os.path.basename(page.metadata.get("source", ""))
+            for i, chunk in enumerate(chunks):
+                yield chunk, (filename, page.metadata.get("page", 0), i, i == len(chunks) - 1)
+
+    def create_index_from_segments(self, staging: SegmentStore, reembed: bool = False,
+                                   registry: DocumentRegistry = None) -> bool:
+        """
+        Builds the index from segments staged by a streaming ingest and saves
+        it as the new base. Segments' vectors are added to a bare FAISS index
+        one segment at a time, and their records are then streamed from the
+        staged docs.jsonl files into the base's, so only the index itself
+        (plus one segment) is held in memory, never the texts. With reembed=True
+        the staged texts are embedded again by this pipeline's embeddings
+        (used by the local index, which only supports flat indexes here).
+        `registry` describes the staged files and replaces this index's registry.
+        """
+        names = staging.read_manifest()["segments"]
+        if not names:
+            return False
+
+        index = None
+        if not reembed:
+            sample, total = staging.sample_vectors(names, config.INDEX_TRAIN_SAMPLE_SIZE)
+            print(f"Building index from {total} staged chunks in {len(names)} segments...")
+            index = self._empty_index(sample, n_total=total)
+        for texts, vectors, _, _ in staging.iter_segments(names):
+            if reembed:
+                vectors = self.embed_texts(texts)
+                if index is None:
+                    index = self._empty_index(vectors)
+            index.add(np.asarray(vectors, dtype=np.float32))
+
+        self.vector_store = self._write_base(index, staging.iter_documents(names))
+        self.handle.publish(self.vector_store)
+        if registry is not None:
+            registry.save_as(self.registry_path)
+        print(f"Index saved successfully. Embedding cache: {self.embeddings.stats()}")
+        self._mirror("create_index_from_segments", staging, True, registry)
+        return True
+
+    def _save_base(self, vector_store) -> MappedStore:
+        """
+        Writes a full index as the new base, replacing the base and all segments.
+        Returns the saved base, memory-mapped, to serve instead of the in-memory store.
+        """
+        return self._write_base(vector_store.index, documents_in_order([vector_store]))
+
+    def _write_base(self, index, documents: Iterable[Document]) -> MappedStore:
+        """_save_base() for a bare index and its documents in index order (consumed as a stream)."""
+        name, path = self.segments.reserve_base()
+        with stage("index_save"):
+            write_store(path, index, documents)
+        self.segments.commit_base(name)
+        return self._open_base(path)
+
+    def _open_base(self, path: str) -> MappedStore:
+        store = MappedStore(path, self.embeddings, mmap_enabled=config.INDEX_MMAP)
+        # Query-time parameters are not part of the index structure
+        tune_index(store.index, nprobe=config.INDEX_NPROBE, ef_search=config.INDEX_HNSW_EF_SEARCH)
+        return store
+
+    def embed_texts(self, texts: List[str], progress=None) -> np.ndarray:
+        """Embeds chunks batch by batch so callers can report progress."""
+        batch_size = config.EMBEDDING_BATCH_SIZE
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            with stage("embed_documents"):
+                batches.append(np.asarray(self.embeddings.embed_documents(texts[start:start + batch_size]), dtype=np.float32))
+            if progress:
+                progress("embedding", chunks_embedded=min(start + batch_size, len(texts)), chunks_total=len(texts))
+        return np.vstack(batches)
+
+    def add_documents(self, documents: List[Document], progress=None):
+        """
+        Add new documents to existing index (incremental update).
+        Only the new chunks are written to disk, as one append-only segment.
+        `progress`, if given, is called as progress(stage, **counters).
+        """
         if not documents:
             print("No documents to add.")
             return False
+        self._require_loadable_base()
 
         print("Splitting new documents...")
+        if progress:
+            progress("splitting")
         splits = self.text_splitter.split_documents(documents)
+        texts = [doc.page_content for doc in splits]
+        metadatas = [doc.metadata for doc in splits]
+        if progress:
+            progress("embedding", chunks_embedded=0, chunks_total=len(splits))
         
-        # Load existing index
-        if not self.vector_store:
-            loaded = self.load_index()
-            if not loaded:
-                # No existing index, create new one
-                print("No existing index, creating new...")
-                self.vector_store = FAISS.from_documents(documents=splits, embedding=self.embeddings)
-            else:
-                print(f"Adding {len(splits)} new chunks to existing index...")
-                self.vector_store.add_documents(splits)
-        else:
-            print(f"Adding {len(splits)} new chunks to existing index...")
-            self.vector_store.add_documents(splits)
-        
-        print("Saving updated index...")
-        self.vector_store.save_local(self.vector_store_path)
-        print("Index updated successfully.")
+        if self.handle.snapshot() is None and self.segments.base_path() is None:
+            # No existing index, create new one (embeddings come from the cache)
+            print("No existing index, creating new...")
+            self.embed_texts(texts, progress)
+            if progress:
+                progress("committing")
+            self.vector_store = self._save_base(self._from_documents(splits))
+            self.handle.publish(self.vector_store)
+            print(f"Index created successfully. Embedding cache: {self.embeddings.stats()}")
+            self._mirror("add_documents", documents)
+            return True
+
+        print(f"Adding {len(splits)} new chunks to existing index...")
+        ids = [str(uuid.uuid4()) for _ in splits]
+        vectors = self.embed_texts(texts, progress)
+
+        # The index on disk does not need to be loaded to append a segment
+        print("Saving new index segment...")
+        if progress:
+            progress("committing")
+        with _update_lock(self.vector_store_path):
+            segment = self.segments.append_segment(texts, vectors, metadatas, ids)
+
+            # If the index is live in this process, publish the new chunks as a
+            # small delta store. Readers switch over atomically; nothing is reloaded.
+            if self.handle.append(self._delta_store(texts, vectors, metadatas, ids)):
+                print("Live index updated in place.")
+        print(f"Index updated successfully ({segment}). Embedding cache: {self.embeddings.stats()}")
+
+        if self.segments.segment_count() >= config.INDEX_COMPACTION_SEGMENTS:
+            self.compact_in_background()
+        self._mirror("add_documents", documents)
         return True
 
-    def load_index(self):
-        """Loads the existing vector store index."""
-        if os.path.exists(self.vector_store_path):
-            self.vector_store = FAISS.load_local(
-                self.vector_store_path, 
-                self.embeddings, 
-                allow_dangerous_deserialization=True # Local file safe
-            )
+    def _delta_store(self, texts, vectors, metadatas, ids):
+        store = FAISS(self.embeddings, faiss.IndexFlatL2(vectors.shape[1]), InMemoryDocstore(), {})
+        store.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+        return store
+
+    def update_document(self, documents: List[Document], content_hash: str, progress=None) -> dict:
+        """
+        Adds the pages of one file, or replaces an earlier version of it,
+        keeping the document registry (see DocumentRegistry) in step:
+          - a file whose content is already indexed, under any name, is a no-op;
+          - chunks unchanged since the previous version keep their vectors;
+          - chunks that duplicate an indexed chunk, exactly or nearly (see
+            _near_duplicates), are recorded against it instead of added;
+          - chunks of the previous version that are gone are deleted.
+        Returns what was done; `progress` is called as in add_documents().
+        """
+        name = os.path.basename(documents[0].metadata.get("source", "")) if documents else ""
+        self._require_loadable_base()
+        with _update_lock(self.vector_store_path), DocumentRegistry(self.registry_path) as registry:
+            same = registry.file_with_content(content_hash)
+            if same is not None:
+                print(f"{name} has the same content as the indexed {same}; nothing to do.")
+                return {"status": "unchanged", "same_as": same}
+
+            if progress:
+                progress("splitting")
+            splits = self.text_splitter.split_documents(documents)
+            if not splits:
+                print("No text to index.")
+                return {"status": "empty"}
+
+            previous = registry.file_chunks(name)
+            indexed = {}  # Chunk hash -> id, looked up in the registry once per hash
+            chunks, new, duplicates = {}, [], 0
+            for doc in splits:
+                text_hash = chunk_hash(doc.page_content)
+                key = chunk_key(text_hash, doc.metadata.get("page"), doc.metadata.get("start_index"))
+                if key in previous:
+                    chunks[key] = previous[key]
+                    continue
+                if text_hash not in indexed:
+                    indexed[text_hash] = registry.chunk_id_for(text_hash, exclude=name)
+                if indexed[text_hash] is not None:
+                    chunks[key] = indexed[text_hash]
+                    duplicates += 1
+                else:
+                    chunks[key] = indexed[text_hash] = str(uuid.uuid4())
+                    new.append((key, doc))
+            kept = len(chunks) - len(new) - duplicates
+            replaced = set(previous.values()) - set(chunks.values())
+
+            if progress:
+                progress("embedding", chunks_embedded=0, chunks_total=len(new))
+            texts = [doc.page_content for _, doc in new]
+            vectors = self.embed_texts(texts, progress) if new else None
+            if new:
+                matches = self._near_duplicates(texts, vectors, ignore=replaced)
+                for (key, _), match in zip(new, matches):
+                    if match is not None:
+                        chunks[key] = match
+                unique = [i for i, match in enumerate(matches) if match is None]
+                duplicates += len(new) - len(unique)
+                new, vectors = [new[i] for i in unique], vectors[unique]
+            deleted = replaced - set(chunks.values())
+            deleted -= registry.still_referenced(deleted, exclude=name)
+
+            if progress:
+                progress("committing")
+            if new:
+                ids = [chunks[key] for key, _ in new]
+                self._add_chunks([doc.page_content for _, doc in new], vectors, [doc.metadata for _, doc in new], ids)
+            if deleted:
+                self.segments.delete_chunks(sorted(deleted))
+                self.handle.update(deleted=deleted)
+            registry.set_file(name, content_hash, chunks)
+            registry.save()
+
+        result = {
+            "status": "updated" if previous else "added",
+            "chunks_added": len(new),
+            "chunks_kept": kept,
+            "chunks_deleted": len(deleted),
+            "duplicates_skipped": duplicates,
+        }
+        print(f"Indexed {name}: {result}. Embedding cache: {self.embeddings.stats()}")
+        if self._needs_compaction():
+            self.compact_in_background()
+        self._mirror("update_document", documents, content_hash)
+        return result
+
+    def _add_chunks(self, texts, vectors, metadatas, ids):
+        """Writes chunks as a segment (or the first base) and publishes them to the live index."""
+        if self.handle.snapshot() is None and self.segments.base_path() is None:
+            store = self._empty_store(vectors)
+            store.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+            self.vector_store = self._save_base(store)
+            self.handle.publish(self.vector_store)
+            return
+        self.segments.append_segment(texts, vectors, metadatas, ids)
+        self.handle.append(self._delta_store(texts, vectors, metadatas, ids))
+
+    def _near_duplicates(self, texts: List[str], vectors: np.ndarray, ignore=frozenset()) -> List[str]:
+        """
+        For each chunk, the id of an indexed chunk with nearly the same text
+        (word 3-gram Jaccard >= config.INGEST_NEAR_DUPLICATE_THRESHOLD, the
+        measure the context packer dedupes with), or None. Only the chunk's
+        nearest neighbours in the index are compared; `ignore` are ids that
+        are about to be deleted.
+        """
+        threshold = config.INGEST_NEAR_DUPLICATE_THRESHOLD
+        if threshold > 1 or (self.handle.snapshot() is None and not self.load_index()):
+            return [None] * len(texts)
+        neighbours = self.handle.snapshot().search(vectors, NEAR_DUPLICATE_CANDIDATES)
+        matches = []
+        for text, candidates in zip(texts, neighbours):
+            text_shingles = shingles(text)
+            matches.append(next((
+                doc.id for doc in candidates
+                if doc.id not in ignore and jaccard(text_shingles, shingles(doc.page_content)) >= threshold
+            ), None))
+        return matches
+
+    def warm_up(self, embed_query: bool = False):
+        """
+        Does up front what the first query would otherwise pay for: one search
+        pages the index in and the keyword index is built, for the local index
+        too. With embed_query the provider is called once, which also checks
+        credentials and connectivity.
+        """
+        snapshot = self.handle.snapshot()
+        if snapshot is not None:
+            snapshot.search(np.zeros((1, snapshot.base.index.d), dtype=np.float32), 1)
+            self.handle.lexical_index(snapshot)
+        if self.local is not None and self.local.load_index():
+            self.local.warm_up()
+        if embed_query:
+            self.embeddings.embed_query("warm-up")
+
+    def load_index(self, from_disk: bool = False):
+        """
+        Loads the existing vector store index (base plus any appended segments).
+        If another component in this process already loaded it, the live
+        snapshot is reused unless from_disk=True.
+        The base is memory-mapped and its chunks are read on demand, so
+        loading is near instant and server workers share the pages. Appended
+        segments are small and are loaded into memory as delta stores.
+        """
+        snapshot = self.handle.snapshot()
+        if snapshot is not None and not from_disk:
+            self.vector_store = snapshot.base
             return True
-        return False
 
-    def get_retriever(self, k=8):
-        if not self.vector_store:
+        base_path = self.segments.base_path()
+        if base_path is None:
+            return False
+
+        self._require_loadable_base()
+        manifest = self.segments.read_manifest()
+        with stage("index_load"):
+            self.vector_store = self._open_base(base_path)
+            deltas = [self._delta_store(*segment) for segment in self.segments.iter_segments(manifest["segments"])]
+        self.handle.publish(self.vector_store, deltas, manifest.get("deleted", []))
+        return True
+
+    def _require_loadable_base(self):
+        """
+        Raises LegacyIndexError if the base on disk cannot be opened. Pickled
+        indexes are never unpickled (a tampered file could run code), and
+        nothing may be written on top of them: segments over a base that
+        cannot load would be accepted but never served.
+        """
+        base_path = self.segments.base_path()
+        if base_path is not None and not is_mapped_store(base_path):
+            raise LegacyIndexError(
+                f"The index at {base_path} uses the old pickle format, which is no longer loaded. "
+                "Rebuild it from the PDFs with `python src/ingest.py`."
+            )
+
+    def compact(self) -> bool:
+        """Merges the base and all current segments into a new base."""
+        manifest = self.segments.read_manifest()
+        deleted = set(manifest.get("deleted", []))
+        if manifest["base"] is None or not (manifest["segments"] or deleted) or not is_mapped_store(self.segments.base_path()):
+            return False
+
+        print(f"Compacting {len(manifest['segments'])} index segments ({len(deleted)} deleted chunks)...")
+        with stage("index_compact"):
+            base = MappedStore(self.segments.base_path(), self.embeddings)
+            index = base.writable_index()  # The mapped one is read-only
+            if deleted:
+                index = remove_positions(index, [i for i, doc in enumerate(base.docstore) if doc.id in deleted])
+            segment_docs = []
+            for texts, vectors, metadatas, ids in self.segments.iter_segments(manifest["segments"]):
+                rows = [i for i, doc_id in enumerate(ids) if doc_id not in deleted]
+                index.add(np.asarray(vectors, dtype=np.float32)[rows])
+                segment_docs.extend(Document(id=ids[i], page_content=texts[i], metadata=metadatas[i]) for i in rows)
+            name, path = self.segments.reserve_base()
+            # Base chunks are streamed from disk, not loaded
+            base_docs = (doc for doc in base.docstore if doc.id not in deleted)
+            write_store(path, index, itertools.chain(base_docs, segment_docs))
+        committed = self.segments.commit_base(
+            name, merged_segments=manifest["segments"], expected_base=manifest["base"], removed_ids=sorted(deleted)
+        )
+        print("Compaction complete." if committed else "Index was rebuilt during compaction; discarded.")
+        if committed and self.handle.snapshot() is not None:
+            self._publish_compacted()
+        return committed
+
+    def _publish_compacted(self):
+        """
+        Serves the new base in place of the delta stores and deleted ids it
+        absorbed. Segments and deletions committed after the compaction
+        started are still in the manifest and stay as deltas.
+        """
+        had_lexical = self.handle.has_lexical_index()
+        with _update_lock(self.vector_store_path):
+            self.load_index(from_disk=True)
+        if had_lexical:
+            # Rebuilt here rather than by the next keyword search
+            self.handle.lexical_index(self.handle.snapshot())
+
+    def _needs_compaction(self) -> bool:
+        """Too many segments, or deleted chunks make up too much of the index."""
+        manifest = self.segments.read_manifest()
+        snapshot = self.handle.snapshot()
+        deleted = len(manifest.get("deleted", []))
+        return (
+            len(manifest["segments"]) >= config.INDEX_COMPACTION_SEGMENTS
+            or (snapshot is not None and deleted > config.INDEX_COMPACTION_DELETED_FRACTION * snapshot.ntotal)
+        )
+
+    def compact_in_background(self):
+        """Starts compaction on a daemon thread unless one is already running for this index."""
+        with _compaction_lock:
+            if self.vector_store_path in _compacting:
+                return None
+            _compacting.add(self.vector_store_path)
+
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Index compaction failed: {e}")
+            finally:
+                with _compaction_lock:
+                    _compacting.discard(self.vector_store_path)
+
+        thread = threading.Thread(target=run, name="index-compaction", daemon=True)
+        thread.start()
+        return thread
+
+    def get_retriever(self, k=8, mode: str = None):
+        """
+        Retriever that always searches the current live snapshot of the index.
+        mode (default config.RETRIEVAL_MODE): vector | hybrid (BM25 + vector,
+        fused by rank) | keyword (BM25 only, no embedding calls).
+        """
+        self._ensure_loaded()
+        mode = mode or config.RETRIEVAL_MODE
+        if mode == "vector":
+            return SnapshotRetriever(handle=self.handle, embeddings=self.embeddings, k=k)
+        return HybridRetriever(handle=self.handle, embeddings=self.embeddings, k=k, mode=mode)
+
+    def _ensure_loaded(self):
+        if self.handle.snapshot() is None:
             loaded = self.load_index()
             if not loaded:
                 raise ValueError("Index not found. Please run ingestion first.")
-        
-        return self.vector_store.as_retriever(search_kwargs={"k": k})
+
+    def search_by_vectors(self, vectors, k=8) -> List[List[Document]]:
+        """Top-k documents for each query vector, using one multi-row search of the live snapshot."""
+        self._ensure_loaded()
+        return self.handle.snapshot().search(vectors, k)
+
+    def search_many(self, queries: List[str], k=8) -> List[List[Document]]:
+        """Embeds all queries in one batched call and searches them together."""
+        self._ensure_loaded()
+        with stage("embed_query"):
+            vectors = self.embeddings.embed_queries(queries)
+        with stage("vector_search"):
+            return self.search_by_vectors(vectors, k=k)
+
+    def keyword_search_many(self, queries: List[str], k=8) -> List[List[Document]]:
+        """BM25 search for each query. Runs locally: no embedding calls."""
+        self._ensure_loaded()
+        snapshot = self.handle.snapshot()
+        with stage("keyword_search"):
+            lexical = self.handle.lexical_index(snapshot)
+            return [snapshot.keyword_search(lexical, q, k) for q in queries]
+
+    def hybrid_search_many(self, queries: List[str], k=8) -> List[List[Document]]:
+        """Vector and BM25 results per query, fused by reciprocal rank."""
+        vector_results = self.search_many(queries, k=k)
+        keyword_results = self.keyword_search_many(queries, k=k)
+        return [reciprocal_rank_fusion([v, kw], k) for v, kw in zip(vector_results, keyword_results)]
+
+    async def asearch_many(self, queries: List[str], k=8) -> List[List[Document]]:
+        """Async version of search_many(); the index search runs off the event loop."""
+        self._ensure_loaded()
+        with stage("embed_query"):
+            vectors = await self.embeddings.aembed_queries(queries)
+        loop = asyncio.get_running_loop()
+        with stage("vector_search"):
+            return await loop.run_in_executor(None, self.search_by_vectors, vectors, k)
@@ -0,0 +1,9 @@
+import re
+
+def shingles(text: str, size: int = 3) -> set:
+    """Word `size`-grams of the lowercased text."""
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
@@ -0,0 +1,32 @@
+from typing import Callable
+
+def approximate_tokens(text: str) -> int:
+    """~4 characters per token; used when no tiktoken encoding is available."""
+    return (len(text) + 3) // 4
+
+def _load_encoding_counter(model_name: str) -> Callable[[str], int]:
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        print(f"tiktoken encoding unavailable ({type(e).__name__}); estimating token counts.")
+        return approximate_tokens
+
+def tiktoken_counter(model_name: str) -> Callable[[str], int]:
+    """
+    Token counter for `model_name`. The encoding is loaded on first use:
+    tiktoken downloads it the first time, so without network access (or
+    without tiktoken) this falls back to an estimate.
+    """
+    loaded = []
+
+    def count(text: str) -> int:
+        if not loaded:
+            loaded.append(_load_encoding_counter(model_name))
+        return loaded[0](text)
+    return count
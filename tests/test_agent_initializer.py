@@ -0,0 +1,63 @@
+
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+from src.api.agent_initializer import AgentInitializer
+
+class TestAgentInitializer(unittest.IsolatedAsyncioTestCase):
+    async def test_retries_failed_builds_with_backoff(self):
+        agent = object()
+        build = MagicMock(side_effect=[ValueError("Index not found"), ConnectionError("down"), agent])
+        on_ready = MagicMock()
+        initializer = AgentInitializer(build, on_ready, base_delay=0.01, max_delay=0.02)
+
+        # Act
+        result = await initializer.run()
+
+        # Assert
+        self.assertIs(result, agent)
+        self.assertEqual(build.call_count, 3)
+        on_ready.assert_called_once_with(agent)
+        self.assertTrue(initializer.ready)
+        self.assertEqual(initializer.stats()["attempts"], 3)
+        self.assertIsNone(initializer.stats()["error"])
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        initializer = AgentInitializer(MagicMock(), MagicMock(), base_delay=1.0, max_delay=4.0)
+        delays = []
+        for attempts in range(1, 6):
+            initializer.attempts = attempts
+            delays.append(initializer.next_delay())
+
+        for delay, cap in zip(delays, [1, 2, 4, 4, 4]):
+            self.assertGreaterEqual(delay, cap / 2)
+            self.assertLessEqual(delay, cap)
+
+    async def test_wake_skips_the_backoff_wait(self):
+        agent = object()
+        build = MagicMock(side_effect=[ValueError("Index not found"), agent])
+        initializer = AgentInitializer(build, MagicMock(), base_delay=60, max_delay=60)
+
+        task = asyncio.create_task(initializer.run())
+        while initializer.state != "retrying":
+            await asyncio.sleep(0.01)
+
+        # Act
+        initializer.wake()
+        result = await asyncio.wait_for(task, timeout=2)
+
+        # Assert
+        self.assertIs(result, agent)
+
+    async def test_warm_up_failure_does_not_block_readiness(self):
+        on_ready = MagicMock()
+        initializer = AgentInitializer(MagicMock(return_value="agent"), on_ready,
+                                       warm_up=MagicMock(side_effect=RuntimeError("no network")))
+
+        await initializer.run()
+
+        on_ready.assert_called_once_with("agent")
+        self.assertEqual(initializer.state, "ready")
+
+if __name__ == "__main__":
+    unittest.main()
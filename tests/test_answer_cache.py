@@ -0,0 +1,60 @@
+
+import unittest
+from langchain_core.documents import Document
+from src.agent.answer_cache import SemanticAnswerCache, chunk_ids, is_history_independent
+
+class TestSemanticAnswerCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = SemanticAnswerCache(max_size=2, threshold=0.9)
+        self.chunks = frozenset({"a", "b"})
+
+    def test_similar_question_same_chunks_hits(self):
+        self.cache.put([1.0, 0.0], self.chunks, 1, "answer")
+
+        # Act
+        hit = self.cache.get([0.99, 0.05], self.chunks, 1)
+        miss = self.cache.get([0.5, 0.5], self.chunks, 1)
+
+        # Assert
+        self.assertEqual(hit, "answer")
+        self.assertIsNone(miss)
+        self.assertEqual(self.cache.stats()["hit_rate"], 0.5)
+
+    def test_different_chunks_miss(self):
+        self.cache.put([1.0, 0.0], self.chunks, 1, "answer")
+
+        self.assertIsNone(self.cache.get([1.0, 0.0], frozenset({"a", "c"}), 1))
+
+    def test_new_generation_clears(self):
+        self.cache.put([1.0, 0.0], self.chunks, 1, "answer")
+
+        self.assertIsNone(self.cache.get([1.0, 0.0], self.chunks, 2))
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+    def test_lru_eviction(self):
+        self.cache.put([1.0, 0.0], frozenset({"1"}), 1, "one")
+        self.cache.put([1.0, 0.0], frozenset({"2"}), 1, "two")
+        self.cache.get([1.0, 0.0], frozenset({"1"}), 1)  # "two" is now least recently used
+
+        # Act
+        self.cache.put([1.0, 0.0], frozenset({"3"}), 1, "three")
+
+        # Assert
+        self.assertEqual(self.cache.get([1.0, 0.0], frozenset({"1"}), 1), "one")
+        self.assertIsNone(self.cache.get([1.0, 0.0], frozenset({"2"}), 1))
+
+    def test_chunk_ids_fall_back_to_content_hash(self):
+        docs = [Document(page_content="x", id="id-1"), Document(page_content="y")]
+
+        ids = chunk_ids(docs)
+
+        self.assertIn("id-1", ids)
+        self.assertEqual(len(ids), 2)
+
+    def test_history_independence(self):
+        self.assertTrue(is_history_independent("What are the types of machine learning?"))
+        self.assertFalse(is_history_independent("Can you explain it in more detail?"))
+
+if __name__ == "__main__":
+    unittest.main()
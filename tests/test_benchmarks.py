@@ -0,0 +1,54 @@
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from benchmarks.end_to_end import compare
+from benchmarks.fakes import FakeEmbeddings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestBenchmarkFakes(unittest.TestCase):
+    def test_fake_embeddings_are_deterministic_and_similar_for_shared_words(self):
+        embeddings = FakeEmbeddings(dim=64)
+
+        a, b, c = embeddings.embed_documents(["neural networks learn", "neural networks learn fast", "cooking pasta"])
+
+        self.assertEqual(a, FakeEmbeddings(dim=64).embed_query("neural networks learn"))
+        dot = lambda x, y: sum(p * q for p, q in zip(x, y))
+        self.assertGreater(dot(a, b), dot(a, c))
+
+class TestEndToEndBenchmark(unittest.TestCase):
+    def test_small_run_writes_json_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.json")
+
+            # Act
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.end_to_end", "--pages", "4", "--dim", "32",
+                 "--queries", "3", "--requests", "4", "--concurrency", "2", "--json", path],
+                cwd=ROOT, capture_output=True, text=True, check=True,
+            )
+            with open(path) as f:
+                report = json.load(f)
+
+        # Assert
+        result = report["results"][0]
+        self.assertEqual(result["pages"], 4)
+        self.assertGreater(result["ingest"]["chunks"], 0)
+        self.assertEqual(set(result["retrieval"]), {"vector", "hybrid", "keyword"})
+        self.assertEqual(result["chat"]["requests"], 4)
+        self.assertGreater(result["peak_rss_mb"]["self"], 0)
+
+    def test_compare_reports_relative_change(self):
+        baseline = {"results": [{"pages": 10, "chat": {"p50_ms": 100.0}}]}
+
+        report = compare([{"pages": 10, "chat": {"p50_ms": 80.0}}], baseline)
+
+        self.assertIn("chat.p50_ms", report)
+        self.assertIn("-20.0%", report)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+
+import unittest
+from unittest.mock import patch
+from src.api.circuit_breaker import CircuitBreaker
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, retry_seconds=30)
+
+        # Act
+        breaker.record_failure()
+        still_closed = breaker.allow()
+        breaker.record_failure()
+
+        # Assert
+        self.assertTrue(still_closed)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.stats()["state"], "open")
+        self.assertEqual(breaker.stats()["short_circuited"], 1)
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+
+        breaker.record_success()
+        breaker.record_failure()
+
+        self.assertTrue(breaker.allow())
+
+    def test_single_trial_after_retry_period(self):
+        breaker = CircuitBreaker(failure_threshold=1, retry_seconds=30)
+        with patch("src.api.circuit_breaker.time.monotonic", return_value=100.0):
+            breaker.record_failure()
+
+        # Act - after the retry period exactly one request goes through
+        with patch("src.api.circuit_breaker.time.monotonic", return_value=131.0):
+            trial = breaker.allow()
+            second = breaker.allow()
+            breaker.record_success()
+
+        # Assert
+        self.assertTrue(trial)
+        self.assertFalse(second)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.stats()["trips"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
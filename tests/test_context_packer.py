@@ -0,0 +1,86 @@
+
+import unittest
+from langchain_core.documents import Document
+from src.agent.context_packer import ContextPacker, approximate_tokens
+from src.agent.tutor import format_docs
+
+TEXT = "Gradient descent updates the weights in the direction that reduces the loss. "
+
+def chunk(text, source="ml.pdf", page=1, start=None):
+    metadata = {"source": source, "page": page}
+    if start is not None:
+        metadata["start_index"] = start
+    return Document(page_content=text, metadata=metadata)
+
+class TestContextPacker(unittest.TestCase):
+    def test_merges_overlapping_chunks_from_same_page(self):
+        page = "abcdefghijklmnopqrstuvwxyz"
+        packer = ContextPacker(format_docs, max_tokens=1000)
+
+        # Act
+        packed = packer.pack([chunk(page[10:20], start=10), chunk(page[0:14], start=0), chunk(page[20:], start=20)])
+
+        # Assert
+        self.assertEqual(len(packed.docs), 1)
+        self.assertEqual(packed.docs[0].page_content, page)
+        self.assertEqual(packed.docs[0].metadata["start_index"], 0)
+        self.assertLess(packed.tokens, packed.original_tokens)
+
+    def test_keeps_separate_pages_and_distant_chunks_apart(self):
+        packer = ContextPacker(format_docs, max_tokens=1000)
+        docs = [
+            chunk("first part of the page", start=0),
+            chunk("much later on the page", start=500),
+            chunk("other page entirely", page=2, start=0),
+        ]
+
+        # Act
+        packed = packer.pack(docs)
+
+        # Assert
+        self.assertEqual([d.page_content for d in packed.docs], [d.page_content for d in docs])
+
+    def test_drops_near_duplicates(self):
+        packer = ContextPacker(format_docs, max_tokens=1000, dedupe_threshold=0.8)
+        docs = [chunk(TEXT * 3), chunk(TEXT * 3 + "Also", source="copy.pdf"), chunk("Overfitting means memorising noise.")]
+
+        # Act
+        packed = packer.pack(docs)
+
+        # Assert
+        self.assertEqual([d.metadata["source"] for d in packed.docs], ["ml.pdf", "ml.pdf"])
+        self.assertEqual(packed.to_dict()["passages_used"], 2)
+        self.assertEqual(packed.to_dict()["chunks_retrieved"], 3)
+
+    def test_fills_budget_in_relevance_order(self):
+        docs = [chunk(f"{i} " + TEXT, source=f"doc{i}.pdf") for i in range(5)]
+        budget = approximate_tokens(format_docs(docs[:2])) + 5
+        packer = ContextPacker(format_docs, max_tokens=budget)
+
+        # Act
+        packed = packer.pack(docs)
+
+        # Assert
+        self.assertEqual([d.metadata["source"] for d in packed.docs], ["doc0.pdf", "doc1.pdf"])
+        self.assertLessEqual(packed.tokens, budget)
+        self.assertEqual(packed.tokens_saved, packed.original_tokens - packed.tokens)
+
+    def test_truncates_when_best_passage_exceeds_budget(self):
+        packer = ContextPacker(format_docs, max_tokens=30)
+
+        # Act
+        packed = packer.pack([chunk(TEXT * 20)])
+
+        # Assert
+        self.assertEqual(len(packed.docs), 1)
+        self.assertTrue((TEXT * 20).startswith(packed.docs[0].page_content))
+        self.assertLessEqual(packed.tokens, 30)
+
+    def test_empty_input(self):
+        packed = ContextPacker(format_docs).pack([])
+
+        self.assertEqual(packed.docs, [])
+        self.assertEqual(packed.tokens_saved, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from src.rag.document_registry import DocumentRegistry, chunk_hash, chunk_key, file_hash
+
+class TestDocumentRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "index", "registry.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_chunk_hash_ignores_case_and_whitespace(self):
+        self.assertEqual(chunk_hash("Neural  networks\n"), chunk_hash("neural networks"))
+        self.assertNotEqual(chunk_hash("neural networks"), chunk_hash("neural nets"))
+
+    def test_file_hash(self):
+        path = os.path.join(self.tmp.name, "a.pdf")
+        with open(path, "wb") as f:
+            f.write(b"%PDF")
+
+        self.assertEqual(file_hash(path), hashlib.sha256(b"%PDF").hexdigest())
+
+    def test_save_and_reload(self):
+        registry = DocumentRegistry(self.path)
+        registry.add_chunk("a.pdf", "hash-a", chunk_key("h1", 0, 0), "id-1")
+
+        # Act
+        registry.save()
+        reloaded = DocumentRegistry(self.path)
+
+        # Assert
+        self.assertEqual(reloaded.file_names(), ["a.pdf"])
+        self.assertEqual(reloaded.file_chunks("a.pdf"), {"h1:0:0": "id-1"})
+        self.assertEqual(reloaded.file_with_content("hash-a"), "a.pdf")
+        self.assertIsNone(reloaded.file_with_content("hash-b"))
+
+    def test_shared_chunks(self):
+        registry = DocumentRegistry(self.path)
+        registry.set_file("a.pdf", "hash-a", {"h1:0:0": "id-1", "h2:1:0": "id-2"})
+        registry.set_file("b.pdf", "hash-b", {"h1:3:0": "id-1"})
+
+        # Assert - chunk ids of other files, by text hash
+        self.assertEqual(registry.chunk_ids_by_hash(exclude="a.pdf"), {"h1": "id-1"})
+        self.assertEqual(registry.referenced_ids(exclude="a.pdf"), {"id-1"})
+        self.assertEqual(registry.referenced_ids(), {"id-1", "id-2"})
+        self.assertEqual(registry.chunk_id_for("h1", exclude="a.pdf"), "id-1")
+        self.assertIsNone(registry.chunk_id_for("h2", exclude="a.pdf"))
+        self.assertEqual(registry.still_referenced(["id-1", "id-2", "id-3"], exclude="a.pdf"), {"id-1"})
+
+    def test_set_file_replaces_only_that_file(self):
+        registry = DocumentRegistry(self.path)
+        registry.set_file("a.pdf", "hash-a", {"h1:0:0": "id-1"})
+        registry.set_file("b.pdf", "hash-b", {"h2:0:0": "id-2"})
+
+        # Act
+        registry.set_file("a.pdf", "hash-a2", {"h3:0:0": "id-3"})
+
+        # Assert
+        self.assertEqual(registry.file_chunks("a.pdf"), {"h3:0:0": "id-3"})
+        self.assertEqual(registry.file_chunks("b.pdf"), {"h2:0:0": "id-2"})
+        self.assertIsNone(registry.file_with_content("hash-a"))
+        self.assertEqual(registry.file_with_content("hash-a2"), "a.pdf")
+
+    def test_unsaved_changes_are_not_kept(self):
+        registry = DocumentRegistry(self.path)
+        registry.set_file("a.pdf", "hash-a", {"h1:0:0": "id-1"})
+        registry.save()
+        registry.set_file("b.pdf", "hash-b", {"h2:0:0": "id-2"})
+
+        # Act
+        registry.close()
+        reloaded = DocumentRegistry(self.path)
+
+        # Assert
+        self.assertEqual(reloaded.file_names(), ["a.pdf"])
+
+    def test_drop_rows_after(self):
+        registry = DocumentRegistry(self.path)
+        registry.add_chunk("a.pdf", "hash-a", "h1:0:0", "id-1")
+        row = registry.last_row()
+        registry.add_chunk("a.pdf", "hash-a", "h2:0:0", "id-2")
+        registry.add_chunk("b.pdf", "hash-b", "h3:0:0", "id-3")
+
+        # Act
+        registry.drop_rows_after(row)
+
+        # Assert
+        self.assertEqual(registry.file_names(), ["a.pdf"])
+        self.assertEqual(registry.file_chunks("a.pdf"), {"h1:0:0": "id-1"})
+
+    def test_legacy_json_registry_is_imported(self):
+        legacy = os.path.join(self.tmp.name, "index", DocumentRegistry.LEGACY_FILENAME)
+        os.makedirs(os.path.dirname(legacy))
+        with open(legacy, "w") as f:
+            json.dump({"files": {"a.pdf": {"content_hash": "hash-a", "chunks": {"h1:0:0": "id-1"}}}}, f)
+
+        # Act
+        registry = DocumentRegistry(self.path)
+
+        # Assert
+        self.assertEqual(registry.file_chunks("a.pdf"), {"h1:0:0": "id-1"})
+        self.assertEqual(registry.file_with_content("hash-a"), "a.pdf")
+        self.assertFalse(os.path.exists(legacy))
+
+    def test_save_as_copies_the_registry(self):
+        registry = DocumentRegistry(self.path)
+        registry.set_file("a.pdf", "hash-a", {"h1:0:0": "id-1"})
+        target = os.path.join(self.tmp.name, "other.db")
+
+        # Act
+        registry.save_as(target)
+
+        # Assert
+        self.assertEqual(DocumentRegistry(target).file_chunks("a.pdf"), {"h1:0:0": "id-1"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+
+import asyncio
+import tempfile
+import unittest
+import numpy as np
+from typing import List
+from unittest.mock import patch
+from langchain_core.embeddings import Embeddings
+from src.rag.embedding_cache import CachedEmbeddings
+from src.rag.embedding_scheduler import EmbeddingScheduler
+from tests.test_embedding_scheduler import RateLimitError
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic fake provider that records every batch it receives."""
+    def __init__(self):
+        self.calls: List[List[str]] = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), float(sum(map(ord, t)) % 97), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+class AsyncFlakyEmbeddings(CountingEmbeddings):
+    """Async provider whose first `failures` calls are rate limited."""
+    def __init__(self, failures=0):
+        super().__init__()
+        self.failures = failures
+
+    def embed_documents(self, texts):
+        return [[float(len(t))] for t in texts]
+
+    async def aembed_documents(self, texts):
+        if self.failures:
+            self.failures -= 1
+            raise RateLimitError()
+        return self.embed_documents(texts)
+
+async def no_sleep(seconds):
+    pass
+
+class TestCachedEmbeddings(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.provider = CountingEmbeddings()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_cache(self, model="text-embedding-3-small", batch_size=512):
+        return CachedEmbeddings(self.provider, model_name=model, cache_dir=self.tmp.name, batch_size=batch_size)
+
+    def test_only_misses_reach_provider(self):
+        cache = self.make_cache()
+        first = cache.embed_documents(["alpha", "beta"])
+
+        # Act
+        second = cache.embed_documents(["beta", "gamma", "alpha"])
+
+        # Assert
+        self.assertEqual(self.provider.calls, [["alpha", "beta"], ["gamma"]])
+        self.assertEqual(second[0], first[1])
+        self.assertEqual(second[2], first[0])
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 3)
+
+    def test_cache_persists_across_instances(self):
+        self.make_cache().embed_documents(["alpha", "beta"])
+        self.provider.calls.clear()
+
+        # Act - a fresh process re-ingesting the same corpus
+        cache = self.make_cache()
+        vectors = cache.embed_documents(["alpha", "beta"])
+
+        # Assert
+        self.assertEqual(self.provider.calls, [])
+        self.assertEqual(len(vectors), 2)
+        self.assertEqual(cache.stats()["hit_rate"], 1.0)
+
+    def test_vectors_are_memory_mapped_not_loaded(self):
+        self.make_cache().embed_documents(["alpha", "beta"])
+
+        # Act - a new worker reads the cache, then embeds more and reads those back
+        cache = self.make_cache()
+        with patch("src.rag.embedding_cache.np.fromfile", side_effect=AssertionError("read into memory")):
+            expected = cache.embed_documents(["alpha"])
+            fresh = cache.embed_documents(["gamma", "beta"])
+
+        # Assert
+        self.assertIsInstance(cache._vectors, np.memmap)
+        self.assertEqual(fresh[0], self.provider.embed_documents(["gamma"])[0])
+        self.assertEqual(expected, self.make_cache().embed_documents(["alpha"]))
+        self.assertEqual(len(cache._vectors), 3)
+
+    def test_cache_is_keyed_by_model(self):
+        self.make_cache(model="model-a").embed_documents(["alpha"])
+
+        self.make_cache(model="model-b").embed_documents(["alpha"])
+
+        self.assertEqual(len(self.provider.calls), 2)
+
+    def test_duplicate_texts_embedded_once(self):
+        cache = self.make_cache()
+
+        vectors = cache.embed_documents(["same", "same", "same"])
+
+        self.assertEqual(self.provider.calls, [["same"]])
+        self.assertEqual(vectors[0], vectors[2])
+
+    def test_misses_sent_in_batches(self):
+        cache = self.make_cache(batch_size=2)
+
+        cache.embed_documents(["a", "bb", "ccc", "dddd", "eeeee"])
+
+        self.assertEqual([len(c) for c in self.provider.calls], [2, 2, 1])
+
+    def test_completed_batches_survive_a_failure(self):
+        cache = self.make_cache(batch_size=2)
+        original = self.provider.embed_documents
+
+        def fail_on_third_text(texts):
+            if "ccc" in texts:
+                raise ValueError("bad input")
+            return original(texts)
+
+        with patch.object(self.provider, "embed_documents", side_effect=fail_on_third_text):
+            with self.assertRaises(ValueError):
+                cache.embed_documents(["a", "bb", "ccc", "dddd"])
+        self.provider.calls.clear()
+
+        # Act - the retried run only sends what was not embedded
+        self.make_cache(batch_size=2).embed_documents(["a", "bb", "ccc", "dddd"])
+
+        # Assert
+        self.assertEqual(self.provider.calls, [["ccc", "dddd"]])
+
+    def test_torn_append_is_ignored(self):
+        self.make_cache().embed_documents(["alpha", "beta"])
+        # Simulate a crash after writing vectors but before writing keys
+        with open(self.make_cache().vectors_path, "ab") as f:
+            f.write(b"\x00" * 12)
+
+        cache = self.make_cache()
+        cache.embed_documents(["alpha", "beta"])
+
+        self.assertEqual(cache.stats()["cached_vectors"], 2)
+        self.assertEqual(len(self.provider.calls), 1)
+
+    def test_orphan_vector_row_does_not_shift_later_rows(self):
+        self.make_cache().embed_documents(["alpha", "beta"])
+        # A crash after a whole vector row was written, before its key
+        with open(self.make_cache().vectors_path, "ab") as f:
+            f.write(np.full(3, 99.0, dtype=np.float32).tobytes())
+
+        # Act - a later process appends, another reads back
+        expected = self.make_cache().embed_documents(["gamma"])
+        vectors = self.make_cache().embed_documents(["alpha", "beta", "gamma"])
+
+        # Assert - nothing re-embedded, every text still gets its own vector
+        self.assertEqual(self.provider.calls, [["alpha", "beta"], ["gamma"]])
+        self.assertEqual(vectors[2], expected[0])
+        self.assertEqual(vectors, self.provider.embed_documents(["alpha", "beta", "gamma"]))
+
+    def test_embed_queries_single_batched_call(self):
+        cache = self.make_cache()
+        cache.embed_query("cached question")
+        self.provider.calls.clear()
+
+        # Act
+        vectors = cache.embed_queries(["q1", "cached question", "q2", "q1"])
+
+        # Assert - only the uncached, unique queries, in one call
+        self.assertEqual(self.provider.calls, [["q1", "q2"]])
+        self.assertEqual(len(vectors), 4)
+        self.assertEqual(vectors[0], vectors[3])
+
+    def test_query_retried_after_rate_limit(self):
+        sleeps = []
+        cache = CachedEmbeddings(self.provider, model_name="m", cache_dir=self.tmp.name, query_retries=2,
+                                 scheduler=EmbeddingScheduler(max_retries=0, sleep=sleeps.append))
+        original = self.provider.embed_documents
+        failures = [RateLimitError()]
+
+        def rate_limited_once(texts):
+            if failures:
+                raise failures.pop()
+            return original(texts)
+
+        # Act
+        with patch.object(self.provider, "embed_documents", side_effect=rate_limited_once):
+            vector = cache.embed_query("what is a tree?")
+
+        # Assert - retried (with the query retry limit, not the batch one) instead of failing the request
+        self.assertEqual(vector, original(["what is a tree?"])[0])
+        self.assertEqual(len(sleeps), 1)
+
+    def test_async_paths_retry_and_persist(self):
+        provider = AsyncFlakyEmbeddings(failures=2)
+        cache = CachedEmbeddings(provider, model_name="m", cache_dir=self.tmp.name, batch_size=2,
+                                 scheduler=EmbeddingScheduler(max_batch_size=2, max_concurrency=2, max_retries=3,
+                                                              asleep=no_sleep))
+
+        # Act
+        query = asyncio.run(cache.aembed_query("q"))
+        vectors = asyncio.run(cache.aembed_documents(["a", "bb", "ccc"]))
+
+        # Assert
+        self.assertEqual(query, [1.0])
+        self.assertEqual(vectors, [[1.0], [2.0], [3.0]])
+        self.assertEqual(self.make_cache(model="m").embed_documents(["a", "bb", "ccc"]), vectors)
+        self.assertEqual(self.provider.calls, [])  # Read back from disk
+
+    def test_queries_are_not_persisted(self):
+        cache = self.make_cache()
+
+        cache.embed_query("question")
+
+        self.assertFalse(cache.vectors_path.exists())
+
+class TestCachedEmbeddingsAsync(unittest.IsolatedAsyncioTestCase):
+    async def test_aembed_documents_uses_cache(self):
+        provider = CountingEmbeddings()
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = CachedEmbeddings(provider, model_name="m", cache_dir=tmp)
+            cache.embed_documents(["alpha"])
+
+            vectors = await cache.aembed_documents(["alpha", "beta"])
+
+        self.assertEqual(provider.calls, [["alpha"], ["beta"]])
+        self.assertEqual(len(vectors), 2)
+
+if __name__ == "__main__":
+    unittest.main()
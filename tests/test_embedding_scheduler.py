@@ -0,0 +1,188 @@
+
+import asyncio
+import threading
+import time
+import unittest
+from src.rag.embedding_scheduler import EmbeddingScheduler, MinuteBudget, is_retryable
+
+class RateLimitError(Exception):
+    """Shaped like the SDK's error: a status code and response headers."""
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after} if retry_after else {}})()
+
+class FlakyProvider:
+    def __init__(self, failures=(), latency=0.0):
+        self.failures = list(failures)  # Raised by the first calls, in order
+        self.latency = latency
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            failure = self.failures.pop(0) if self.failures else None
+        try:
+            time.sleep(self.latency)
+            if failure:
+                raise failure
+            return [[float(len(t))] for t in texts]
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+def run(scheduler, provider, texts):
+    results = {}
+    scheduler.run(provider.embed_documents, texts, lambda positions, vectors: results.update(zip(positions, vectors[:, 0])))
+    return [results[i] for i in range(len(texts))]
+
+class TestEmbeddingScheduler(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+
+    def make(self, **kwargs):
+        return EmbeddingScheduler(count_tokens=len, sleep=self.sleeps.append, **kwargs)
+
+    def test_plan_packs_by_tokens_and_size(self):
+        scheduler = self.make(max_batch_size=3, max_batch_tokens=10)
+
+        batches = scheduler.plan(["aaaa", "bbbb", "cc", "dddddddddddd", "e", "f", "g", "h"])
+
+        # Assert - an oversized text gets a batch of its own
+        self.assertEqual(batches, [[0, 1, 2], [3], [4, 5, 6], [7]])
+
+    def test_retries_with_backoff(self):
+        provider = FlakyProvider(failures=[RateLimitError(), TimeoutError()])
+        scheduler = self.make(max_retries=3, backoff_base=1.0)
+
+        # Act
+        vectors = run(scheduler, provider, ["ab", "c"])
+
+        # Assert - two jittered waits, the second drawn from a doubled range
+        self.assertEqual(vectors, [2.0, 1.0])
+        self.assertEqual(len(provider.calls), 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertLessEqual(self.sleeps[0], 1.0)
+        self.assertLessEqual(self.sleeps[1], 2.0)
+
+    def test_retry_after_is_respected(self):
+        provider = FlakyProvider(failures=[RateLimitError(retry_after="7")])
+
+        run(self.make(max_retries=1, backoff_base=0.01), provider, ["a"])
+
+        self.assertEqual(self.sleeps, [7.0])
+
+    def test_gives_up_after_max_retries_or_on_other_errors(self):
+        with self.assertRaises(RateLimitError):
+            run(self.make(max_retries=1), FlakyProvider(failures=[RateLimitError(), RateLimitError()]), ["a"])
+        provider = FlakyProvider(failures=[ValueError("bad input")])
+        with self.assertRaises(ValueError):
+            run(self.make(max_retries=5), provider, ["a"])
+        self.assertEqual(len(provider.calls), 1)
+
+    def test_queries_do_not_wait_behind_ingestion(self):
+        scheduler = self.make(tokens_per_minute=1000, max_batch_tokens=900, query_share=0.1)
+        provider = FlakyProvider()
+        run(scheduler, provider, ["x" * 900] * 3)  # Ingestion: two minutes in debt
+        self.sleeps.clear()
+
+        # Act
+        vectors = scheduler.send(provider.embed_documents, ["what is a tree?"], query=True)
+
+        # Assert - sent right away, from the share the batches cannot use
+        self.assertEqual(vectors.tolist(), [[15.0]])
+        self.assertEqual(self.sleeps, [])
+        self.assertEqual(scheduler.tokens.capacity + scheduler.query_tokens.capacity, 1000)
+
+    def test_query_backoff_is_capped_by_max_wait(self):
+        provider = FlakyProvider(failures=[RateLimitError(), RateLimitError(retry_after="30")])
+        scheduler = self.make(backoff_base=0.01)
+
+        # Act - a 30 s Retry-After is more than the query may wait
+        with self.assertRaises(RateLimitError):
+            scheduler.send(provider.embed_documents, ["a"], max_retries=5, query=True, max_wait=2.0)
+
+        # Assert - one short backoff, then the query fails instead of sleeping
+        self.assertEqual(len(provider.calls), 2)
+        self.assertEqual(len(self.sleeps), 1)
+        self.assertLessEqual(self.sleeps[0], 0.01)
+
+    def test_concurrent_batches_bounded(self):
+        provider = FlakyProvider(latency=0.02)
+        scheduler = self.make(max_batch_size=2, max_concurrency=3)
+
+        vectors = run(scheduler, provider, ["a" * n for n in range(1, 21)])
+
+        self.assertEqual(vectors, [float(n) for n in range(1, 21)])
+        self.assertEqual(len(provider.calls), 10)
+        self.assertLessEqual(provider.max_in_flight, 3)
+        self.assertGreater(provider.max_in_flight, 1)
+
+    def test_completed_batches_reported_before_failure(self):
+        provider = FlakyProvider(failures=[None, ValueError("bad input")])
+        done = []
+
+        with self.assertRaises(ValueError):
+            self.make(max_batch_size=1).run(provider.embed_documents, ["a", "b", "c"], lambda p, v: done.extend(p))
+
+        self.assertEqual(done, [0])
+
+    def test_arun_bounds_concurrency_and_retries(self):
+        in_flight, peak, calls = [0], [0], []
+
+        async def aembed(texts):
+            calls.append(texts)
+            if len(calls) == 1:
+                raise RateLimitError()
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.01)
+            in_flight[0] -= 1
+            return [[float(len(t))] for t in texts]
+
+        async def no_sleep(seconds):
+            pass
+
+        scheduler = self.make(max_batch_size=1, max_concurrency=2, max_retries=1, asleep=no_sleep)
+        results = {}
+
+        # Act
+        asyncio.run(scheduler.arun(aembed, ["a", "bb", "ccc", "dddd"], lambda p, v: results.update(zip(p, v[:, 0]))))
+
+        # Assert
+        self.assertEqual([results[i] for i in range(4)], [1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(len(calls), 5)
+        self.assertEqual(peak[0], 2)
+
+    def test_is_retryable(self):
+        self.assertTrue(is_retryable(RateLimitError()))
+        self.assertTrue(is_retryable(type("InternalServerError", (Exception,), {"status_code": 503})()))
+        self.assertFalse(is_retryable(type("BadRequestError", (Exception,), {"status_code": 400})()))
+
+class TestMinuteBudget(unittest.TestCase):
+    def test_waits_once_quota_is_spent(self):
+        now = [0.0]
+        budget = MinuteBudget(60, clock=lambda: now[0])  # One per second
+
+        # Act
+        first = budget.reserve(60)  # The whole minute's worth is available up front
+        second = budget.reserve(2)
+        now[0] = 10.0
+        third = budget.reserve(1)
+
+        # Assert
+        self.assertEqual(first, 0.0)
+        self.assertAlmostEqual(second, 2.0)
+        self.assertAlmostEqual(third, 0.0)
+
+    def test_unlimited(self):
+        self.assertEqual(MinuteBudget(0).reserve(10 ** 9), 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
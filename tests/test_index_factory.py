@@ -0,0 +1,78 @@
+
+import unittest
+import faiss
+import numpy as np
+from src.rag.index_factory import build_index, tune_index, describe_index, remove_positions
+
+def random_vectors(n, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, dim)).astype(np.float32)
+
+class TestIndexFactory(unittest.TestCase):
+    def test_flat(self):
+        index = build_index(random_vectors(10), "flat")
+        self.assertIsInstance(index, faiss.IndexFlatL2)
+
+    def test_unknown_type(self):
+        with self.assertRaisesRegex(ValueError, "Unknown index type"):
+            build_index(random_vectors(10), "annoy")
+
+    def test_ivf_flat_is_trained_and_finds_exact_match(self):
+        vectors = random_vectors(2000)
+
+        # Act
+        index = build_index(vectors, "ivf_flat", nlist=16)
+        index.add(vectors)
+        tune_index(index, nprobe=16)
+        _, ids = index.search(vectors[:5], 1)
+
+        # Assert
+        self.assertTrue(index.is_trained)
+        self.assertEqual(ids[:, 0].tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(describe_index(index), "ivf_flat(nlist=16, nprobe=16)")
+
+    def test_ivf_pq_trains_on_sample(self):
+        vectors = random_vectors(1000)
+
+        index = build_index(vectors, "ivf_pq", nlist=4, pq_m=10, pq_nbits=8, train_sample_size=500)
+
+        self.assertIsInstance(index, faiss.IndexIVFPQ)
+        self.assertTrue(index.is_trained)
+        self.assertEqual(index.pq.M, 8)  # largest divisor of 32 not above 10
+
+    def test_hnsw_tuning(self):
+        index = build_index(random_vectors(50), "hnsw", hnsw_m=8)
+
+        tune_index(index, ef_search=99)
+
+        self.assertEqual(index.hnsw.efSearch, 99)
+
+    def test_small_corpus_falls_back_to_flat(self):
+        index = build_index(random_vectors(20), "ivf_pq")
+
+        self.assertIsInstance(index, faiss.IndexFlatL2)
+
+    def test_nprobe_capped_at_nlist(self):
+        vectors = random_vectors(500)
+        index = build_index(vectors, "ivf_flat", nlist=8)
+
+        tune_index(index, nprobe=100)
+
+        self.assertEqual(index.nprobe, 8)
+    def test_remove_positions_keeps_order(self):
+        vectors = random_vectors(1000)
+        for index_type in ("flat", "hnsw", "ivf_flat"):
+            index = build_index(vectors, index_type, nlist=8, hnsw_m=8)
+            index.add(vectors)
+            tune_index(index, nprobe=8, ef_search=64)
+
+            # Act
+            remove_positions(index, [0, 5])
+            _, ids = index.search(vectors[[1, 6]], 1)
+
+            # Assert - later vectors move up to keep positions dense
+            self.assertEqual(index.ntotal, 998, index_type)
+            self.assertEqual(ids[:, 0].tolist(), [0, 4], index_type)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+
+import unittest
+from unittest.mock import patch
+import os
+import tempfile
+from pathlib import Path
+from src.config.settings import config
+from src.ingest import ingest_data, ingest_single_file, next_position
+from src.rag.document_registry import DocumentRegistry
+from src.rag.embedding_cache import CachedEmbeddings
+from src.rag.lexical_index import documents_in_order
+from src.rag.segment_store import SegmentStore
+from src.rag.vector_store import RAGPipeline
+from tests.test_pdf_loader import write_pdf
+from tests.test_vector_store import KeywordEmbeddings
+
+class TestStreamingIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pdf_dir = os.path.join(self.tmp.name, "pdfs")
+        os.makedirs(self.pdf_dir)
+        write_pdf(os.path.join(self.pdf_dir, "a.pdf"), ["neural networks", "decision trees"])
+        write_pdf(os.path.join(self.pdf_dir, "b.pdf"), ["linear regression", "neural trees", "regression trees"])
+
+        self.provider = KeywordEmbeddings()
+        self.patches = [
+            patch.object(config, "EMBEDDINGS_DIR", Path(self.tmp.name) / "embeddings"),
+            patch.object(config, "RAW_PDFS_DIR", self.pdf_dir),
+            patch.object(config, "PDF_LOADER_WORKERS", 1),
+            patch.object(config, "INGEST_BATCH_SIZE", 2),
+            patch.object(config, "LOCAL_INDEX_ENABLED", False),
+            patch("src.ingest.get_rag_pipeline", side_effect=self.make_rag),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        self.tmp.cleanup()
+
+    def make_rag(self):
+        with patch("langchain_openai.OpenAIEmbeddings"):
+            rag = RAGPipeline()
+        rag.embeddings = CachedEmbeddings(self.provider, model_name="fake", cache_dir=self.tmp.name)
+        rag.handle.clear()
+        return rag
+
+    def indexed_texts(self):
+        rag = self.make_rag()
+        rag.load_index(from_disk=True)
+        return sorted(doc.page_content for doc in documents_in_order(rag.handle.snapshot().stores))
+
+    def test_builds_index_in_fixed_size_batches(self):
+        ingest_data()
+
+        # Assert - 5 pages in batches of 2, one provider call per batch
+        self.assertEqual([len(call) for call in self.provider.calls], [2, 2, 1])
+        self.assertEqual(len(self.indexed_texts()), 5)
+        self.assertFalse((config.EMBEDDINGS_DIR / "ingest_staging").exists())
+
+    def test_resumes_after_crash_from_last_committed_batch(self):
+        original = RAGPipeline.embed_texts
+        calls = []
+
+        def crash_on_second_batch(rag, texts, progress=None):
+            calls.append(texts)
+            if len(calls) == 2:
+                raise RuntimeError("killed")
+            return original(rag, texts, progress)
+
+        with patch.object(RAGPipeline, "embed_texts", crash_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                ingest_data()
+
+        # Act
+        calls.clear()
+
+        def record(rag, texts, progress=None):
+            calls.append(texts)
+            return original(rag, texts, progress)
+
+        with patch.object(RAGPipeline, "embed_texts", record):
+            ingest_data()
+
+        # Assert - the first batch was not embedded again
+        self.assertNotIn(["neural networks", "decision trees"], calls)
+        self.assertEqual(self.indexed_texts(), sorted([
+            "neural networks", "decision trees", "linear regression", "neural trees", "regression trees",
+        ]))
+
+    def test_crash_before_batch_commit_does_not_duplicate_chunks(self):
+        original = SegmentStore._write_manifest
+        writes = []
+
+        def crash_on_second_commit(store, manifest):
+            if "checkpoint" in manifest:
+                writes.append(manifest)
+                if len(writes) == 2:
+                    raise RuntimeError("killed")  # The segment is on disk, the manifest is not
+            return original(store, manifest)
+
+        with patch.object(SegmentStore, "_write_manifest", crash_on_second_commit):
+            with self.assertRaises(RuntimeError):
+                ingest_data()
+
+        # Act
+        ingest_data()
+
+        # Assert - each chunk is indexed once, and the registry lists every file
+        rag = self.make_rag()
+        self.assertEqual(self.indexed_texts(), sorted([
+            "neural networks", "decision trees", "linear regression", "neural trees", "regression trees",
+        ]))
+        self.assertEqual(DocumentRegistry(rag.registry_path).file_names(), ["a.pdf", "b.pdf"])
+
+    def test_final_build_streams_staged_records(self):
+        # Act - the final build must not collect the chunks as Documents in memory
+        with patch("src.rag.vector_store.documents_in_order", side_effect=AssertionError("materialized")), \
+                patch("src.rag.vector_store.InMemoryDocstore", side_effect=AssertionError("materialized")):
+            ingest_data()
+
+        # Assert - chunks keep the ids the registry knows them by
+        rag = self.make_rag()
+        rag.load_index(from_disk=True)
+        indexed = {doc.id for doc in documents_in_order(rag.handle.snapshot().stores)}
+        self.assertEqual(len(indexed), 5)
+        self.assertEqual(indexed, DocumentRegistry(rag.registry_path).referenced_ids())
+
+    def test_changed_corpus_starts_over(self):
+        with patch.object(RAGPipeline, "embed_texts", side_effect=RuntimeError("killed")):
+            with self.assertRaises(RuntimeError):
+                ingest_data()
+        write_pdf(os.path.join(self.pdf_dir, "c.pdf"), ["more neural"])
+
+        ingest_data()
+
+        self.assertEqual(len(self.indexed_texts()), 6)
+
+    def test_duplicate_chunks_are_indexed_once(self):
+        write_pdf(os.path.join(self.pdf_dir, "c.pdf"), ["neural networks", "decision trees"])  # Copy of a.pdf
+
+        ingest_data()
+
+        # Assert - both files are registered against the same chunks
+        rag = self.make_rag()
+        registry = DocumentRegistry(rag.registry_path)
+        self.assertEqual(len(self.indexed_texts()), 5)
+        self.assertEqual(registry.file_names(), ["a.pdf", "b.pdf", "c.pdf"])
+        self.assertEqual(
+            sorted(registry.file_chunks("a.pdf").values()), sorted(registry.file_chunks("c.pdf").values())
+        )
+
+    def test_upload_of_indexed_content_is_not_parsed(self):
+        ingest_data()
+        progress = []
+
+        with patch("src.ingest.PDFLoader") as MockLoader:
+            success = ingest_single_file(os.path.join(self.pdf_dir, "a.pdf"), progress=lambda stage, **c: progress.append((stage, c)))
+
+        self.assertTrue(success)
+        MockLoader.assert_not_called()
+        self.assertEqual(progress, [("indexed", {"result": {"status": "unchanged", "same_as": "a.pdf"}})])
+
+    def test_next_position(self):
+        self.assertEqual(next_position(("a.pdf", 3, 1, False)), ("a.pdf", 3, 2))
+        self.assertEqual(next_position(("a.pdf", 3, 1, True)), ("a.pdf", 4, 0))
+
+if __name__ == "__main__":
+    unittest.main()
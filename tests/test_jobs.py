@@ -0,0 +1,93 @@
+
+import threading
+import time
+import unittest
+from src.api.jobs import IngestJobManager
+
+class TestIngestJobManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = IngestJobManager(max_workers=2)
+
+    def tearDown(self):
+        self.manager.shutdown()
+
+    def wait(self):
+        self.manager.shutdown(wait=True)
+
+    def test_job_runs_and_reports_progress(self):
+        def work(job):
+            job.update("parsed", pages_parsed=10)
+            job.update("embedding", chunks_embedded=25, chunks_total=25)
+            return True
+
+        # Act
+        job, deduplicated = self.manager.submit("book.pdf", "hash-1", work)
+        self.wait()
+
+        # Assert
+        self.assertFalse(deduplicated)
+        status = self.manager.get(job.id).to_dict()
+        self.assertEqual(status["status"], "completed")
+        self.assertEqual(status["stage"], "done")
+        self.assertEqual(status["pages_parsed"], 10)
+        self.assertEqual(status["chunks_embedded"], 25)
+        self.assertIsNotNone(status["finished_at"])
+
+    def test_failed_job_records_error(self):
+        def work(job):
+            raise ValueError("corrupt pdf")
+
+        job, _ = self.manager.submit("bad.pdf", "hash-2", work)
+        self.wait()
+
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.error, "corrupt pdf")
+
+    def test_same_upload_in_progress_is_deduplicated(self):
+        release = threading.Event()
+        calls = []
+
+        def work(job):
+            calls.append(job.id)
+            release.wait(5)
+            return True
+
+        # Act
+        first, _ = self.manager.submit("book.pdf", "same-hash", work)
+        second, deduplicated = self.manager.submit("book.pdf", "same-hash", work)
+        copy, copy_deduplicated = self.manager.submit("book-copy.pdf", "same-hash", work)
+        release.set()
+        self.wait()
+
+        # Assert - a copy under another name is left to the index to recognise
+        self.assertTrue(deduplicated)
+        self.assertIs(first, second)
+        self.assertFalse(copy_deduplicated)
+        self.assertEqual(len(calls), 2)
+
+    def test_finished_upload_runs_again(self):
+        # An older version uploaded again after a newer one is a revert
+        first, _ = self.manager.submit("book.pdf", "v1", lambda job: True)
+        while first.finished_at is None:
+            time.sleep(0.01)
+
+        again, deduplicated = self.manager.submit("book.pdf", "v1", lambda job: True)
+
+        self.assertFalse(deduplicated)
+        self.assertIsNot(again, first)
+
+    def test_failed_job_can_be_retried(self):
+        job, _ = self.manager.submit("book.pdf", "hash-3", lambda job: False)
+        while job.finished_at is None:
+            time.sleep(0.01)
+
+        retry, deduplicated = self.manager.submit("book.pdf", "hash-3", lambda job: True)
+
+        self.assertFalse(deduplicated)
+        self.assertIsNot(retry, job)
+
+    def test_unknown_job(self):
+        self.assertIsNone(self.manager.get("missing"))
+
+if __name__ == "__main__":
+    unittest.main()
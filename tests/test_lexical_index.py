@@ -0,0 +1,65 @@
+
+import unittest
+from langchain_core.documents import Document
+from src.rag.lexical_index import BM25Index, tokenize
+from src.rag.hybrid_retriever import reciprocal_rank_fusion
+
+def docs(*texts):
+    return [Document(page_content=t, id=str(i)) for i, t in enumerate(texts)]
+
+class TestBM25Index(unittest.TestCase):
+    def setUp(self):
+        self.index = BM25Index()
+        self.index.add(docs(
+            "Supervised learning uses labelled data.",
+            "Unsupervised learning finds clusters without labels.",
+            "Reinforcement learning learns from rewards.",
+        ))
+
+    def test_rare_terms_rank_first(self):
+        results = self.index.search("learning with rewards", k=3)
+
+        # "learning" is in every document; "rewards" decides the order
+        self.assertEqual(results[0][0].page_content, "Reinforcement learning learns from rewards.")
+        self.assertEqual(len(results), 3)
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search("quantum", k=3), [])
+
+    def test_limit_hides_later_documents(self):
+        self.index.add(docs("Rewards and more rewards."))
+
+        limited = self.index.search("rewards", k=5, limit=3)
+        full = self.index.search("rewards", k=5)
+
+        self.assertEqual(len(limited), 1)
+        self.assertEqual(len(full), 2)
+
+    def test_references_resolved_only_for_hits(self):
+        texts = {"a": "gradient descent", "b": "decision trees", "c": "random forests of trees"}
+        resolved = []
+        index = BM25Index(resolve=lambda ref: resolved.append(ref) or Document(page_content=texts[ref], id=ref))
+
+        # Act
+        index.add_refs(texts.items())
+        results = index.search("trees", k=1)
+
+        # Assert - only references are kept; the one hit is read back
+        self.assertEqual(index.docs, ["a", "b", "c"])
+        self.assertEqual(resolved, ["b"])
+        self.assertEqual(results[0][0].page_content, "decision trees")
+
+    def test_tokenize_drops_stopwords(self):
+        self.assertEqual(tokenize("What are the types of ML?"), ["types", "ml"])
+
+class TestReciprocalRankFusion(unittest.TestCase):
+    def test_documents_in_both_lists_win(self):
+        a, b, c = docs("a", "b", "c")
+
+        fused = reciprocal_rank_fusion([[a, b], [c, b]], k=3)
+
+        self.assertEqual(fused[0], b)
+        self.assertEqual(len(fused), 3)
+
+if __name__ == "__main__":
+    unittest.main()
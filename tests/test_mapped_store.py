@@ -0,0 +1,77 @@
+
+import os
+import tempfile
+import unittest
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from src.rag.mapped_store import MappedStore, is_mapped_store, write_store
+
+def make_docs(n):
+    return [Document(id=f"id-{i}", page_content=f"chunk {i} ünïcode", metadata={"source": "a.pdf", "page": i}) for i in range(n)]
+
+class TestMappedStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "base")
+        self.vectors = np.random.default_rng(0).random((20, 8), dtype=np.float32)
+        index = faiss.IndexFlatL2(8)
+        index.add(self.vectors)
+        write_store(self.path, index, make_docs(20))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        # Act
+        store = MappedStore(self.path, embeddings=None)
+
+        # Assert - documents come back by index position, ids and metadata included
+        self.assertTrue(is_mapped_store(self.path))
+        self.assertEqual(store.index.ntotal, 20)
+        doc = store.docstore.search(store.index_to_docstore_id[7])
+        self.assertEqual(doc.id, "id-7")
+        self.assertEqual(doc.page_content, "chunk 7 ünïcode")
+        self.assertEqual(doc.metadata, {"source": "a.pdf", "page": 7})
+
+    def test_search_finds_stored_vectors(self):
+        store = MappedStore(self.path, embeddings=None)
+
+        _, indices = store.index.search(self.vectors[[3, 11]], 1)
+
+        self.assertEqual(indices[:, 0].tolist(), [3, 11])
+
+    def test_in_memory_read_matches_mapped(self):
+        mapped = MappedStore(self.path, embeddings=None)
+        loaded = MappedStore(self.path, embeddings=None, mmap_enabled=False)
+
+        self.assertEqual(
+            mapped.index.search(self.vectors[:2], 3)[1].tolist(),
+            loaded.index.search(self.vectors[:2], 3)[1].tolist(),
+        )
+
+    def test_save_local_copies_store(self):
+        copy_path = os.path.join(self.tmp.name, "copy")
+
+        MappedStore(self.path, embeddings=None).save_local(copy_path)
+
+        copy = MappedStore(copy_path, embeddings=None)
+        self.assertEqual([d.id for d in copy.docstore], [f"id-{i}" for i in range(20)])
+
+    def test_document_count_must_match_index(self):
+        index = faiss.IndexFlatL2(8)
+        index.add(self.vectors)
+
+        with self.assertRaises(ValueError):
+            write_store(os.path.join(self.tmp.name, "bad"), index, make_docs(19))
+
+    def test_empty_store(self):
+        path = os.path.join(self.tmp.name, "empty")
+        write_store(path, faiss.IndexFlatL2(8), [])
+
+        store = MappedStore(path, embeddings=None)
+
+        self.assertEqual(len(store.docstore), 0)
+
+if __name__ == "__main__":
+    unittest.main()
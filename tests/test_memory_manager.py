@@ -1,7 +1,9 @@
 
 import unittest
+from unittest.mock import MagicMock, patch
 from langchain_community.chat_message_histories import ChatMessageHistory
-from src.memory.memory_manager import InMemoryHistoryManager
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from src.memory.memory_manager import BoundedHistoryManager, InMemoryHistoryManager, TokenBudgetHistory
 
 class TestMemoryManager(unittest.TestCase):
     def setUp(self):
@@ -41,5 +43,128 @@ class TestMemoryManager(unittest.TestCase):
         self.assertEqual(hist1.messages[0].content, "Hi User 1")
         self.assertEqual(hist2.messages[0].content, "Hi User 2")
 
+def add_turn(history, question, answer):
+    history.add_messages([HumanMessage(content=question), AIMessage(content=answer)])
+
+class TestTokenBudgetHistory(unittest.TestCase):
+    def test_drops_oldest_turns_over_budget(self):
+        history = TokenBudgetHistory(max_tokens=60)
+
+        # Act - each turn is roughly 30 tokens
+        for i in range(5):
+            add_turn(history, f"question {i} " + "word " * 20, f"answer {i}")
+
+        # Assert - whole turns dropped from the front, latest kept
+        contents = [m.content for m in history.messages]
+        self.assertTrue(contents[-1] == "answer 4")
+        self.assertNotIn("answer 0", contents)
+        self.assertIsInstance(history.messages[0], HumanMessage)
+        self.assertLessEqual(history.tokens, 60)
+
+    def test_keeps_latest_turn_even_if_over_budget(self):
+        history = TokenBudgetHistory(max_tokens=5)
+
+        add_turn(history, "a long question " * 10, "a long answer " * 10)
+
+        self.assertEqual(len(history.messages), 2)
+
+    def test_summarizes_dropped_turns(self):
+        summarizer = MagicMock(return_value="talked about trees")
+        history = TokenBudgetHistory(max_tokens=60, summarizer=summarizer)
+
+        add_turn(history, "trees " * 30, "yes")
+        add_turn(history, "neural " * 30, "ok")
+
+        # Assert - the first turn was folded into a summary message
+        previous, dropped = summarizer.call_args[0]
+        self.assertIsNone(previous)
+        self.assertEqual(dropped[1].content, "yes")
+        self.assertIsInstance(history.messages[0], SystemMessage)
+        self.assertIn("talked about trees", history.messages[0].content)
+
+class TestBoundedHistoryManager(unittest.TestCase):
+    def test_lru_eviction(self):
+        manager = BoundedHistoryManager(max_sessions=2)
+        history_a = manager.get_session_history("a")
+        manager.get_session_history("b")
+        manager.get_session_history("a")  # b is now least recently used
+
+        # Act
+        manager.get_session_history("c")
+
+        # Assert
+        stats = manager.stats()
+        self.assertEqual(stats["sessions"], 2)
+        self.assertEqual(stats["evicted_lru"], 1)
+        self.assertIs(manager.get_session_history("a"), history_a)
+
+    def test_ttl_eviction(self):
+        manager = BoundedHistoryManager(ttl_seconds=10)
+        with patch("src.memory.memory_manager.time.monotonic", return_value=100.0):
+            add_turn(manager.get_session_history("old"), "hi", "hello")
+
+        # Act
+        with patch("src.memory.memory_manager.time.monotonic", return_value=111.0):
+            history = manager.get_session_history("old")
+            stats = manager.stats()
+
+        # Assert - a fresh, empty history
+        self.assertEqual(history.messages, [])
+        self.assertEqual(stats["evicted_ttl"], 1)
+
+    def test_global_token_cap_evicts_other_sessions(self):
+        manager = BoundedHistoryManager(max_total_tokens=100, session_token_budget=1000)
+        add_turn(manager.get_session_history("a"), "word " * 40, "ok")
+
+        # Act
+        add_turn(manager.get_session_history("b"), "word " * 40, "ok")
+
+        # Assert - the older session made room; the one being written survives
+        stats = manager.stats()
+        self.assertEqual(stats["evicted_memory"], 1)
+        self.assertEqual(stats["sessions"], 1)
+        self.assertLessEqual(stats["total_tokens"], 100)
+        self.assertEqual(len(manager.get_session_history("b").messages), 2)
+
+    def test_total_tokens_follow_every_change(self):
+        manager = BoundedHistoryManager(session_token_budget=40)
+        history_a = manager.get_session_history("a")
+        history_b = manager.get_session_history("b")
+
+        # Act - grow, trim and clear
+        for i in range(3):
+            add_turn(history_a, "word " * 20, f"answer {i}")
+        add_turn(history_b, "hi", "hello")
+        history_b.clear()
+
+        # Assert
+        self.assertEqual(manager.stats()["total_tokens"], history_a.tokens)
+
+    def test_ttl_expiry_stops_at_the_first_recent_session(self):
+        manager = BoundedHistoryManager(ttl_seconds=10)
+        with patch("src.memory.memory_manager.time.monotonic", return_value=100.0):
+            add_turn(manager.get_session_history("old"), "hi", "hello")
+        with patch("src.memory.memory_manager.time.monotonic", return_value=105.0):
+            recent = manager.get_session_history("recent")
+            add_turn(recent, "hi", "hello")
+
+        # Act
+        with patch("src.memory.memory_manager.time.monotonic", return_value=111.0):
+            stats = manager.stats()
+
+        # Assert
+        self.assertEqual(stats["evicted_ttl"], 1)
+        self.assertEqual(stats["sessions"], 1)
+        self.assertEqual(stats["total_tokens"], recent.tokens)
+
+    def test_stats_count_trimmed_turns(self):
+        manager = BoundedHistoryManager(session_token_budget=40)
+        history = manager.get_session_history("a")
+
+        for i in range(3):
+            add_turn(history, "word " * 20, f"answer {i}")
+
+        self.assertEqual(manager.stats()["trimmed_turns"], 2)
+
 if __name__ == "__main__":
     unittest.main()
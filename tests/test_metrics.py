@@ -0,0 +1,87 @@
+
+import asyncio
+import unittest
+from src.utils.metrics import MetricsRegistry, record_stage, stage, start_trace, STAGE_SECONDS
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = self.registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+
+        # Act
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value, stage="retrieve")
+        text = self.registry.render()
+
+        # Assert
+        self.assertIn('latency_seconds_bucket{stage="retrieve",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{stage="retrieve",le="1"} 3', text)
+        self.assertIn('latency_seconds_bucket{stage="retrieve",le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_sum{stage="retrieve"} 4.25', text)
+        self.assertIn('latency_seconds_count{stage="retrieve"} 4', text)
+        self.assertIn("# TYPE latency_seconds histogram", text)
+
+    def test_counter_and_gauge_callback(self):
+        counter = self.registry.counter("tokens_total", "Tokens.")
+        counter.inc(10, type="prompt")
+        counter.inc(5, type="prompt")
+        self.registry.gauge_callback("hit_ratio", "Hit rate.", lambda: {(("cache", "query"),): 0.5})
+
+        # Act
+        text = self.registry.render()
+
+        # Assert
+        self.assertIn('tokens_total{type="prompt"} 15', text)
+        self.assertIn('hit_ratio{cache="query"} 0.5', text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_failing_gauge_renders_no_samples(self):
+        def broken():
+            raise RuntimeError("agent not ready")
+
+        self.registry.gauge_callback("hit_ratio", "Hit rate.", broken)
+
+        self.assertEqual(self.registry.render(), "# HELP hit_ratio Hit rate.\n# TYPE hit_ratio gauge\n")
+
+    def test_same_name_returns_same_metric(self):
+        self.assertIs(self.registry.counter("c", "C."), self.registry.counter("c", "C."))
+
+class TestStageTrace(unittest.TestCase):
+    def test_trace_collects_stages_of_its_context_only(self):
+        before = STAGE_SECONDS.count(stage="test_stage")
+
+        # Act
+        record_stage("test_stage", 0.5)  # No trace active
+        with start_trace() as trace:
+            record_stage("test_stage", 0.25)
+            record_stage("test_stage", 0.25)
+            with stage("test_block"):
+                pass
+
+        # Assert - repeated stages add up; the histogram sees every observation
+        self.assertEqual(trace["test_stage"], 500.0)
+        self.assertIn("test_block", trace)
+        self.assertEqual(STAGE_SECONDS.count(stage="test_stage"), before + 3)
+
+    def test_concurrent_requests_keep_separate_traces(self):
+        async def request(name):
+            with start_trace() as trace:
+                await asyncio.sleep(0)
+                record_stage(name, 0.001)
+                await asyncio.sleep(0)
+            return trace
+
+        async def main():
+            return await asyncio.gather(request("stage_a"), request("stage_b"))
+
+        # Act
+        first, second = asyncio.run(main())
+
+        # Assert
+        self.assertEqual(list(first), ["stage_a"])
+        self.assertEqual(list(second), ["stage_b"])
+
+if __name__ == "__main__":
+    unittest.main()
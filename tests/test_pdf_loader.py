@@ -2,6 +2,7 @@
 import unittest
 from unittest.mock import MagicMock, patch, mock_open
 import os
+import tempfile
 from langchain_core.documents import Document
 from src.loaders.pdf_loader import PDFLoader
 
@@ -12,7 +13,7 @@ class TestPDFLoader(unittest.TestCase):
 
     @patch("os.path.exists")
     @patch("os.listdir")
-    @patch("src.loaders.pdf_loader.PyMuPDFLoader")
+    @patch("langchain_community.document_loaders.PyMuPDFLoader")
     def test_load_documents_success(self, MockLoader, mock_listdir, mock_exists):
         # Setup mocks
         mock_exists.return_value = True
@@ -54,7 +55,7 @@ class TestPDFLoader(unittest.TestCase):
 
     @patch("os.path.exists")
     @patch("os.listdir")
-    @patch("src.loaders.pdf_loader.PyMuPDFLoader")
+    @patch("langchain_community.document_loaders.PyMuPDFLoader")
     def test_loader_error_handling(self, MockLoader, mock_listdir, mock_exists):
         # Setup mocks to simulate one valid file and one broken file
         mock_exists.return_value = True
@@ -77,5 +78,63 @@ class TestPDFLoader(unittest.TestCase):
         self.assertEqual(len(docs), 1)
         self.assertEqual(docs[0].page_content, "Good Content")
 
+def write_pdf(path, pages):
+    import pymupdf
+    doc = pymupdf.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+
+class TestPDFLoaderParallel(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        write_pdf(os.path.join(self.tmp.name, "b_long.pdf"), [f"long page {i}" for i in range(5)])
+        write_pdf(os.path.join(self.tmp.name, "a_short.pdf"), ["short page 0"])
+        with open(os.path.join(self.tmp.name, "c_broken.pdf"), "wb") as f:
+            f.write(b"not a pdf")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parallel_matches_sequential_order(self):
+        sequential = PDFLoader(self.tmp.name).load_documents()
+
+        # Act - page ranges of 2 split the long file into 3 tasks
+        loader = PDFLoader(self.tmp.name, workers=2, pages_per_task=2)
+        parallel = loader.load_documents()
+
+        # Assert
+        self.assertEqual([d.page_content for d in parallel], [d.page_content for d in sequential])
+        self.assertEqual([d.metadata["page"] for d in parallel], [0, 0, 1, 2, 3, 4])
+        self.assertEqual(parallel[1].metadata["total_pages"], 5)
+
+    def test_parallel_reports_errors_without_aborting(self):
+        loader = PDFLoader(self.tmp.name, workers=2, pages_per_task=2)
+
+        docs = loader.load_documents()
+
+        self.assertEqual(len(docs), 6)
+        self.assertEqual([f for f, _ in loader.errors], ["c_broken.pdf"])
+
+    def test_iter_pages_matches_load_documents(self):
+        expected = [d.page_content for d in PDFLoader(self.tmp.name).load_documents()]
+
+        for workers in (1, 2):
+            loader = PDFLoader(self.tmp.name, workers=workers, pages_per_task=2)
+            pages = [d.page_content for d in loader.iter_pages()]
+
+            self.assertEqual(pages, expected)
+            self.assertEqual([f for f, _ in loader.errors], ["c_broken.pdf"])
+
+    def test_iter_pages_resumes_from_position(self):
+        loader = PDFLoader(self.tmp.name, pages_per_task=2)
+
+        # Act
+        pages = list(loader.iter_pages(start_file="b_long.pdf", start_page=3))
+
+        # Assert - a_short.pdf and the first 3 pages of b_long.pdf are skipped
+        self.assertEqual([d.page_content for d in pages], ["long page 3", "long page 4"])
+
 if __name__ == "__main__":
     unittest.main()
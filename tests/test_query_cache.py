@@ -0,0 +1,42 @@
+
+import unittest
+from unittest.mock import patch
+from src.rag.query_cache import QueryEmbeddingCache
+
+class TestQueryEmbeddingCache(unittest.TestCase):
+    def test_get_put(self):
+        cache = QueryEmbeddingCache(max_size=4)
+        self.assertIsNone(cache.get("what is ml?"))
+
+        cache.put("what is ml?", [1.0, 2.0])
+
+        # Whitespace differences map to the same entry
+        self.assertEqual(cache.get("what  is ml? "), [1.0, 2.0])
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_lru_eviction(self):
+        cache = QueryEmbeddingCache(max_size=2)
+        cache.put("a", [1.0])
+        cache.put("b", [2.0])
+        cache.get("a")  # "b" is now least recently used
+
+        cache.put("c", [3.0])
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), [1.0])
+
+    @patch("src.rag.query_cache.time.monotonic")
+    def test_ttl_expiry(self, mock_time):
+        cache = QueryEmbeddingCache(ttl_seconds=10)
+        mock_time.return_value = 100.0
+        cache.put("a", [1.0])
+
+        mock_time.return_value = 111.0
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+
+import asyncio
+import time
+import unittest
+from unittest.mock import MagicMock
+import numpy as np
+from langchain_core.documents import Document
+from src.rag.local_embeddings import HashingEmbeddings
+from src.rag.reranker import Reranker, RerankingRetriever, mmr, rank_relevance
+
+def doc(text, source="ml.pdf"):
+    return Document(page_content=text, metadata={"source": source})
+
+class FakeCrossEncoder:
+    """Scores by how many times the query's last word appears; optionally slow."""
+    model_name = "fake"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def score(self, query, texts):
+        self.calls += 1
+        time.sleep(self.delay)
+        word = query.split()[-1]
+        return [text.count(word) for text in texts]
+
+class TestMMR(unittest.TestCase):
+    def test_skips_redundant_candidates(self):
+        vectors = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+        relevance = np.array([0.9, 0.89, 0.5])
+
+        # Act
+        order = mmr(relevance, vectors, k=2, lambda_mult=0.5)
+
+        # Assert - the exact copy of the best candidate loses to the different one
+        self.assertEqual(order, [0, 2])
+
+    def test_lambda_one_is_relevance_order(self):
+        vectors = np.eye(3)
+        order = mmr(np.array([0.1, 0.7, 0.4]), vectors, k=3, lambda_mult=1.0)
+
+        self.assertEqual(order, [1, 2, 0])
+
+class TestReranker(unittest.TestCase):
+    def setUp(self):
+        # In retrieval order
+        self.docs = [
+            doc("Gradient descent minimises the loss function step by step."),
+            doc("Gradient descent minimises the loss function step by step.", source="copy.pdf"),
+            doc("Regularisation reduces overfitting of the loss function."),
+            doc("Cooking pasta needs salted boiling water."),
+        ]
+
+    def test_keeps_retrieval_order_but_skips_repeats(self):
+        reranker = Reranker(HashingEmbeddings(), k=3, lambda_mult=0.7)
+
+        # Act
+        ranked = reranker.rerank("How does gradient descent minimise the loss?", self.docs)
+
+        # Assert - the retriever's top chunk stays first and its copy drops out
+        self.assertIs(ranked[0], self.docs[0])
+        self.assertNotIn(self.docs[1], ranked)
+        self.assertEqual(reranker.stats()["reranked"], 1)
+
+    def test_local_similarity_does_not_override_retrieval_order(self):
+        docs = [doc("Cooking pasta needs salted boiling water."), doc("Gradient descent minimises the loss.")]
+        reranker = Reranker(HashingEmbeddings(), k=2)
+
+        # Act - local embeddings would favour the second for this query
+        ranked = reranker.rerank("gradient descent loss", docs)
+
+        self.assertEqual(ranked, docs)
+
+    def test_rank_relevance(self):
+        relevance = rank_relevance(3)
+
+        self.assertEqual(relevance[0], 1.0)
+        self.assertTrue(np.all(np.diff(relevance) < 0))
+        self.assertTrue(np.all(relevance > 0))
+
+    def test_cross_encoder_scores_set_relevance(self):
+        reranker = Reranker(HashingEmbeddings(), k=1, lambda_mult=1.0, cross_encoder=FakeCrossEncoder())
+
+        ranked = reranker.rerank("pasta water", self.docs)
+
+        self.assertIs(ranked[0], self.docs[3])
+
+    def test_cross_encoder_over_budget_falls_back_to_retrieval_order(self):
+        cross_encoder = FakeCrossEncoder(delay=0.05)
+        reranker = Reranker(HashingEmbeddings(), k=2, cross_encoder=cross_encoder, budget_ms=20, batch_size=1)
+
+        # Act
+        ranked = reranker.rerank("pasta water", self.docs)
+
+        # Assert - scoring stopped at the budget and the retriever's ranks were used
+        self.assertLess(cross_encoder.calls, len(self.docs))
+        self.assertEqual(reranker.stats()["cross_encoder_timeouts"], 1)
+        self.assertIs(ranked[0], self.docs[0])
+
+    def test_embedding_errors_keep_retrieval_order(self):
+        embeddings = MagicMock()
+        embeddings.embed_documents.side_effect = RuntimeError("boom")
+        reranker = Reranker(embeddings, k=2)
+
+        ranked = reranker.rerank("query", self.docs)
+
+        self.assertEqual(ranked, self.docs[:2])
+        self.assertEqual(reranker.stats()["fallbacks"], 1)
+
+class TestRerankerAsync(unittest.IsolatedAsyncioTestCase):
+    async def test_arerank_returns_retrieval_order_past_budget(self):
+        embeddings = MagicMock()
+        embeddings.embed_documents.side_effect = lambda texts: time.sleep(0.2) or [[1.0, 0.0]] * len(texts)
+        reranker = Reranker(embeddings, k=2, budget_ms=20)
+        docs = [doc("a"), doc("b"), doc("c")]
+
+        # Act
+        started = time.monotonic()
+        ranked = await reranker.arerank("query", docs)
+
+        # Assert
+        self.assertLess(time.monotonic() - started, 0.15)
+        self.assertEqual(ranked, docs[:2])
+        self.assertEqual(reranker.stats()["fallbacks"], 1)
+
+    async def test_retriever_reranks_base_results(self):
+        docs = [doc("Gradient descent and the loss."), doc("Gradient descent and the loss.", "copy.pdf"), doc("Cooking pasta.")]
+        base = MagicMock()
+        base.ainvoke = MagicMock(side_effect=lambda q: asyncio.sleep(0, result=docs))
+        retriever = RerankingRetriever(base=base, reranker=Reranker(HashingEmbeddings(), k=2, budget_ms=1000))
+
+        ranked = await retriever.ainvoke("gradient descent")
+
+        self.assertEqual(ranked, [docs[0], docs[2]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from src.config.settings import config
+from src.rag import resources
+
+class TestResourceRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patches = [
+            patch.object(config, "EMBEDDINGS_DIR", Path(self.tmp.name)),
+            patch.object(config, "LOCAL_INDEX_ENABLED", False),
+            patch("langchain_openai.OpenAIEmbeddings"),
+        ]
+        self.MockEmbeddings = [p.start() for p in self.patches][-1]
+
+    def tearDown(self):
+        asyncio.run(resources.aclose_resources())
+        for p in reversed(self.patches):
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_components_share_one_pipeline_and_client(self):
+        # Act
+        first = resources.get_rag_pipeline()
+        second = resources.get_rag_pipeline()
+
+        # Assert
+        self.assertIs(first, second)
+        self.assertIs(first.embeddings, resources.get_embeddings())
+        self.MockEmbeddings.assert_called_once()
+
+    def test_embedding_client_uses_pooled_http_clients(self):
+        resources.get_embeddings()
+
+        kwargs = self.MockEmbeddings.call_args.kwargs
+        self.assertIs(kwargs["http_client"], resources.get_http_client())
+        self.assertIs(kwargs["http_async_client"], resources.get_async_http_client())
+
+    def test_close_releases_clients(self):
+        client = resources.get_http_client()
+
+        # Act
+        asyncio.run(resources.aclose_resources())
+
+        # Assert - closed, and the next caller gets a fresh one
+        self.assertTrue(client.is_closed)
+        self.assertIsNot(resources.get_http_client(), client)
+
+    def test_tool_factory_uses_the_shared_pipeline(self):
+        from src.agent.tools.tool_factory import ToolFactory
+
+        self.assertIs(ToolFactory().rag, resources.get_rag_pipeline())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from src.rag.segment_store import SegmentStore
+
+class TestSegmentStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SegmentStore(os.path.join(self.tmp.name, "faiss_index"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_empty_store_has_no_base(self):
+        self.assertIsNone(self.store.base_path())
+        self.assertEqual(self.store.segment_count(), 0)
+
+    def test_legacy_layout_is_read_as_base(self):
+        os.makedirs(self.store.root)
+        (self.store.root / "index.faiss").write_bytes(b"")
+
+        self.assertEqual(self.store.base_path(), str(self.store.root / "."))
+
+    def test_append_and_read_segment(self):
+        vectors = np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+
+        # Act
+        name = self.store.append_segment(["a", "b"], vectors, [{"page": 1}, {"page": 2}], ["id-a", "id-b"])
+        texts, read_vectors, metadatas, ids = self.store.read_segment(name)
+
+        # Assert
+        self.assertEqual(self.store.read_manifest()["segments"], [name])
+        self.assertEqual(texts, ["a", "b"])
+        np.testing.assert_array_equal(read_vectors, vectors)
+        self.assertEqual(metadatas, [{"page": 1}, {"page": 2}])
+        self.assertEqual(ids, ["id-a", "id-b"])
+
+    def test_commit_base_retires_merged_segments(self):
+        base, _ = self.store.reserve_base()
+        self.store.commit_base(base)
+        seg1 = self.store.append_segment(["a"], np.zeros((1, 2)), [{}], ["1"])
+        seg2 = self.store.append_segment(["b"], np.zeros((1, 2)), [{}], ["2"])
+
+        # Act - compaction merged seg1 only; seg2 arrived afterwards
+        new_base, _ = self.store.reserve_base()
+        committed = self.store.commit_base(new_base, merged_segments=[seg1], expected_base=base)
+
+        # Assert
+        manifest = self.store.read_manifest()
+        self.assertTrue(committed)
+        self.assertEqual(manifest["base"], new_base)
+        self.assertEqual(manifest["segments"], [seg2])
+        self.assertEqual(set(manifest["retired"]), {seg1, base})
+        # Retired directories survive until the next commit
+        self.assertTrue((self.store.root / seg1).exists())
+
+    def test_commit_base_abandoned_if_base_changed(self):
+        base, _ = self.store.reserve_base()
+        self.store.commit_base(base)
+        stale, stale_path = self.store.reserve_base()
+        rebuilt, _ = self.store.reserve_base()
+        self.store.commit_base(rebuilt)
+
+        committed = self.store.commit_base(stale, merged_segments=[], expected_base=base)
+
+        self.assertFalse(committed)
+        self.assertEqual(self.store.read_manifest()["base"], rebuilt)
+        self.assertFalse(os.path.exists(stale_path))
+    def test_deleted_ids_kept_until_merged(self):
+        base, _ = self.store.reserve_base()
+        self.store.commit_base(base)
+        self.store.delete_chunks(["1", "2"])
+
+        # Act - a compaction that had only seen "1" deleted
+        new_base, _ = self.store.reserve_base()
+        self.store.commit_base(new_base, merged_segments=[], expected_base=base, removed_ids=["1"])
+
+        # Assert
+        self.assertEqual(self.store.read_manifest()["deleted"], ["2"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,302 @@
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+from src.api import server
+from src.api.jobs import IngestJobManager
+from src.api.agent_initializer import AgentInitializer
+from src.api.circuit_breaker import CircuitBreaker
+from src.utils.metrics import record_stage
+
+def parse_sse(body: str):
+    """Splits an SSE body into (event, data) pairs."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+class TestChatStream(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(server.app)
+        self.agent = MagicMock()
+
+    def test_stream_sends_sources_tokens_done(self):
+        async def fake_stream(question, session_id):
+            yield {"type": "sources", "sources": [{"source": "ml.pdf", "page": 1}]}
+            yield {"type": "token", "content": "Hello"}
+            yield {"type": "token", "content": " world"}
+            yield {"type": "context", "context_tokens": 40, "tokens_saved": 25}
+
+        self.agent.astream_answer = fake_stream
+
+        with patch.object(server, "tutor_agent", self.agent):
+            response = self.client.post("/chat/stream", json={"message": "hi"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        self.assertEqual(parse_sse(response.text), [
+            ("sources", {"sources": [{"source": "ml.pdf", "page": 1}]}),
+            ("token", {"content": "Hello"}),
+            ("token", {"content": " world"}),
+            ("context", {"context_tokens": 40, "tokens_saved": 25}),
+            ("done", {"mode": "ai"}),
+        ])
+
+    def test_chat_reports_context_tokens(self):
+        async def fake_aask(question, session_id, details):
+            details.update({"context_tokens": 40, "tokens_saved": 25})
+            return "Hello"
+
+        self.agent.aask = fake_aask
+
+        with patch.object(server, "tutor_agent", self.agent):
+            body = self.client.post("/chat", json={"message": "hi"}).json()
+
+        self.assertEqual(body["mode"], "ai")
+        self.assertEqual(body["context"]["tokens_saved"], 25)
+
+    def test_chat_includes_timings_on_request(self):
+        async def fake_aask(question, session_id, details):
+            record_stage("retrieve", 0.002)
+            return "Hello"
+
+        self.agent.aask = fake_aask
+
+        with patch.object(server, "tutor_agent", self.agent):
+            timed = self.client.post("/chat", json={"message": "hi", "include_timings": True}).json()
+            plain = self.client.post("/chat", json={"message": "hi"}).json()
+
+        self.assertEqual(timed["timings"]["retrieve"], 2.0)
+        self.assertIn("total", timed["timings"])
+        self.assertIsNone(plain["timings"])
+
+    def test_stream_done_event_includes_timings(self):
+        async def fake_stream(question, session_id):
+            record_stage("retrieve", 0.002)
+            yield {"type": "token", "content": "Hello"}
+
+        self.agent.astream_answer = fake_stream
+
+        with patch.object(server, "tutor_agent", self.agent):
+            response = self.client.post("/chat/stream", json={"message": "hi", "include_timings": True})
+
+        event, data = parse_sse(response.text)[-1]
+        self.assertEqual(event, "done")
+        self.assertEqual(data["timings"]["retrieve"], 2.0)
+
+    def test_stream_quota_error_falls_back_to_documents(self):
+        async def failing_stream(question, session_id):
+            raise Exception("Error code: 429 - quota exceeded")
+            yield  # pragma: no cover
+
+        self.agent.astream_answer = failing_stream
+        self.agent.asearch_documents = AsyncMock(return_value="Doc result")
+
+        with patch.object(server, "tutor_agent", self.agent):
+            response = self.client.post("/chat/stream", json={"message": "hi"})
+
+        self.assertEqual(parse_sse(response.text), [
+            ("token", {"content": "Doc result"}),
+            ("done", {"mode": "document_only"}),
+        ])
+
+    def test_stream_not_initialized(self):
+        with patch.object(server, "tutor_agent", None):
+            response = self.client.post("/chat/stream", json={"message": "hi"})
+
+        self.assertEqual(response.status_code, 503)
+
+class TestHealth(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(server.app)
+        self.initializer = AgentInitializer(build=MagicMock(), on_ready=MagicMock())
+        self.initializer.state = "retrying"
+        self.initializer.error = "ValueError: Index not found. Please run ingestion first."
+
+    def test_starting_server_is_live_but_not_ready(self):
+        with patch.object(server, "tutor_agent", None), \
+                patch.object(server, "agent_initializer", self.initializer):
+            live = self.client.get("/health/live")
+            ready = self.client.get("/health/ready")
+            chat = self.client.post("/chat", json={"message": "hi"})
+
+        self.assertEqual(live.status_code, 200)
+        self.assertEqual(ready.status_code, 503)
+        self.assertEqual(ready.json()["state"], "retrying")
+        self.assertEqual(chat.status_code, 503)
+        self.assertEqual(chat.headers["retry-after"], "5")
+
+    def test_ready_once_agent_is_set(self):
+        agent = MagicMock(answer_cache=None, reranker=None)
+
+        with patch.object(server, "tutor_agent", agent):
+            ready = self.client.get("/health/ready")
+
+        self.assertEqual(ready.status_code, 200)
+        self.assertEqual(ready.json(), {"status": "ready"})
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(server.app)
+
+    def test_metrics_exposes_stage_latencies_and_cache_hit_rates(self):
+        agent = MagicMock(answer_cache=None)
+        agent.aask = AsyncMock(return_value="Hello")
+        agent.rag.embeddings.stats.return_value = {"hit_rate": 0.75}
+        agent.rag.embeddings.query_cache.stats.return_value = {"hit_rate": 0.5}
+        agent.rag.handle.snapshot.return_value.ntotal = 42
+        record_stage("retrieve", 0.01)
+
+        with patch.object(server, "tutor_agent", agent):
+            self.client.post("/chat", json={"message": "hi"})
+            response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn('tutor_stage_duration_seconds_count{stage="retrieve"}', response.text)
+        self.assertIn('tutor_request_duration_seconds_count{endpoint="/chat",mode="ai"}', response.text)
+        self.assertIn('tutor_cache_hit_ratio{cache="embedding"} 0.75', response.text)
+        self.assertIn("tutor_index_chunks 42", response.text)
+
+    def test_metrics_while_agent_is_starting(self):
+        with patch.object(server, "tutor_agent", None):
+            response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("tutor_cache_hit_ratio{", response.text)
+
+class TestProviderCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(server.app)
+        self.agent = MagicMock()
+        self.agent.aask = AsyncMock(side_effect=Exception("Error code: 429 - quota exceeded"))
+        self.agent.asearch_documents = AsyncMock(return_value="Doc result")
+        self.breaker = CircuitBreaker(failure_threshold=2, retry_seconds=60)
+
+    def test_failing_provider_is_skipped_once_circuit_opens(self):
+        with patch.object(server, "tutor_agent", self.agent), \
+                patch.object(server, "provider_breaker", self.breaker):
+            # Act
+            responses = [self.client.post("/chat", json={"message": "hi"}).json() for _ in range(4)]
+
+        # Assert - every request answered offline; the provider is only tried twice
+        self.assertEqual([r["mode"] for r in responses], ["document_only"] * 4)
+        self.assertEqual(self.agent.aask.await_count, 2)
+        self.assertEqual(self.breaker.stats()["short_circuited"], 2)
+
+    def test_open_circuit_streams_documents(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        with patch.object(server, "tutor_agent", self.agent), \
+                patch.object(server, "provider_breaker", self.breaker):
+            response = self.client.post("/chat/stream", json={"message": "hi"})
+
+        self.assertEqual(parse_sse(response.text)[-1], ("done", {"mode": "document_only"}))
+
+class TestUpload(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(server.app)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.jobs = IngestJobManager(max_workers=1)
+
+    def tearDown(self):
+        self.jobs.shutdown()
+        self.tmp.cleanup()
+
+    def upload(self, content=b"%PDF-1.4 fake", name="notes.pdf"):
+        return self.client.post("/upload", files={"file": (name, content, "application/pdf")})
+
+    def test_upload_returns_job_and_ingests_in_background(self):
+        with patch.object(server.config, "RAW_PDFS_DIR", self.tmp.name), \
+                patch.object(server, "ingest_jobs", self.jobs), \
+                patch.object(server, "tutor_agent", MagicMock()), \
+                patch.object(server, "ingest_single_file", return_value=True) as mock_ingest:
+            response = self.upload()
+            self.jobs.shutdown(wait=True)
+            status = self.client.get(f"/jobs/{response.json()['job_id']}").json()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(response.json()["deduplicated"])
+        self.assertEqual(status["status"], "completed")
+        mock_ingest.assert_called_once()
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, "notes.pdf")))
+
+    def test_duplicate_upload_is_deduplicated(self):
+        release = threading.Event()
+
+        def ingest(path, progress=None, content_hash=None):
+            release.wait(5)
+            return True
+
+        with patch.object(server.config, "RAW_PDFS_DIR", self.tmp.name), \
+                patch.object(server, "ingest_jobs", self.jobs), \
+                patch.object(server, "tutor_agent", MagicMock()), \
+                patch.object(server, "ingest_single_file", side_effect=ingest) as mock_ingest:
+            first = self.upload()
+            second = self.upload()
+            release.set()
+            self.jobs.shutdown(wait=True)
+
+        self.assertTrue(second.json()["deduplicated"])
+        self.assertEqual(first.json()["job_id"], second.json()["job_id"])
+        mock_ingest.assert_called_once()
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, ".uploads")), [])
+
+    def test_same_name_uploads_each_ingest_their_own_content(self):
+        ingested = []
+
+        def ingest(path, progress=None, content_hash=None):
+            with open(path, "rb") as f:
+                ingested.append((hashlib.sha256(f.read()).hexdigest(), content_hash))
+            return True
+
+        with patch.object(server.config, "RAW_PDFS_DIR", self.tmp.name), \
+                patch.object(server, "ingest_jobs", IngestJobManager(max_workers=2)) as jobs, \
+                patch.object(server, "tutor_agent", MagicMock()), \
+                patch.object(server, "ingest_single_file", side_effect=ingest):
+            self.upload(content=b"%PDF-1.4 version one")
+            self.upload(content=b"%PDF-1.4 version two")
+            jobs.shutdown(wait=True)
+
+        self.assertEqual(len(ingested), 2)
+        for read_hash, content_hash in ingested:
+            self.assertEqual(read_hash, content_hash)
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, ".uploads")), [])
+
+    def test_reverting_to_an_earlier_version_is_ingested(self):
+        with patch.object(server.config, "RAW_PDFS_DIR", self.tmp.name), \
+                patch.object(server, "ingest_jobs", IngestJobManager(max_workers=1)) as jobs, \
+                patch.object(server, "tutor_agent", MagicMock()), \
+                patch.object(server, "ingest_single_file", return_value=True) as mock_ingest:
+            for content in (b"%PDF-1.4 v1", b"%PDF-1.4 v2", b"%PDF-1.4 v1"):
+                response = self.upload(content=content)
+                while jobs.get(response.json()["job_id"]).finished_at is None:
+                    time.sleep(0.01)
+            jobs.shutdown(wait=True)
+
+        # Assert
+        self.assertFalse(response.json()["deduplicated"])
+        self.assertEqual(mock_ingest.call_count, 3)
+        with open(os.path.join(self.tmp.name, "notes.pdf"), "rb") as f:
+            self.assertEqual(f.read(), b"%PDF-1.4 v1")
+
+    def test_upload_rejects_non_pdf(self):
+        response = self.upload(name="notes.txt")
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_job(self):
+        response = self.client.get("/jobs/does-not-exist")
+
+        self.assertEqual(response.status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
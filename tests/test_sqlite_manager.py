@@ -0,0 +1,160 @@
+
+import unittest
+import os
+import sqlite3
+import tempfile
+import time
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from src.memory.sqlite_manager import SQLiteHistoryManager, latest_turns
+
+class TestSQLiteHistoryManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "sessions.db")
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            manager.close()
+        self.tmp.cleanup()
+
+    def make_manager(self, **kwargs):
+        kwargs.setdefault("flush_interval", 0.01)
+        manager = SQLiteHistoryManager(self.db_path, **kwargs)
+        self.managers.append(manager)
+        return manager
+
+    def test_history_visible_before_flush(self):
+        manager = self.make_manager()
+        history = manager.get_session_history("s1")
+
+        history.add_messages([HumanMessage(content="Hi"), AIMessage(content="Hello")])
+
+        self.assertEqual([m.content for m in history.messages], ["Hi", "Hello"])
+
+    def test_shared_between_workers_and_survives_restart(self):
+        worker_1 = self.make_manager()
+        worker_2 = self.make_manager()
+
+        # Act - worker 1 answers the first question, worker 2 the follow-up
+        worker_1.get_session_history("s1").add_messages([HumanMessage(content="Q1"), AIMessage(content="A1")])
+        worker_1.flush()
+        worker_2.get_session_history("s1").add_messages([HumanMessage(content="Q2"), AIMessage(content="A2")])
+        worker_2.close()
+        restarted = self.make_manager()
+
+        # Assert
+        expected = ["Q1", "A1", "Q2", "A2"]
+        self.assertEqual([m.content for m in worker_1.get_session_history("s1").messages], expected)
+        self.assertEqual([m.content for m in restarted.get_session_history("s1").messages], expected)
+        self.assertIsInstance(restarted.get_session_history("s1").messages[1], AIMessage)
+
+    def test_cached_reads_only_fetch_new_rows(self):
+        manager = self.make_manager()
+        history = manager.get_session_history("s1")
+        history.add_messages([HumanMessage(content="Q1")])
+        manager.flush()
+
+        history.messages
+        history.messages
+
+        stats = manager.stats()
+        self.assertEqual(stats["cache_misses"], 1)
+        self.assertEqual(stats["cache_hits"], 1)
+        self.assertEqual(stats["sessions"], 1)
+
+    def test_writes_are_batched(self):
+        # Long enough that the background writer does not flush first
+        manager = self.make_manager(flush_interval=0.5)
+        for i in range(5):
+            manager.get_session_history(f"s{i}").add_messages([HumanMessage(content="Q")])
+
+        manager.flush()
+
+        self.assertEqual(manager.stats()["flushes"], 1)
+        self.assertEqual(manager.stats()["rows_written"], 5)
+
+    def test_clear_deletes_session(self):
+        manager = self.make_manager()
+        history = manager.get_session_history("s1")
+        history.add_messages([HumanMessage(content="Q1")])
+        manager.flush()
+
+        history.clear()
+
+        self.assertEqual(history.messages, [])
+        self.assertEqual(manager.stats()["sessions"], 0)
+
+    def test_cache_keeps_only_the_budget_window(self):
+        manager = self.make_manager(session_token_budget=60)
+        history = manager.get_session_history("s1")
+        for i in range(10):
+            history.add_messages([HumanMessage(content=f"question {i} " + "word " * 20), AIMessage(content=f"answer {i}")])
+            manager.flush()
+            history.messages
+
+        cached = manager._cache["s1"].persisted
+
+        self.assertEqual(cached, history.messages)
+        self.assertEqual(cached[-1].content, "answer 9")
+        self.assertLess(len(cached), 20)
+
+    def test_idle_sessions_leave_the_cache(self):
+        manager = self.make_manager(ttl_seconds=60)
+        manager.get_session_history("s1").add_messages([HumanMessage(content="Q1")])
+        manager.flush()
+        manager.get_session_history("s1").messages
+
+        # Act
+        manager._cache["s1"].last_used = time.monotonic() - 120
+        stats = manager.stats()
+
+        # Assert - the history is still in the database
+        self.assertEqual(stats["cached_sessions"], 0)
+        self.assertEqual(stats["cache_expired"], 1)
+        self.assertEqual([m.content for m in manager.get_session_history("s1").messages], ["Q1"])
+
+    def test_sessions_counted_for_databases_from_before_the_sessions_table(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+                "created_at REAL NOT NULL, message TEXT NOT NULL)"
+            )
+            conn.executemany(
+                "INSERT INTO messages (session_id, created_at, message) VALUES (?, 0, '{}')",
+                [("s1",), ("s1",), ("s2",)],
+            )
+        conn.close()
+
+        manager = self.make_manager()
+
+        self.assertEqual(manager.stats()["sessions"], 2)
+
+    def test_latest_turns_respects_budget(self):
+        messages = []
+        for i in range(4):
+            messages += [HumanMessage(content=f"question {i} " + "word " * 20), AIMessage(content=f"answer {i}")]
+
+        window = latest_turns(messages, max_tokens=60)
+
+        self.assertEqual(window[-1].content, "answer 3")
+        self.assertIsInstance(window[0], HumanMessage)
+        self.assertLess(len(window), len(messages))
+
+    def test_latest_turns_takes_the_longest_window_that_fits(self):
+        messages = []
+        for i in range(6):
+            messages += [HumanMessage(content=f"question {i} " + "word " * i), AIMessage(content=f"answer {i}")]
+
+        for budget in range(1, 120, 7):
+            window = latest_turns(messages, max_tokens=budget)
+
+            # Every longer whole-turn window is over budget
+            start = len(messages) - len(window)
+            self.assertIsInstance(window[0], HumanMessage)
+            self.assertTrue(start == 0 or count_tokens_approximately(messages[start - 2:]) > budget)
+            self.assertTrue(len(window) == 2 or count_tokens_approximately(window) <= budget)
+
+if __name__ == "__main__":
+    unittest.main()
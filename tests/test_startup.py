@@ -0,0 +1,57 @@
+
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed once an agent/index is built or a PDF is parsed, never at import
+HEAVY_MODULES = {"openai", "langchain_openai", "langchain_community", "faiss", "pymupdf", "fitz", "sklearn", "tiktoken"}
+
+def import_times(module: str):
+    """Runs `python -X importtime -c "import <module>"`; returns ({module: cumulative us}, stdout)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times, result.stdout
+
+class TestStartupImports(unittest.TestCase):
+    def assert_no_heavy_imports(self, module: str):
+        times, _ = import_times(module)
+        loaded = {name for name in times if name.split(".")[0] in HEAVY_MODULES}
+
+        self.assertIn(module, times)
+        self.assertEqual(loaded, set(), f"importing {module} took {times[module] / 1000:.0f} ms")
+
+    def test_server_import_defers_heavy_dependencies(self):
+        self.assert_no_heavy_imports("src.api.server")
+
+    def test_cli_ingest_import_defers_heavy_dependencies(self):
+        self.assert_no_heavy_imports("src.ingest")
+
+    def test_settings_import_has_no_side_effects(self):
+        times, stdout = import_times("src.config.settings")
+
+        # Nothing printed and .env not read until a setting is used
+        self.assertEqual(stdout, "")
+        self.assertNotIn("dotenv", times)
+
+    def test_settings_read_environment_on_first_use(self):
+        env = {**os.environ, "INGEST_BATCH_SIZE": "7", "RERANK_ENABLED": "false"}
+        result = subprocess.run(
+            [sys.executable, "-c", "from src.config.settings import config; print(config.INGEST_BATCH_SIZE, config.RERANK_ENABLED)"],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        )
+
+        self.assertEqual(result.stdout.strip(), "7 False")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+
+import unittest
+from unittest.mock import patch
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from src.rag.store_handle import VectorStoreHandle, get_store_handle, merge_flat_stores
+
+def make_store(texts, vectors):
+    store = FAISS(None, faiss.IndexFlatL2(2), InMemoryDocstore(), {})
+    store.add_embeddings(zip(texts, np.asarray(vectors, dtype=np.float32)))
+    return store
+
+class TestVectorStoreHandle(unittest.TestCase):
+    def setUp(self):
+        self.handle = VectorStoreHandle(max_deltas=2)
+        self.handle.publish(make_store(["origin", "far"], [[0, 0], [10, 10]]))
+
+    def test_search_merges_base_and_deltas(self):
+        self.handle.append(make_store(["near"], [[1, 1]]))
+
+        # Act
+        docs = self.handle.snapshot().search([[1, 1]], k=2)[0]
+
+        # Assert - ordered by distance across both stores
+        self.assertEqual([d.page_content for d in docs], ["near", "origin"])
+
+    def test_snapshot_is_immutable(self):
+        before = self.handle.snapshot()
+
+        self.handle.append(make_store(["near"], [[1, 1]]))
+
+        self.assertEqual(before.ntotal, 2)
+        self.assertEqual(self.handle.snapshot().ntotal, 3)
+        self.assertGreater(self.handle.snapshot().generation, before.generation)
+
+    def test_deltas_are_merged_past_limit(self):
+        for i in range(3):
+            self.handle.append(make_store([f"delta {i}"], [[i, i]]))
+
+        snapshot = self.handle.snapshot()
+
+        self.assertEqual(len(snapshot.stores), 2)  # base + one merged delta
+        self.assertEqual(snapshot.ntotal, 5)
+
+    def test_deltas_are_merged_outside_the_lock(self):
+        for i in range(2):
+            self.handle.append(make_store([f"delta {i}"], [[i, i]]))
+        held = []
+
+        def merge(embeddings, stores):
+            held.append(self.handle._lock.locked())
+            return merge_flat_stores(embeddings, stores)
+
+        with patch("src.rag.store_handle.merge_flat_stores", side_effect=merge):
+            self.handle.append(make_store(["delta 2"], [[2, 2]]))
+
+        self.assertEqual(held, [False])
+        self.assertEqual(self.handle.snapshot().ntotal, 5)
+
+    def test_merging_leaves_older_snapshots_intact(self):
+        for i in range(2):
+            self.handle.append(make_store([f"delta {i}"], [[i, i]]))
+        before = self.handle.snapshot()
+
+        self.handle.append(make_store(["delta 2"], [[2, 2]]))
+
+        self.assertEqual(before.ntotal, 4)
+        self.assertEqual([d.page_content for d in before.search([[1, 1]], k=1)[0]], ["delta 1"])
+
+    def test_update_is_not_lost_to_a_concurrent_one(self):
+        for i in range(2):
+            self.handle.append(make_store([f"delta {i}"], [[i, i]]))
+
+        def merge(embeddings, stores):
+            if not merged:
+                # Another upload lands while this one is merging
+                merged.append(True)
+                self.handle.update(deleted=["some-id"])
+            return merge_flat_stores(embeddings, stores)
+
+        merged = []
+        with patch("src.rag.store_handle.merge_flat_stores", side_effect=merge):
+            self.handle.append(make_store(["delta 2"], [[2, 2]]))
+
+        snapshot = self.handle.snapshot()
+        self.assertEqual(snapshot.deleted, {"some-id"})
+        self.assertEqual(snapshot.ntotal, 5)
+
+    def test_append_without_loaded_index(self):
+        handle = VectorStoreHandle()
+
+        self.assertFalse(handle.append(make_store(["x"], [[0, 0]])))
+        self.assertIsNone(handle.snapshot())
+
+    def test_publish_replaces_deltas(self):
+        self.handle.append(make_store(["near"], [[1, 1]]))
+
+        self.handle.publish(make_store(["rebuilt"], [[0, 0]]))
+
+        self.assertEqual(self.handle.snapshot().ntotal, 1)
+
+    def test_deleted_chunks_are_not_returned(self):
+        self.handle.append(make_store(["near"], [[1, 1]]))
+        near_id = self.handle.snapshot().search([[1, 1]], k=1)[0][0].id
+
+        # Act
+        self.handle.update(deleted=[near_id])
+        docs = self.handle.snapshot().search([[1, 1]], k=2)[0]
+
+        # Assert - still k results, from the chunks that remain
+        self.assertEqual([d.page_content for d in docs], ["origin", "far"])
+        self.assertEqual(self.handle.snapshot().deleted, {near_id})
+
+    def test_deleted_chunks_do_not_widen_every_search(self):
+        crowd = make_store(["crowd live"] + [f"crowd {i}" for i in range(20)], [[4, 4]] + [[5 + i * 0.01, 5] for i in range(20)])
+        self.handle.append(crowd)
+        self.handle.update(deleted=[crowd.docstore.search(crowd.index_to_docstore_id[i]).id for i in range(1, 21)])
+        snapshot = self.handle.snapshot()
+        fetches = []
+        search = crowd.index.search
+        crowd.index.search = lambda x, k: fetches.append(k) or search(x, k)
+
+        # Act
+        near_origin = snapshot.search([[0, 0]], k=1)[0]
+        near_crowd = snapshot.search([[5, 5]], k=1)[0]
+
+        # Assert - a query away from the deleted chunks fetches k once; one among them fetches in rounds
+        self.assertEqual([d.page_content for d in near_origin], ["origin"])
+        self.assertEqual([d.page_content for d in near_crowd], ["crowd live"])
+        self.assertEqual(fetches, [1, 1, 2, 4, 8, 16, 32])
+
+    def test_keyword_search_skips_deleted_chunks(self):
+        crowd = make_store([f"origin copy {i}" for i in range(20)], [[0, 0]] * 20)
+        self.handle.append(crowd)
+        self.handle.update(deleted=[crowd.docstore.search(crowd.index_to_docstore_id[i]).id for i in range(20)])
+        snapshot = self.handle.snapshot()
+
+        docs = snapshot.keyword_search(self.handle.lexical_index(snapshot), "origin", 1)
+
+        self.assertEqual([d.page_content for d in docs], ["origin"])
+
+    def test_lexical_index_keeps_references_not_documents(self):
+        self.handle.append(make_store(["near origin"], [[1, 1]]))
+        snapshot = self.handle.snapshot()
+
+        lexical = self.handle.lexical_index(snapshot)
+
+        self.assertEqual([position for _, position in lexical.docs], [0, 1, 0])
+        self.assertEqual([d.page_content for d in snapshot.keyword_search(lexical, "origin", 2)], ["origin", "near origin"])
+
+    def test_get_store_handle_is_shared(self):
+        self.assertIs(get_store_handle("/tmp/index-a"), get_store_handle("/tmp/index-a"))
+        self.assertIsNot(get_store_handle("/tmp/index-a"), get_store_handle("/tmp/index-b"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,7 @@ from src.agent.tools.tool_factory import ToolFactory
 from langchain_core.tools import Tool
 
 class TestToolFactory(unittest.TestCase):
-    @patch("src.agent.tools.tool_factory.RAGPipeline")
+    @patch("src.agent.tools.tool_factory.get_rag_pipeline")
     def test_create_tools(self, MockRAG):
         # Arrange
         mock_rag_instance = MockRAG.return_value
@@ -0,0 +1,278 @@
+
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from src.agent.context_packer import approximate_tokens
+from src.agent.tutor import TutorAgent
+from src.config.settings import config
+from src.memory.memory_manager import InMemoryHistoryManager
+from src.utils.metrics import start_trace
+
+def question_vector(question):
+    """Fake query embedding: questions with the same words get the same vector."""
+    words = set(question.lower().strip("?").split())
+    return [float(w in words) for w in ("types", "learning", "supervised", "trees")]
+
+def make_agent(responses=None, docs=None):
+    """Builds a TutorAgent with a fake LLM and a mocked retriever."""
+    docs = docs if docs is not None else [Document(page_content="Supervised learning uses labels.", metadata={"source": "ml.pdf"})]
+    retriever = MagicMock()
+    retriever.invoke.return_value = docs
+    retriever.ainvoke = AsyncMock(return_value=docs)
+
+    with patch("langchain_openai.ChatOpenAI") as MockLLM, patch("src.agent.tutor.get_rag_pipeline") as MockRAG, \
+            patch("src.agent.tutor.tiktoken_counter", return_value=approximate_tokens):
+        MockLLM.return_value = FakeListChatModel(responses=responses or ["An answer."])
+        rag = MockRAG.return_value
+        rag.get_retriever.return_value = retriever
+        rag.search_many.side_effect = lambda queries, k: [docs for _ in queries]
+        rag.asearch_many = AsyncMock(side_effect=lambda queries, k: [docs for _ in queries])
+        rag.keyword_search_many.side_effect = lambda queries, k: [docs for _ in queries]
+        rag.local.hybrid_search_many.side_effect = lambda queries, k: [docs for _ in queries]
+        rag.embeddings.embed_query.side_effect = question_vector
+        rag.embeddings.aembed_query = AsyncMock(side_effect=question_vector)
+        rag.handle.snapshot.return_value.generation = 1
+        agent = TutorAgent(memory_manager=InMemoryHistoryManager())
+    return agent, retriever
+
+class TestTutorAgentAsync(unittest.IsolatedAsyncioTestCase):
+    async def test_aask_uses_async_retriever(self):
+        agent, retriever = make_agent(responses=["Async answer."])
+
+        # Act
+        answer = await agent.aask("What is supervised learning?", session_id="s1")
+
+        # Assert
+        self.assertEqual(answer, "Async answer.")
+        retriever.ainvoke.assert_awaited_once_with("What is supervised learning?")
+        retriever.invoke.assert_not_called()
+
+        # History is written for the session
+        history = agent.memory_manager.get_session_history("s1")
+        self.assertEqual(len(history.messages), 2)
+
+    async def test_asearch_documents_batches_expanded_queries(self):
+        agent, retriever = make_agent()
+
+        # Act
+        with patch.object(config, "DOCUMENT_SEARCH_MODE", "vector"):
+            result = await agent.asearch_documents("What are the types of learning?")
+
+        # Assert - original query plus six variants in a single batched search
+        agent.rag.asearch_many.assert_awaited_once()
+        queries = agent.rag.asearch_many.await_args.args[0]
+        self.assertEqual(len(queries), 7)
+        self.assertIn("ml.pdf", result)
+        retriever.ainvoke.assert_not_called()
+
+    async def test_asearch_documents_offline_by_default(self):
+        agent, retriever = make_agent()
+
+        # Act
+        result = await agent.asearch_documents("What are the types of learning?")
+
+        # Assert - served by the local index, provider embeddings untouched
+        queries = agent.rag.local.hybrid_search_many.call_args.args[0]
+        self.assertEqual(len(queries), 7)
+        self.assertIn("ml.pdf", result)
+        agent.rag.asearch_many.assert_not_called()
+        agent.rag.embeddings.aembed_query.assert_not_called()
+
+    async def test_asearch_documents_keyword_when_local_index_missing(self):
+        agent, _ = make_agent()
+        agent.rag.local.hybrid_search_many.side_effect = ValueError("Index not found")
+
+        result = await agent.asearch_documents("What is supervised learning?")
+
+        agent.rag.keyword_search_many.assert_called_once()
+        self.assertIn("ml.pdf", result)
+
+    async def test_asearch_documents_no_results(self):
+        agent, _ = make_agent(docs=[])
+
+        result = await agent.asearch_documents("anything")
+
+        self.assertIn("No relevant information found", result)
+
+    async def test_llm_concurrency_is_bounded(self):
+        with patch.object(config, "LLM_MAX_CONCURRENCY", 2):
+            agent, _ = make_agent()
+
+        state = {"active": 0, "peak": 0}
+
+        async def slow_ainvoke(*args, **kwargs):
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+            return "ok"
+
+        agent.conversational_rag_chain = MagicMock()
+        agent.conversational_rag_chain.ainvoke = slow_ainvoke
+
+        # Act
+        answers = await asyncio.gather(*(agent.aask(f"q{i}", session_id=f"s{i}") for i in range(6)))
+
+        # Assert
+        self.assertEqual(answers, ["ok"] * 6)
+        self.assertEqual(state["peak"], 2)
+
+    async def test_astream_answer_sends_sources_then_tokens(self):
+        agent, retriever = make_agent(responses=["Streamed answer."])
+
+        # Act
+        events = [event async for event in agent.astream_answer("What is supervised learning?", session_id="s1")]
+
+        # Assert
+        self.assertEqual(events[0], {"type": "sources", "sources": [{"source": "ml.pdf", "page": None}]})
+        tokens = [e["content"] for e in events if e["type"] == "token"]
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), "Streamed answer.")
+        self.assertEqual(events[-1]["type"], "context")
+        self.assertEqual(events[-1]["chunks_retrieved"], 1)
+
+        # Retrieval happens once and the full answer lands in history
+        retriever.ainvoke.assert_awaited_once()
+        history = agent.memory_manager.get_session_history("s1")
+        self.assertEqual(history.messages[-1].content, "Streamed answer.")
+
+    async def test_astream_answer_history_only_after_completion(self):
+        agent, _ = make_agent(responses=["A long streamed answer."])
+
+        # Act - consumer goes away after the first token
+        stream = agent.astream_answer("question", session_id="s1")
+        async for event in stream:
+            if event["type"] == "token":
+                break
+        await stream.aclose()
+
+        # Assert
+        self.assertEqual(len(agent.memory_manager.get_session_history("s1").messages), 0)
+
+class TestTutorAgentAnswerCache(unittest.IsolatedAsyncioTestCase):
+    async def test_repeated_question_served_from_cache(self):
+        agent, _ = make_agent(responses=["First answer.", "Second answer."])
+
+        # Act - two students ask the same first-turn question
+        first = await agent.aask("What are the types of learning?", session_id="s1")
+        second = await agent.aask("what are the types of learning", session_id="s2")
+
+        # Assert - no second LLM call, but the turn is still in s2's history
+        self.assertEqual(second, first)
+        self.assertEqual(agent.answer_cache.stats()["hits"], 1)
+        self.assertEqual(agent.memory_manager.get_session_history("s2").messages[-1].content, "First answer.")
+
+    async def test_index_change_invalidates(self):
+        agent, _ = make_agent(responses=["First answer.", "Second answer."])
+        await agent.aask("What are the types of learning?", session_id="s1")
+
+        # Act - an upload published a new index generation
+        agent.rag.handle.snapshot.return_value.generation = 2
+        answer = await agent.aask("What are the types of learning?", session_id="s2")
+
+        self.assertEqual(answer, "Second answer.")
+        self.assertEqual(agent.answer_cache.stats()["invalidations"], 1)
+
+    async def test_follow_up_questions_bypass_cache(self):
+        agent, retriever = make_agent(responses=["First.", "Second.", "Third."])
+        await agent.aask("What are the types of learning?", session_id="s1")
+        await agent.aask("What are the types of learning?", session_id="s2")
+
+        # Act
+        answer = await agent.aask("Can you explain that again?", session_id="s1")
+
+        # Assert
+        self.assertEqual(answer, "Second.")
+        self.assertEqual(agent.answer_cache.stats()["hits"], 1)
+
+    async def test_stream_replays_cached_answer(self):
+        agent, _ = make_agent(responses=["Streamed answer."])
+        await agent.aask("What is supervised learning?", session_id="s1")
+
+        events = [e async for e in agent.astream_answer("What is supervised learning?", session_id="s2")]
+
+        self.assertEqual(events[0]["type"], "sources")
+        self.assertEqual(events[1], {"type": "token", "content": "Streamed answer."})
+
+class TestTutorAgentSync(unittest.TestCase):
+    def test_search_documents_matches_async_formatting(self):
+        agent, retriever = make_agent()
+
+        with patch.object(config, "DOCUMENT_SEARCH_MODE", "vector"):
+            result = agent.search_documents("What is supervised learning?")
+
+        agent.rag.search_many.assert_called_once_with(["What is supervised learning?"], k=12)
+        retriever.invoke.assert_not_called()
+        self.assertIn("Source 1: ml.pdf", result)
+
+    def test_search_documents_keeps_retrieval_order_without_repeats(self):
+        docs = [
+            Document(page_content="Overfitting happens when a model memorises noise.", metadata={"source": "ml.pdf"}),
+            Document(page_content="Overfitting happens when a model memorises noise.", metadata={"source": "ml-copy.pdf"}),
+            Document(page_content="Cooking pasta needs salted water.", metadata={"source": "food.pdf"}),
+        ]
+        agent, _ = make_agent(docs=docs)
+
+        result = agent.search_documents("What is overfitting?")
+
+        self.assertIn("Source 1: ml.pdf", result)
+        self.assertNotIn("ml-copy.pdf", result)
+
+    def test_results_are_deduplicated_by_chunk_id(self):
+        boilerplate = "Lecture notes, Introduction to Machine Learning, Spring term. " * 4
+        trees = Document(id="c1", page_content=boilerplate + "Trees split on features.")
+        kernels = Document(id="c2", page_content=boilerplate + "Kernels map inputs.")
+
+        docs = TutorAgent._dedupe_docs([[trees, kernels], [trees]])
+
+        # Assert - chunks sharing an opening are kept apart; the repeated id is dropped
+        self.assertEqual([doc.id for doc in docs], ["c1", "c2"])
+
+    def test_ask_uses_answer_cache(self):
+        agent, _ = make_agent(responses=["Sync answer.", "Other answer."])
+
+        agent.ask("What is supervised learning?", session_id="s1")
+        answer = agent.ask("What is supervised learning?", session_id="s2")
+
+        self.assertEqual(answer, "Sync answer.")
+
+    def test_warm_up_loads_index_and_local_models(self):
+        agent, _ = make_agent()
+
+        agent.warm_up(embed_query=True)
+
+        agent.rag.warm_up.assert_called_once_with(embed_query=True)
+
+    def test_ask_reports_context_tokens_saved(self):
+        text = "Supervised learning trains a model on labelled examples. " * 4
+        docs = [
+            Document(page_content=text, metadata={"source": "ml.pdf", "page": 1, "start_index": 0}),
+            Document(page_content=text, metadata={"source": "copy.pdf", "page": 3, "start_index": 0}),
+        ]
+        agent, _ = make_agent(docs=docs)
+        details = {}
+
+        # Act
+        agent.ask("What is supervised learning?", session_id="s1", details=details)
+
+        # Assert
+        self.assertEqual(details["chunks_retrieved"], 2)
+        self.assertEqual(details["passages_used"], 1)
+        self.assertGreater(details["tokens_saved"], 0)
+
+class TestTutorAgentTimings(unittest.IsolatedAsyncioTestCase):
+    async def test_aask_records_stage_timings(self):
+        agent, _ = make_agent()
+
+        # Act
+        with start_trace() as timings:
+            await agent.aask("What is supervised learning?", session_id="s1")
+
+        # Assert
+        for name in ("retrieve", "pack_context", "llm"):
+            self.assertIn(name, timings)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,17 +2,53 @@
 import unittest
 from unittest.mock import MagicMock, patch
 import os
+import tempfile
+from pathlib import Path
 from langchain_core.documents import Document
-from src.rag.vector_store import RAGPipeline
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+import faiss
+from src.config.settings import config
+from src.rag.document_registry import DocumentRegistry
+from src.rag.embedding_cache import CachedEmbeddings
+from src.rag.store_handle import SnapshotRetriever
+from src.rag.hybrid_retriever import HybridRetriever
+from src.rag.mapped_store import MappedStore
+from src.rag.vector_store import LegacyIndexError, RAGPipeline, local_pipeline
+
+class KeywordEmbeddings(Embeddings):
+    """Fake provider: one dimension per keyword, so searches are predictable."""
+    KEYWORDS = ["neural", "trees", "regression"]
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[1.0 if kw in t else 0.0 for kw in self.KEYWORDS] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def rag_keyword_hits(retriever, query):
+    snapshot = retriever.handle.snapshot()
+    lexical = retriever.handle.lexical_index(snapshot)
+    return [doc.page_content for doc, _ in lexical.search(query, 5, limit=snapshot.ntotal)]
 
 class TestRAGPipeline(unittest.TestCase):
-    @patch("src.rag.vector_store.GoogleGenerativeAIEmbeddings")
+    @patch("langchain_openai.OpenAIEmbeddings")
     def setUp(self, MockEmbeddings):
-        self.rag = RAGPipeline()
+        # Keep index files out of the real data directory
+        self.tmp = tempfile.TemporaryDirectory()
+        with patch.object(config, "EMBEDDINGS_DIR", Path(self.tmp.name)), \
+                patch.object(config, "LOCAL_INDEX_ENABLED", False):
+            self.rag = RAGPipeline()
+
+    def tearDown(self):
+        self.tmp.cleanup()
 
-    @patch("src.rag.vector_store.FAISS")
-    def test_create_index(self, MockFAISS):
-        # Mock documents
+    def test_create_index(self):
+        self.rag.embeddings = CachedEmbeddings(KeywordEmbeddings(), model_name="fake", cache_dir=self.tmp.name)
         docs = [Document(page_content="Test content")]
         
         # Mock split_documents to return same docs
@@ -21,12 +57,11 @@ class TestRAGPipeline(unittest.TestCase):
         # Act
         self.rag.create_index(docs)
         
-        # Assert - check if FAISS.from_documents was called
-        MockFAISS.from_documents.assert_called_once()
-        
-        # Check if save_local was called on the instance returned by from_documents
-        mock_vector_store = MockFAISS.from_documents.return_value
-        mock_vector_store.save_local.assert_called_once()
+        # Assert - saved without pickles and served memory-mapped from disk
+        base_path = self.rag.segments.base_path()
+        self.assertEqual(sorted(os.listdir(base_path)), ["docs.jsonl", "docs.offsets.npy", "index.faiss"])
+        self.assertIsInstance(self.rag.vector_store, MappedStore)
+        self.assertIs(self.rag.handle.snapshot().base, self.rag.vector_store)
 
     def test_create_index_empty(self):
         # Act
@@ -35,9 +70,10 @@ class TestRAGPipeline(unittest.TestCase):
         # Assert - vector_store should still be None or unchanged from init
         self.assertIsNone(self.rag.vector_store)
 
-    @patch("src.rag.vector_store.FAISS")
+    @patch("src.rag.vector_store.is_mapped_store", return_value=True)
+    @patch("src.rag.vector_store.MappedStore")
     @patch("os.path.exists")
-    def test_load_index_success(self, mock_exists, MockFAISS):
+    def test_load_index_success(self, mock_exists, MockStore, mock_is_mapped):
         mock_exists.return_value = True
         
         # Act
@@ -45,7 +81,7 @@ class TestRAGPipeline(unittest.TestCase):
         
         # Assert
         self.assertTrue(result)
-        MockFAISS.load_local.assert_called_once()
+        MockStore.assert_called_once()
 
     @patch("os.path.exists")
     def test_load_index_failure(self, mock_exists):
@@ -57,17 +93,46 @@ class TestRAGPipeline(unittest.TestCase):
         # Assert
         self.assertFalse(result)
 
-    @patch("src.rag.vector_store.FAISS")
+    @patch("src.rag.vector_store.is_mapped_store", return_value=True)
+    @patch("src.rag.vector_store.MappedStore")
     @patch("os.path.exists")
-    def test_get_retriever_success(self, mock_exists, MockFAISS):
+    def test_get_retriever_success(self, mock_exists, MockStore, mock_is_mapped):
         # Setup - simulate index exists
         mock_exists.return_value = True
         
         # Act
         retriever = self.rag.get_retriever(k=5)
         
-        # Assert
-        MockFAISS.load_local.return_value.as_retriever.assert_called_with(search_kwargs={"k": 5})
+        # Assert - the retriever reads the live snapshot that was loaded
+        MockStore.assert_called_once()
+        self.assertIsInstance(retriever, SnapshotRetriever)
+        self.assertEqual(retriever.k, 5)
+        self.assertIs(self.rag.handle.snapshot().base, MockStore.return_value)
+
+    def test_old_pickled_index_is_not_loaded(self):
+        FAISS.from_texts(["neural networks"], KeywordEmbeddings()).save_local(self.rag.vector_store_path)
+
+        with patch.object(FAISS, "load_local") as mock_load:
+            with self.assertRaisesRegex(LegacyIndexError, "ingest.py"):
+                self.rag.load_index()
+
+        mock_load.assert_not_called()
+
+    def test_no_writes_on_top_of_old_pickled_index(self):
+        FAISS.from_texts(["neural networks"], KeywordEmbeddings()).save_local(self.rag.vector_store_path)
+        self.rag.embeddings = CachedEmbeddings(KeywordEmbeddings(), model_name="fake", cache_dir=self.tmp.name)
+        upload = [Document(page_content="decision trees", metadata={"source": "trees.pdf"})]
+
+        # Act / Assert - uploads fail instead of adding segments that would never be served
+        with self.assertRaises(LegacyIndexError):
+            self.rag.add_documents(upload)
+        with self.assertRaises(LegacyIndexError):
+            self.rag.update_document(upload, "hash")
+        self.assertEqual(self.rag.segments.segment_count(), 0)
+
+        # ...until a full rebuild replaces it
+        self.rag.create_index(upload)
+        self.assertTrue(self.rag.load_index(from_disk=True))
 
     def test_get_retriever_no_index(self):
         # Ensure load_index fails
@@ -77,5 +142,365 @@ class TestRAGPipeline(unittest.TestCase):
         with self.assertRaisesRegex(ValueError, "Index not found"):
             self.rag.get_retriever()
 
+class TestSearchMany(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.provider = KeywordEmbeddings()
+        with patch("langchain_openai.OpenAIEmbeddings"), \
+                patch.object(config, "EMBEDDINGS_DIR", Path(self.tmp.name)):
+            self.rag = RAGPipeline()
+        self.rag.embeddings = CachedEmbeddings(self.provider, model_name="fake", cache_dir=self.tmp.name)
+        texts = ["neural networks", "decision trees", "linear regression"]
+        self.rag.handle.publish(FAISS.from_texts(texts, self.rag.embeddings))
+        self.provider.calls.clear()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_search_many_batches_queries(self):
+        # Act
+        results = self.rag.search_many(["neural", "trees", "regression"], k=1)
+
+        # Assert - one embedding call for all queries, one result list per query
+        self.assertEqual(self.provider.calls, [["neural", "trees", "regression"]])
+        self.assertEqual([r[0].page_content for r in results],
+                         ["neural networks", "decision trees", "linear regression"])
+
+    def test_search_many_reuses_query_cache(self):
+        self.rag.search_many(["neural"], k=1)
+
+        self.rag.search_many(["neural"], k=1)
+
+        self.assertEqual(len(self.provider.calls), 1)
+
+    def test_warm_up_builds_keyword_index_without_provider_calls(self):
+        # Act
+        self.rag.warm_up()
+
+        # Assert
+        snapshot = self.rag.handle.snapshot()
+        self.assertIs(self.rag.handle._lexical[0], snapshot.base)
+        self.assertEqual(self.provider.calls, [])
+
+    def test_search_many_k_larger_than_index(self):
+        results = self.rag.search_many(["neural"], k=10)
+
+        self.assertEqual(len(results[0]), 3)
+
+    def test_create_index_with_hnsw(self):
+        docs = [Document(page_content=t) for t in ["neural networks", "decision trees", "linear regression"]]
+
+        # Act
+        with patch.object(config, "VECTOR_INDEX_TYPE", "hnsw"):
+            self.rag.create_index(docs)
+        results = self.rag.search_many(["trees"], k=1)
+
+        # Assert
+        self.assertIsInstance(self.rag.vector_store.index, faiss.IndexHNSWFlat)
+        self.assertEqual(results[0][0].page_content, "decision trees")
+
+    def test_keyword_search_makes_no_embedding_calls(self):
+        results = self.rag.keyword_search_many(["decision trees", "regression"], k=1)
+
+        self.assertEqual([r[0].page_content for r in results], ["decision trees", "linear regression"])
+        self.assertEqual(self.provider.calls, [])
+
+    def test_hybrid_retriever_fuses_keyword_and_vector_results(self):
+        retriever = self.rag.get_retriever(k=2, mode="hybrid")
+
+        # Act - "linear" is not an embedding keyword, only BM25 can match it
+        results = retriever.invoke("linear trees")
+
+        # Assert
+        self.assertIsInstance(retriever, HybridRetriever)
+        self.assertEqual({d.page_content for d in results}, {"decision trees", "linear regression"})
+
+    def test_keyword_retriever_mode(self):
+        retriever = self.rag.get_retriever(k=1, mode="keyword")
+
+        results = retriever.invoke("linear")
+
+        self.assertEqual(results[0].page_content, "linear regression")
+        self.assertEqual(self.provider.calls, [])
+
+class TestIncrementalSegments(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.provider = KeywordEmbeddings()
+        self.config_patch = patch.object(config, "EMBEDDINGS_DIR", Path(self.tmp.name))
+        self.config_patch.start()
+        self.local_patch = patch.object(config, "LOCAL_INDEX_ENABLED", False)
+        self.local_patch.start()
+
+    def tearDown(self):
+        self.local_patch.stop()
+        self.config_patch.stop()
+        self.tmp.cleanup()
+
+    def make_rag(self):
+        with patch("langchain_openai.OpenAIEmbeddings"):
+            rag = RAGPipeline()
+        rag.embeddings = CachedEmbeddings(self.provider, model_name="fake", cache_dir=self.tmp.name)
+        return rag
+
+    def test_add_documents_appends_segment_without_loading(self):
+        self.make_rag().create_index([Document(page_content="neural networks")])
+        rag = self.make_rag()
+
+        # Act
+        with patch.object(FAISS, "load_local") as mock_load:
+            rag.add_documents([Document(page_content="decision trees")])
+
+        # Assert - nothing was read back or rewritten
+        mock_load.assert_not_called()
+        self.assertEqual(rag.segments.segment_count(), 1)
+
+    def test_load_combines_base_and_segments(self):
+        self.make_rag().create_index([Document(page_content="neural networks")])
+        self.make_rag().add_documents([Document(page_content="decision trees")])
+        self.make_rag().add_documents([Document(page_content="linear regression")])
+
+        # Act - read back from disk as a new process would
+        rag = self.make_rag()
+        rag.load_index(from_disk=True)
+        results = rag.search_many(["trees", "regression"], k=1)
+
+        # Assert - the mapped base plus one delta store per segment
+        self.assertEqual(rag.vector_store.index.ntotal, 1)
+        self.assertEqual(rag.handle.snapshot().ntotal, 3)
+        self.assertEqual([r[0].page_content for r in results], ["decision trees", "linear regression"])
+
+    def test_add_documents_keeps_loaded_store_in_sync(self):
+        self.make_rag().create_index([Document(page_content="neural networks")])
+        rag = self.make_rag()
+        rag.load_index()
+
+        rag.add_documents([Document(page_content="decision trees")])
+
+        self.assertEqual(rag.search_many(["trees"], k=1)[0][0].page_content, "decision trees")
+
+    def test_compact_merges_segments_into_base(self):
+        self.make_rag().create_index([Document(page_content="neural networks")])
+        self.make_rag().add_documents([Document(page_content="decision trees")])
+        rag = self.make_rag()
+
+        # Act
+        compacted = rag.compact()
+
+        # Assert
+        self.assertTrue(compacted)
+        self.assertEqual(rag.segments.segment_count(), 0)
+        fresh = self.make_rag()
+        fresh.load_index(from_disk=True)
+        self.assertEqual(fresh.vector_store.index.ntotal, 2)
+
+    def test_compact_hnsw_base(self):
+        with patch.object(config, "VECTOR_INDEX_TYPE", "hnsw"):
+            self.make_rag().create_index([Document(page_content="neural networks")])
+            self.make_rag().add_documents([Document(page_content="decision trees")])
+
+            # Act
+            self.make_rag().compact()
+            fresh = self.make_rag()
+            fresh.load_index(from_disk=True)
+
+        # Assert
+        self.assertIsInstance(fresh.vector_store.index, faiss.IndexHNSWFlat)
+        self.assertEqual(fresh.handle.snapshot().ntotal, 2)
+        self.assertEqual(fresh.search_many(["trees"], k=1)[0][0].page_content, "decision trees")
+
+    def test_upload_is_visible_to_existing_retriever(self):
+        self.make_rag().create_index([Document(page_content="neural networks")])
+        retriever = self.make_rag().get_retriever(k=1)
+        before = retriever.handle.snapshot()
+        self.assertEqual(rag_keyword_hits(retriever, "trees"), [])  # Keyword index built now, then extended
+
+        # Act - a separate pipeline (as ingest_single_file uses) adds a file
+        with patch.object(FAISS, "load_local") as mock_load:
+            self.make_rag().add_documents([Document(page_content="decision trees")])
+
+        # Assert - no disk reload, new chunk visible, old snapshot untouched
+        mock_load.assert_not_called()
+        self.assertEqual(retriever.invoke("trees")[0].page_content, "decision trees")
+        self.assertEqual(rag_keyword_hits(retriever, "trees"), ["decision trees"])
+        self.assertEqual(before.ntotal, 1)
+        self.assertEqual(retriever.handle.snapshot().ntotal, 2)
+
+    def test_compaction_triggered_after_threshold(self):
+        self.make_rag().create_index([Document(page_content="neural networks")])
+        rag = self.make_rag()
+
+        with patch.object(config, "INDEX_COMPACTION_SEGMENTS", 2), \
+                patch.object(RAGPipeline, "compact_in_background") as mock_compact:
+            rag.add_documents([Document(page_content="decision trees")])
+            mock_compact.assert_not_called()
+            rag.add_documents([Document(page_content="linear regression")])
+            mock_compact.assert_called_once()
+
+def pages(name, texts):
+    return [Document(page_content=text, metadata={"source": f"/pdfs/{name}", "page": i}) for i, text in enumerate(texts)]
+
+class TestDocumentUpdates(unittest.TestCase):
+    """Uploads through update_document(): deduplicated and replaced by content."""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.provider = KeywordEmbeddings()
+        self.patches = [
+            patch.object(config, "EMBEDDINGS_DIR", Path(self.tmp.name)),
+            patch.object(config, "LOCAL_INDEX_ENABLED", False),
+            patch.object(RAGPipeline, "compact_in_background"),
+        ]
+        self.compact_in_background = [p.start() for p in self.patches][-1]
+        self.rag = self.make_rag()
+        self.rag.update_document(pages("notes.pdf", ["neural networks intro", "decision trees intro"]), "v1")
+        self.provider.calls.clear()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        self.tmp.cleanup()
+
+    make_rag = TestIncrementalSegments.make_rag
+
+    def test_identical_upload_is_a_no_op(self):
+        # Act - same content, under another name too
+        results = [
+            self.make_rag().update_document(pages("notes.pdf", ["neural networks intro", "decision trees intro"]), "v1"),
+            self.make_rag().update_document(pages("copy.pdf", ["neural networks intro", "decision trees intro"]), "v1"),
+        ]
+
+        # Assert
+        self.assertEqual([r["status"] for r in results], ["unchanged", "unchanged"])
+        self.assertEqual(self.provider.calls, [])
+        self.assertEqual(self.rag.segments.segment_count(), 0)
+
+    def test_revised_file_replaces_only_changed_chunks(self):
+        # Act
+        result = self.rag.update_document(pages("notes.pdf", ["neural networks intro", "linear regression intro"]), "v2")
+
+        # Assert - one chunk embedded, the replaced one gone from both searches
+        self.assertEqual(result, {"status": "updated", "chunks_added": 1, "chunks_kept": 1,
+                                  "chunks_deleted": 1, "duplicates_skipped": 0})
+        self.assertEqual(self.provider.calls, [["linear regression intro"]])
+        texts = [doc.page_content for doc in self.rag.search_many(["trees"], k=2)[0]]
+        self.assertEqual(sorted(texts), ["linear regression intro", "neural networks intro"])
+        self.assertEqual(self.rag.keyword_search_many(["trees"], k=2), [[]])
+
+        # ...also when read back from disk
+        fresh = self.make_rag()
+        fresh.handle.clear()
+        fresh.load_index(from_disk=True)
+        self.assertNotIn("decision trees intro", [d.page_content for d in fresh.search_many(["trees"], k=3)[0]])
+
+    def test_near_duplicate_chunks_are_skipped(self):
+        text = " ".join(f"word{i}" for i in range(30))
+
+        self.rag.update_document(pages("a.pdf", [text + " trees"]), "a")
+        result = self.rag.update_document(pages("b.pdf", [text + " forests", "linear regression"]), "b")
+
+        # Assert - only the distinct chunk was indexed
+        self.assertEqual(result["chunks_added"], 1)
+        self.assertEqual(result["duplicates_skipped"], 1)
+        self.assertEqual(self.rag.handle.snapshot().ntotal, 4)
+
+    def test_shared_chunk_is_kept_while_referenced(self):
+        self.rag.update_document(pages("other.pdf", ["decision trees intro", "linear regression"]), "other")
+
+        # Act - notes.pdf drops the chunk other.pdf also has
+        result = self.rag.update_document(pages("notes.pdf", ["neural networks intro"]), "v2")
+
+        # Assert
+        self.assertEqual(result["chunks_deleted"], 0)
+        self.assertEqual(self.rag.search_many(["trees"], k=1)[0][0].page_content, "decision trees intro")
+
+    def test_upload_does_not_scan_the_registry(self):
+        self.rag.update_document(pages("other.pdf", ["decision trees intro", "linear regression"]), "other")
+
+        # Act
+        with patch.object(DocumentRegistry, "chunk_ids_by_hash", side_effect=AssertionError("scanned")), \
+                patch.object(DocumentRegistry, "referenced_ids", side_effect=AssertionError("scanned")):
+            result = self.rag.update_document(pages("notes.pdf", ["neural networks intro", "linear regression"]), "v2")
+
+        # Assert - indexed lookups still find the shared and the dropped chunks
+        self.assertEqual(result, {"status": "updated", "chunks_added": 0, "chunks_kept": 1,
+                                  "chunks_deleted": 0, "duplicates_skipped": 1})
+
+    def test_compaction_removes_deleted_chunks(self):
+        self.rag.update_document(pages("notes.pdf", ["neural networks intro", "linear regression intro"]), "v2")
+
+        # Act
+        self.assertTrue(self.rag.compact())
+
+        # Assert
+        fresh = self.make_rag()
+        fresh.handle.clear()
+        fresh.load_index(from_disk=True)
+        self.assertEqual(fresh.vector_store.index.ntotal, 2)
+        self.assertEqual(fresh.handle.snapshot().deleted, frozenset())
+        self.assertEqual(fresh.segments.read_manifest()["deleted"], [])
+
+    def test_compaction_swaps_the_live_snapshot_to_the_new_base(self):
+        self.rag.update_document(pages("notes.pdf", ["neural networks intro", "linear regression intro"]), "v2")
+        self.rag.keyword_search_many(["trees"], k=1)
+        before = self.rag.handle.snapshot()
+
+        # Act
+        self.assertTrue(self.rag.compact())
+
+        # Assert - one memory-mapped store, no tombstones, same results
+        snapshot = self.rag.handle.snapshot()
+        self.assertEqual((len(before.stores), len(before.deleted)), (2, 1))
+        self.assertEqual((len(snapshot.stores), snapshot.deleted, snapshot.ntotal), (1, frozenset(), 2))
+        self.assertIsInstance(snapshot.base, MappedStore)
+        self.assertTrue(self.rag.handle.has_lexical_index())
+        texts = [doc.page_content for doc in self.rag.search_many(["trees"], k=2)[0]]
+        self.assertEqual(sorted(texts), ["linear regression intro", "neural networks intro"])
+
+    def test_compaction_triggered_by_deleted_fraction(self):
+        self.rag.update_document(pages("notes.pdf", ["neural networks intro", "linear regression intro"]), "v2")
+
+        self.compact_in_background.assert_called_once()
+
+class TestLocalIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.provider = KeywordEmbeddings()
+        self.config_patch = patch.object(config, "EMBEDDINGS_DIR", Path(self.tmp.name))
+        self.config_patch.start()
+
+    def tearDown(self):
+        self.config_patch.stop()
+        self.tmp.cleanup()
+
+    def make_rag(self):
+        with patch("langchain_openai.OpenAIEmbeddings"):
+            rag = RAGPipeline()
+        rag.embeddings = CachedEmbeddings(self.provider, model_name="fake", cache_dir=self.tmp.name)
+        return rag
+
+    def test_local_index_mirrors_create_and_add(self):
+        rag = self.make_rag()
+        rag.create_index([Document(page_content="Gradient boosting combines weak learners.")])
+        rag.add_documents([Document(page_content="Convolutional networks process images.")])
+        self.provider.calls.clear()
+
+        # Act - a fresh local pipeline, as the offline fallback would use
+        local = local_pipeline()
+        local.load_index(from_disk=True)
+        results = local.search_many(["convolutional image networks"], k=1)
+
+        # Assert - found through the local index without the provider
+        self.assertEqual(results[0][0].page_content, "Convolutional networks process images.")
+        self.assertEqual(local.handle.snapshot().ntotal, 2)
+        self.assertEqual(self.provider.calls, [])
+
+    def test_local_index_failure_does_not_fail_ingest(self):
+        rag = self.make_rag()
+
+        with patch.object(rag.local, "create_index", side_effect=RuntimeError("disk full")):
+            rag.create_index([Document(page_content="neural networks")])
+
+        self.assertIsNotNone(rag.handle.snapshot())
+
 if __name__ == "__main__":
     unittest.main()